@@ -1,14 +1,19 @@
 # DynamicTradingManager.py
 import ccxt
 import json
+import asyncio
 import numpy as np
 import os
 import logging
 import time
+import threading
 import requests
 import shutil
 from data_api_module import fetch_data_from_exchanges
 import indicators
+from ohlcv_cache import (OHLCV_CACHE, WINDOW_CANDLES, PAGE_CANDLES, fetch_ohlcv_cached, join_pages,
+                         next_page_since)
+from pair_screener import rank_pairs, MAX_SPREAD
 import portfolio_optimization
 import risk_management
 
@@ -25,14 +30,62 @@ USB_PATHS = [
 BACKUP_PATH = next((path for path in USB_PATHS if os.path.exists(path)), "backup_data/")
 CLOUD_BACKUP = "/mnt/google_drive/trading_backup/"
 
+# Screening in blocco
+SCREEN_TIMEFRAMES = ("1h", "4h")
+MAX_CONCURRENT_REQUESTS = 10  # Richieste OHLCV contemporanee (il client async rispetta comunque il rate limit)
+OHLCV_RETRIES = 2
+
+
+async def fetch_ohlcv_batch(exchange, requests_list, max_concurrency=MAX_CONCURRENT_REQUESTS, retries=OHLCV_RETRIES):
+    """Scarica in parallelo le candele per una lista di (simbolo, timeframe, since, limit) con un client async di ccxt.
+
+    Le richieste con `since` vengono paginate finché l'ultima candela è quella in corso.
+    Restituisce {(simbolo, timeframe): candele}; le richieste fallite valgono None senza interrompere le altre.
+    Il client (creato nel loop che esegue la coroutine) resta aperto: lo chiude chi lo possiede.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_page(symbol, timeframe, since, limit):
+        for attempt in range(retries):
+            try:
+                async with semaphore:
+                    return await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
+            except Exception as e:
+                logging.warning(f"⚠️ OHLCV {symbol} {timeframe} non disponibile (tentativo {attempt+1}/{retries}): {e}")
+                if attempt + 1 < retries:
+                    await asyncio.sleep(2 ** attempt)
+        return None
+
+    async def fetch(symbol, timeframe, since, limit):
+        pages = []
+        while True:
+            page = await fetch_page(symbol, timeframe, since, limit)
+            if page is None:  # Le pagine già scaricate restano valide: il prossimo passaggio riparte da lì
+                return (symbol, timeframe), join_pages(pages) if pages else None
+            pages.append(page)
+            since = None if since is None else next_page_since(exchange, timeframe, page, since, limit)
+            if since is None:
+                return (symbol, timeframe), join_pages(pages)
+
+    return dict(await asyncio.gather(*(fetch(*request) for request in requests_list)))
+
 class DynamicTradingManager:
-    def __init__(self, top_n=10, volatility_threshold=0.02, min_volume=1000000, backup_file="trading_pairs.json"):
+    def __init__(self, top_n=10, volatility_threshold=0.02, min_volume=1000000, backup_file="trading_pairs.json",
+                 trading_strategy="scalping"):
         """Gestisce dinamicamente la selezione delle coppie di trading."""
         self.top_n = top_n
         self.volatility_threshold = volatility_threshold
         self.min_volume = min_volume
+        self.trading_strategy = trading_strategy
         self.backup_file = os.path.join(BACKUP_PATH, backup_file)
         self.exchange = ccxt.binance()  # Connessione a Binance
+        self.markets = None  # Caricati una volta e riutilizzati tra i passaggi di screening
+        self.last_screen_stats = {}
+        # Loop asyncio dedicato con un solo client async riutilizzato da tutti i passaggi di screening
+        self._loop = None
+        self._loop_thread = None
+        self._async_exchange = None
+        self._loop_lock = threading.Lock()
 
     def fetch_eur_trading_pairs(self, retries=3, delay=2):
         """Recupera le coppie di trading in EUR con gestione avanzata della volatilità, spread e indicatori tecnici."""
@@ -49,11 +102,11 @@ class DynamicTradingManager:
                         spread = (ticker['ask'] - ticker['bid']) / ticker['bid']  # Calcola lo spread
 
                         # Recupera le candele OHLCV per calcolare la volatilità recente (1h e 4h)
-                        ohlcv_1h = self.exchange.fetch_ohlcv(symbol, timeframe="1h")
+                        ohlcv_1h = fetch_ohlcv_cached(self.exchange, symbol, "1h")
                         closes_1h = [candle[4] for candle in ohlcv_1h]
                         volatility_1h = np.std(closes_1h) / np.mean(closes_1h)
 
-                        ohlcv_4h = self.exchange.fetch_ohlcv(symbol, timeframe="4h")
+                        ohlcv_4h = fetch_ohlcv_cached(self.exchange, symbol, "4h")
                         closes_4h = [candle[4] for candle in ohlcv_4h]
                         volatility_4h = np.std(closes_4h) / np.mean(closes_4h)
 
@@ -92,6 +145,128 @@ class DynamicTradingManager:
         logging.error("❌ Impossibile recuperare le coppie di trading dopo più tentativi.")
         return self.load_backup_pairs()
 
+    def _load_markets(self):
+        if self.markets is None:
+            self.markets = self.exchange.load_markets()
+        return self.markets
+
+    def _run_async(self, coroutine):
+        """Esegue una coroutine sul loop dedicato del manager e ne attende il risultato.
+
+        Funziona anche se il thread chiamante ha già un loop attivo (dove asyncio.run fallirebbe).
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="screening-loop", daemon=True)
+                self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _fetch_ohlcv_async(self, requests_list, max_concurrency):
+        if self._async_exchange is None:  # Creato nel loop dedicato: la sessione HTTP resta legata a quel loop
+            import ccxt.async_support as ccxt_async
+            self._async_exchange = getattr(ccxt_async, self.exchange.id)({"enableRateLimit": True})
+        return await fetch_ohlcv_batch(self._async_exchange, requests_list, max_concurrency)
+
+    def close(self):
+        """Chiude il client async e ferma il loop dedicato."""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._async_exchange is not None:
+            asyncio.run_coroutine_threadsafe(self._async_exchange.close(), loop).result()
+            self._async_exchange = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join()
+        loop.close()
+
+    def _cached_candles(self, symbol, timeframe):
+        """Candele dalla cache condivisa; una coppia senza dati resta vuota e viene esclusa dal ranking."""
+        try:
+            return OHLCV_CACHE.get(self.exchange, symbol, timeframe)
+        except Exception as e:
+            logging.warning(f"⚠️ Candele {symbol} {timeframe} non disponibili: {e}")
+            return np.empty((0, 6))
+
+    def screen_eur_pairs(self, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        """Screening in blocco: un solo fetch_tickers, prefiltro su volume e spread, candele scaricate in parallelo.
+
+        I mercati restano in cache e le candele fallite non fanno ripartire l'intero passaggio.
+        """
+        stats = {}
+        start = time.perf_counter()
+        markets = self._load_markets()
+        symbols = [symbol for symbol, market in markets.items() if "/EUR" in symbol and market.get('active')]
+        tickers = self.exchange.fetch_tickers(symbols)
+        stats["tickers_s"] = time.perf_counter() - start
+
+        candidates = {}
+        for symbol in symbols:
+            ticker = tickers.get(symbol) or {}
+            volume = ticker.get('quoteVolume') or 0
+            if not ticker.get('bid') or not ticker.get('ask') or volume < self.min_volume:
+                continue
+            spread = (ticker['ask'] - ticker['bid']) / ticker['bid']
+            if spread < MAX_SPREAD:
+                candidates[symbol] = (volume, spread)
+
+        # Solo le candele mancanti: la cache condivisa fornisce il resto. I lock delle chiavi restano presi
+        # fino al merge, così un fetch_ohlcv_cached concorrente attende invece di scaricare le stesse candele.
+        fetch_start = time.perf_counter()
+        requests_list = []
+        with OHLCV_CACHE.locked(self.exchange, [(symbol, timeframe) for symbol in candidates
+                                                for timeframe in SCREEN_TIMEFRAMES]):
+            for symbol in candidates:
+                for timeframe in SCREEN_TIMEFRAMES:
+                    since = OHLCV_CACHE.since(self.exchange, symbol, timeframe)
+                    if OHLCV_CACHE.needs_full(self.exchange, symbol, timeframe):
+                        requests_list.append((symbol, timeframe, None, WINDOW_CANDLES))
+                    elif not OHLCV_CACHE.is_fresh(self.exchange, symbol, timeframe):
+                        requests_list.append((symbol, timeframe, since, PAGE_CANDLES))
+            if requests_list:
+                downloaded = self._run_async(self._fetch_ohlcv_async(requests_list, max_concurrency))
+                windows = {(symbol, timeframe): limit if since is None else None
+                           for symbol, timeframe, since, limit in requests_list}
+                for (symbol, timeframe), new_candles in downloaded.items():
+                    if new_candles is not None:
+                        OHLCV_CACHE.merge(self.exchange, symbol, timeframe, new_candles, windows[symbol, timeframe])
+        stats["ohlcv_s"] = time.perf_counter() - fetch_start
+        stats["ohlcv_requests"] = len(requests_list)
+
+        # Ranking vettoriale: una matrice di chiusure per tutte le candidate, top_n con argpartition
+        rank_start = time.perf_counter()
+        symbols_ranked = list(candidates)
+        candles_1h, candles_4h = ([self._cached_candles(symbol, timeframe) for symbol in symbols_ranked]
+                                  for timeframe in SCREEN_TIMEFRAMES)
+        trading_pairs, columns = rank_pairs(symbols_ranked, candles_1h, candles_4h,
+                                      [candidates[symbol][0] for symbol in symbols_ranked],
+                                      [candidates[symbol][1] for symbol in symbols_ranked],
+                                      top_n=self.top_n, min_volume=self.min_volume,
+                                      volatility_threshold=self.volatility_threshold, max_spread=MAX_SPREAD,
+                                      prefer_volatile=self.trading_strategy in ("scalping", "intraday"))
+        stats["ranking_s"] = time.perf_counter() - rank_start
+        # Volatilità media delle coppie idonee: regola la cadenza dello screening in background
+        eligible = columns["eligible"]
+        if eligible.any():
+            stats["volatility"] = float(np.nanmean((columns["volatility_1h"][eligible] +
+                                                    columns["volatility_4h"][eligible]) / 2))
+
+        stats.update(total_s=time.perf_counter() - start, symbols=len(symbols), candidates=len(candidates),
+                     selected=len(trading_pairs))
+        self.last_screen_stats = stats
+        logging.info(f"⏱️ Screening: {stats['symbols']} coppie EUR, {stats['candidates']} dopo il prefiltro, "
+                     f"{stats['selected']} selezionate in {stats['total_s']:.2f}s "
+                     f"(ticker {stats['tickers_s']:.2f}s, OHLCV {stats['ohlcv_s']:.2f}s, "
+                     f"ranking {stats['ranking_s'] * 1000:.1f} ms).")
+        if trading_pairs:
+            self.backup_trading_pairs(trading_pairs)
+        return trading_pairs
+
+    async def screen_eur_pairs_async(self, max_concurrency=MAX_CONCURRENT_REQUESTS):
+        """Variante per chi gira già in un loop asyncio: lo screening avviene in un thread e si attende senza bloccare."""
+        return await asyncio.to_thread(self.screen_eur_pairs, max_concurrency)
+
     def backup_trading_pairs(self, trading_pairs):
         """Salva le coppie di trading in un file JSON di backup."""
         try:
@@ -116,9 +291,13 @@ class DynamicTradingManager:
             logging.error(f"❌ Errore nel caricamento del backup: {e}")
             return []
 
-    def select_trading_pairs(self):
+    def select_trading_pairs(self, bulk=True):
         """Seleziona le migliori coppie di trading, caricando dal backup in caso di errore."""
-        trading_pairs = self.fetch_eur_trading_pairs()
+        try:
+            trading_pairs = self.screen_eur_pairs() if bulk else self.fetch_eur_trading_pairs()
+        except Exception as e:
+            logging.error(f"⚠️ Errore nello screening in blocco, uso la selezione coppia per coppia: {e}")
+            trading_pairs = self.fetch_eur_trading_pairs()
         if not trading_pairs:
             trading_pairs = self.load_backup_pairs()
         return trading_pairs
@@ -1,23 +1,16 @@
 # ai_model.py - Modello AI per il trading automatico con ottimizzazione del portafoglio
 import os
+import json
+import time
 import pandas as pd
 import numpy as np
 import logging
-import xgboost as xgb
 from datetime import datetime
 from pathlib import Path
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from tensorflow.keras.callbacks import EarlyStopping
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from indicators import TradingIndicators
-from data_handler import load_data
-from drl_agent import DRLAgent
-from gym_trading_env import TradingEnv
-from risk_management import RiskManagement
-from portfolio_optimization import PortfolioOptimizer
+
+# 📌 TensorFlow, XGBoost e scikit-learn vengono importati nel punto d'uso:
+# importare ai_model (es. da risk_management) non carica i framework pesanti.
 
 # 📌 Configurazione logging avanzata
 logging.basicConfig(level=logging.INFO,
@@ -39,6 +32,7 @@ XGB_MODEL_FILE = MODEL_DIR / "xgb_trading_model.json"
 # ===========================
 def preprocess_data(data):
     """Preprocessa i dati per il modello AI."""
+    from sklearn.preprocessing import MinMaxScaler
     scaler = MinMaxScaler(feature_range=(0, 1))
     return scaler.fit_transform(data), scaler
 
@@ -58,11 +52,81 @@ def prepare_xgboost_data(data, look_back=60):
         y.append(data[i, 0])
     return np.array(X), np.array(y)
 
+def cached_indicators(bars, symbol=None, store=None):
+    """Indicatori tecnici di un simbolo, calcolati una volta per simbolo e insieme di barre (feature store).
+
+    La chiave unisce il simbolo (nella specifica) all'impronta delle barre OHLCV: una barra nuova
+    produce una nuova entry e le versioni vecchie dello stesso simbolo vengono eliminate.
+    """
+    from feature_store import FeatureStore
+    from indicators import calculate_technical_indicators, get_technical_indicators_list
+    ohlcv = bars[[col for col in ("open", "high", "low", "close", "volume") if col in bars.columns]]
+    spec = {"indicators": get_technical_indicators_list(), "symbol": str(symbol)}
+
+    def compute():
+        frame = calculate_technical_indicators(ohlcv.astype(float).copy())
+        return {name: frame[name].to_numpy(dtype=np.float64) for name in spec["indicators"]}
+
+    return (store or FeatureStore()).get_or_compute(ohlcv, spec, compute)
+
+def add_indicator_columns(data, columns, symbol_column="symbol"):
+    """Aggiunge a `data` gli indicatori richiesti in `columns` e non ancora presenti, simbolo per simbolo."""
+    from indicators import get_technical_indicators_list
+    missing = [col for col in columns if col not in data.columns and col in get_technical_indicators_list()]
+    if not missing:
+        return data
+    if symbol_column in data.columns:
+        positions = data.groupby(symbol_column, sort=False).indices
+    else:
+        positions = {None: np.arange(len(data))}
+    values = {name: np.full(len(data), np.nan) for name in missing}
+    for symbol, rows in positions.items():
+        indicators = cached_indicators(data.iloc[rows], symbol)
+        for name in missing:
+            values[name][rows] = indicators[name]
+    return data.assign(**values)
+
+def build_features(data, look_back=60, columns=("close",), sources=None):
+    """Calcola valori scalati, indici delle finestre e target, riusando il feature store se le barre non sono cambiate.
+
+    `columns` può includere le colonne degli indicatori: quelle assenti da `data` vengono
+    calcolate con cached_indicators. `sources` (es. i file parquet di data_handler) rende
+    la chiave più economica da calcolare rispetto all'hash del DataFrame.
+    """
+    from feature_store import FeatureStore
+    data = add_indicator_columns(data, columns)
+    columns = [col for col in columns if col in data.columns]
+    spec = {"columns": columns, "look_back": look_back, "scaler": "minmax(0, 1)"}
+
+    def compute():
+        scaled, scaler = preprocess_data(data[columns].values)
+        return {
+            "scaled": scaled.astype(np.float32),
+            "window_index": np.arange(look_back, len(scaled), dtype=np.int64),
+            "target": scaled[look_back:, 0].astype(np.float32),
+            "scaler_min": scaler.data_min_,
+            "scaler_max": scaler.data_max_,
+        }
+
+    return FeatureStore().get_or_compute(sources if sources is not None else data[columns], spec, compute)
+
+def feature_windows(features, look_back=60):
+    """Restituisce (X_lstm, X_xgb, y) sulle feature memory-mapped: tutte le colonne di build_features.
+
+    X_lstm è (finestre, look_back, colonne) senza copie; X_xgb appiattisce ogni finestra
+    (una vista con la sola chiusura, una copia quando ci sono anche gli indicatori).
+    """
+    from feature_store import sliding_windows
+    X = sliding_windows(features["scaled"], look_back)
+    return X, X.reshape(len(X), -1), features["target"]
+
 # ===========================
 # 🔹 Creazione e Addestramento dei Modelli AI
 # ===========================
 def create_lstm_model(input_shape):
     """Crea un modello LSTM compilato."""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
     model = Sequential([
         LSTM(50, return_sequences=True, input_shape=input_shape),
         Dropout(0.2),
@@ -74,36 +138,254 @@ def create_lstm_model(input_shape):
     model.compile(optimizer='adam', loss='mean_squared_error')
     return model
 
-def train_lstm_model(X_train, y_train, X_val, y_val):
+def train_lstm_model(X_train, y_train, X_val, y_val, path=MODEL_FILE):
     """Allena il modello LSTM."""
-    model = create_lstm_model((X_train.shape[1], 1))
+    from tensorflow.keras.callbacks import EarlyStopping
+    model = create_lstm_model(X_train.shape[1:])
     early_stop = EarlyStopping(monitor='val_loss', patience=5,
                                restore_best_weights=True)
     model.fit(X_train, y_train, batch_size=32, epochs=50,
               validation_data=(X_val, y_val), callbacks=[early_stop])
-    model.save(MODEL_FILE)
-    logging.info(f"✅ Modello LSTM salvato in {MODEL_FILE}")
+    model.save(path)
+    logging.info(f"✅ Modello LSTM salvato in {path}")
     return model
 
 def create_xgboost_model():
     """Crea un modello XGBoost."""
+    import xgboost as xgb
     return xgb.XGBRegressor(objective='reg:squarederror', n_estimators=100,
                             learning_rate=0.1)
 
-def train_xgboost_model(X_train, y_train, X_val, y_val):
+def train_xgboost_model(X_train, y_train, X_val, y_val, path=XGB_MODEL_FILE):
     """Allena il modello XGBoost."""
     model = create_xgboost_model()
     model.fit(X_train, y_train, eval_set=[(X_val, y_val)],
               early_stopping_rounds=10, verbose=True)
-    model.save_model(XGB_MODEL_FILE)
-    logging.info(f"✅ Modello XGBoost salvato in {XGB_MODEL_FILE}")
+    model.save_model(path)
+    logging.info(f"✅ Modello XGBoost salvato in {path}")
+    return model
+
+# ===========================
+# 🔹 Apprendimento Incrementale
+# ===========================
+REGISTRY_FILE = MODEL_DIR / "model_registry.json"
+FINE_TUNE_EPOCHS = 5  # Epoche di fine-tuning sulle sole finestre nuove
+XGB_UPDATE_ROUNDS = 20  # Alberi aggiunti ad ogni aggiornamento XGBoost
+DRIFT_PSI_THRESHOLD = 0.2  # PSI dei rendimenti oltre cui la distribuzione è cambiata
+DRIFT_ERROR_RATIO = 1.5  # Errore sulle barre nuove rispetto all'errore di validazione registrato
+DRIFT_OUT_OF_RANGE = 0.05  # Quota massima di prezzi nuovi fuori dai limiti dello scaler
+PSI_MIN_SAMPLES_PER_BIN = 10  # Con meno rendimenti il rumore di campionamento del PSI (~bin/n) supera la soglia
+
+def load_model_registry(symbol=None):
+    """Carica il registro dei modelli: intero (versione globale e voci per simbolo) o la voce di `symbol`.
+
+    Ogni simbolo ha la propria voce (ultimo timestamp addestrato, scaler e statistiche di riferimento).
+    """
+    registry = {}
+    if REGISTRY_FILE.exists():
+        with open(REGISTRY_FILE, "r") as f:
+            registry = json.load(f)
+    return registry if symbol is None else registry.get("symbols", {}).get(symbol, {})
+
+def register_model(symbol, **info):
+    """Aggiorna la voce di `symbol` e la versione globale (usata dalla cache delle previsioni)."""
+    registry = load_model_registry()
+    entry = registry.setdefault("symbols", {}).setdefault(symbol, {})
+    entry.update(info, version=entry.get("version", 0) + 1, updated=datetime.now().isoformat())
+    registry.update(version=registry.get("version", 0) + 1, updated=entry["updated"])
+    with open(REGISTRY_FILE, "w") as f:
+        json.dump(registry, f, indent=4)
+    logging.info(f"📒 Modello {symbol} registrato (versione {entry['version']}, addestrato fino a {entry['trained_until']}).")
+    return entry
+
+def model_files(symbol):
+    """File LSTM e XGBoost dei modelli di un simbolo (i modelli generici restano MODEL_FILE/XGB_MODEL_FILE)."""
+    slug = str(symbol).replace("/", "-")
+    return (MODEL_FILE.with_name(f"{MODEL_FILE.stem}_{slug}{MODEL_FILE.suffix}"),
+            XGB_MODEL_FILE.with_name(f"{XGB_MODEL_FILE.stem}_{slug}{XGB_MODEL_FILE.suffix}"))
+
+def population_stability_index(reference_edges, values):
+    """PSI tra i decili di riferimento e la distribuzione dei nuovi valori."""
+    edges = np.asarray(reference_edges, dtype=float)
+    expected = np.full(len(edges) + 1, 1.0 / (len(edges) + 1))
+    actual = np.bincount(np.searchsorted(edges, values), minlength=len(edges) + 1) / max(len(values), 1)
+    actual = np.clip(actual, 1e-6, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def _scale_with_bounds(prices, scaler_min, scaler_max):
+    """Scala i prezzi con i limiti dello scaler registrato (senza rifare il fit)."""
+    return ((prices - scaler_min) / max(scaler_max - scaler_min, 1e-12)).reshape(-1, 1)
+
+def _reference_edges(prices):
+    """Decili dei rendimenti usati come riferimento per il controllo del drift."""
+    returns = np.diff(prices) / prices[:-1]
+    return np.quantile(returns, np.linspace(0.1, 0.9, 9)).tolist()
+
+def detect_drift(registry, new_prices, new_error=None):
+    """Verifica se le barre nuove richiedono un riaddestramento completo. Restituisce (drift, motivo)."""
+    low, high = registry["scaler_min"], registry["scaler_max"]
+    out_of_range = np.mean((new_prices < low) | (new_prices > high))
+    if out_of_range > DRIFT_OUT_OF_RANGE:
+        return True, f"{out_of_range:.1%} dei prezzi fuori dai limiti dello scaler"
+
+    bins = len(registry["reference_edges"]) + 1
+    if len(new_prices) - 1 >= PSI_MIN_SAMPLES_PER_BIN * bins:
+        psi = population_stability_index(registry["reference_edges"], np.diff(new_prices) / new_prices[:-1])
+        if psi > DRIFT_PSI_THRESHOLD:
+            return True, f"PSI dei rendimenti {psi:.3f} > {DRIFT_PSI_THRESHOLD}"
+
+    baseline_error = registry.get("val_loss")
+    if new_error is not None and baseline_error and new_error > DRIFT_ERROR_RATIO * baseline_error:
+        return True, f"errore sulle barre nuove {new_error:.5f} > {DRIFT_ERROR_RATIO}x {baseline_error:.5f}"
+
+    return False, "nessun drift"
+
+def update_lstm_model(X_new, y_new, epochs=FINE_TUNE_EPOCHS, model=None, path=MODEL_FILE):
+    """Fine-tuning dell'ultimo modello LSTM registrato sulle sole finestre nuove."""
+    from tensorflow.keras.callbacks import EarlyStopping
+    model = model if model is not None else load_lstm_model(path)
+    if model is None:
+        return None
+    early_stop = EarlyStopping(monitor='loss', patience=2, restore_best_weights=True)
+    model.fit(X_new, y_new, batch_size=32, epochs=epochs, callbacks=[early_stop], verbose=0)
+    model.save(path)
+    logging.info(f"🔁 Modello LSTM aggiornato su {len(X_new)} finestre nuove.")
     return model
 
+def update_xgboost_model(X_new, y_new, rounds=XGB_UPDATE_ROUNDS, path=XGB_MODEL_FILE):
+    """Continua il boosting dell'ultimo modello XGBoost registrato con alberi aggiuntivi."""
+    previous = load_xgboost_model(path)
+    if previous is None:
+        return None
+    model = create_xgboost_model()
+    model.set_params(n_estimators=rounds)
+    model.fit(X_new, y_new, xgb_model=previous.get_booster(), verbose=False)
+    model.save_model(path)
+    logging.info(f"🔁 Modello XGBoost aggiornato con {rounds} alberi su {len(X_new)} campioni nuovi.")
+    return model
+
+def _price_series(data, symbol=None):
+    """Chiusure e timestamp delle barre di un solo simbolo da una Series/DataFrame indicizzati per timestamp.
+
+    Un DataFrame con più coin (colonna coin_id/symbol) viene filtrato su `symbol`: senza filtro
+    i timestamp duplicati mescolerebbero le chiusure di coin diverse in un'unica serie.
+    """
+    if isinstance(data, pd.DataFrame):
+        column = next((col for col in ("symbol", "coin_id") if col in data.columns), None)
+        if column is not None:
+            if symbol is None and data[column].nunique() > 1:
+                raise ValueError("Dati con più simboli: indicare il simbolo da addestrare.")
+            data = data[data[column] == symbol] if symbol is not None else data
+        frame = data.set_index("timestamp") if "timestamp" in data.columns else data
+        series = frame["close"]
+    else:
+        series = data
+    series = series[~series.index.duplicated(keep="last")].sort_index()
+    return series.to_numpy(dtype=float), pd.to_datetime(series.index)
+
+def full_retrain(data, symbol, look_back=60, validation_split=0.2):
+    """Riaddestramento completo di LSTM e XGBoost di `symbol` e registrazione del nuovo modello."""
+    lstm_file, xgb_file = model_files(symbol)
+    prices, timestamps = _price_series(data, symbol)
+    scaled, scaler = preprocess_data(prices.reshape(-1, 1))
+    X_lstm, y = prepare_lstm_data(scaled, look_back)
+    X_xgb, _ = prepare_xgboost_data(scaled, look_back)
+    split = int(len(y) * (1 - validation_split))  # Split cronologico: niente dati futuri nel training
+
+    lstm_model = train_lstm_model(X_lstm[:split], y[:split], X_lstm[split:], y[split:], lstm_file)
+    train_xgboost_model(X_xgb[:split], y[:split], X_xgb[split:], y[split:], xgb_file)
+    val_loss = float(lstm_model.evaluate(X_lstm[split:], y[split:], verbose=0))
+
+    return register_model(symbol, trained_until=timestamps[-1].isoformat(), look_back=look_back,
+                          scaler_min=float(scaler.data_min_[0]), scaler_max=float(scaler.data_max_[0]),
+                          reference_edges=_reference_edges(prices), val_loss=val_loss)
+
+def incremental_update(data, symbol, look_back=60):
+    """Aggiorna i modelli di `symbol` con le sole barre arrivate dall'ultimo addestramento; riaddestra da zero solo se c'è drift.
+
+    `data` sono le chiusure indicizzate per timestamp: le barre nuove sono quelle successive al
+    timestamp registrato, quindi lo storico può essere troncato o esteso senza perdere il punto.
+    """
+    lstm_file, xgb_file = model_files(symbol)
+    prices, timestamps = _price_series(data, symbol)
+    registry = load_model_registry(symbol)
+
+    if (not registry or registry.get("look_back") != look_back or not isinstance(registry.get("trained_until"), str)
+            or not lstm_file.exists() or not xgb_file.exists()):
+        logging.info(f"🆕 Nessun modello registrato compatibile per {symbol}, addestramento completo.")
+        return full_retrain(data, symbol, look_back)
+
+    first_new = int(timestamps.searchsorted(pd.Timestamp(registry["trained_until"]), side="right"))
+    if first_new >= len(prices):
+        logging.info(f"✅ Nessuna barra nuova per {symbol}, modelli già aggiornati.")
+        return registry
+
+    new_prices = prices[first_new:]
+    drift, reason = detect_drift(registry, new_prices)
+    if drift:
+        logging.warning(f"⚠️ Drift rilevato su {symbol} ({reason}), riaddestramento completo.")
+        return full_retrain(data, symbol, look_back)
+
+    # Finestre che terminano sulle barre nuove: il costo dipende solo dai dati nuovi
+    window_start = max(first_new - look_back, 0)
+    scaled = _scale_with_bounds(prices[window_start:], registry["scaler_min"], registry["scaler_max"])
+    X_lstm, y_new = prepare_lstm_data(scaled, look_back)
+    X_xgb, _ = prepare_xgboost_data(scaled, look_back)
+    if len(y_new) == 0:
+        return registry
+
+    lstm_model = load_lstm_model(lstm_file)
+    new_error = float(lstm_model.evaluate(X_lstm, y_new, verbose=0))
+    drift, reason = detect_drift(registry, new_prices, new_error)
+    if drift:
+        logging.warning(f"⚠️ Drift rilevato su {symbol} ({reason}), riaddestramento completo.")
+        return full_retrain(data, symbol, look_back)
+
+    update_lstm_model(X_lstm, y_new, model=lstm_model, path=lstm_file)
+    update_xgboost_model(X_xgb, y_new, path=xgb_file)
+    return register_model(symbol, trained_until=timestamps[-1].isoformat())
+
+MODEL_UPDATE_INTERVAL = 3600  # Secondi tra due aggiornamenti incrementali dal ciclo di trading
+_model_update = {"last": 0.0, "thread": None}
+
+def load_training_prices(symbol):
+    """Chiusure storiche di un solo simbolo salvate da data_handler."""
+    from data_handler import HISTORICAL_DATA_FILE, load_processed_data
+    data = load_processed_data(HISTORICAL_DATA_FILE)
+    column = next((col for col in ("symbol", "coin_id") if col in data.columns), None)
+    return data[data[column] == symbol] if column else data
+
+def schedule_incremental_update(symbols, load_fn=load_training_prices, interval=MODEL_UPDATE_INTERVAL, look_back=60):
+    """Avvia in un thread incremental_update per ogni simbolo negoziato, se è trascorso `interval`
+    e nessun aggiornamento è in corso. I simboli vengono aggiornati uno alla volta, ognuno sui propri modelli.
+
+    Chiamata ad ogni giro del ciclo di trading: non blocca mai il trading.
+    """
+    import threading
+    symbols = list(symbols or [])
+    running = _model_update["thread"]
+    if (not symbols or (running is not None and running.is_alive())
+            or time.time() - _model_update["last"] < interval):
+        return False
+
+    def run():
+        for symbol in symbols:
+            try:
+                incremental_update(load_fn(symbol), symbol, look_back)
+            except Exception as e:
+                logging.error(f"❌ Errore nell'aggiornamento incrementale dei modelli di {symbol}: {e}")
+
+    _model_update["last"] = time.time()
+    _model_update["thread"] = threading.Thread(target=run, name="model-update", daemon=True)
+    _model_update["thread"].start()
+    return True
+
 # ===========================
 # 🔹 Ottimizzazione del Portafoglio
 # ===========================
 def optimize_trading_portfolio(data):
     """Ottimizza il portafoglio utilizzando la classe PortfolioOptimizer."""
+    from portfolio_optimization import PortfolioOptimizer
     optimizer = PortfolioOptimizer(data)
     optimized_allocation = optimizer.optimize()
     logging.info(f"📈 Allocazione ottimizzata: {optimized_allocation}")
@@ -112,23 +394,25 @@ def optimize_trading_portfolio(data):
 # ===========================
 # 🔹 Funzioni per le Previsioni
 # ===========================
-def load_lstm_model():
+def load_lstm_model(path=MODEL_FILE):
     """Carica il modello LSTM."""
-    if MODEL_FILE.exists():
-        model = load_model(MODEL_FILE)
-        logging.info(f"✅ Modello LSTM caricato da {MODEL_FILE}")
+    if path.exists():
+        from tensorflow.keras.models import load_model
+        model = load_model(path)
+        logging.info(f"✅ Modello LSTM caricato da {path}")
         return model
-    logging.error(f"❌ Il file del modello LSTM {MODEL_FILE} non esiste.")
+    logging.error(f"❌ Il file del modello LSTM {path} non esiste.")
     return None
 
-def load_xgboost_model():
+def load_xgboost_model(path=XGB_MODEL_FILE):
     """Carica il modello XGBoost."""
-    if XGB_MODEL_FILE.exists():
+    if path.exists():
+        import xgboost as xgb
         model = xgb.XGBRegressor()
-        model.load_model(XGB_MODEL_FILE)
-        logging.info(f"✅ Modello XGBoost caricato da {XGB_MODEL_FILE}")
+        model.load_model(path)
+        logging.info(f"✅ Modello XGBoost caricato da {path}")
         return model
-    logging.error(f"❌ Il file del modello XGBoost {XGB_MODEL_FILE} non esiste.")
+    logging.error(f"❌ Il file del modello XGBoost {path} non esiste.")
     return None
 
 # ===========================
@@ -136,11 +420,12 @@ def load_xgboost_model():
 # ===========================
 def example_prediction():
     """Esegue una previsione di esempio con i modelli AI."""
-    data = load_data()
-    scaled_data, _ = preprocess_data(data['close'].values.reshape(-1, 1))
+    from sklearn.ensemble import RandomForestRegressor
+    from data_handler import load_data
 
-    X_lstm, _ = prepare_lstm_data(scaled_data)
-    X_xgb, _ = prepare_xgboost_data(scaled_data)
+    data = load_data()
+    features = build_features(data)
+    X_lstm, X_xgb, _ = feature_windows(features)
 
     lstm_model = load_lstm_model()
     xgb_model = load_xgboost_model()
@@ -0,0 +1,162 @@
+# async_checkpoint.py - Checkpoint e upload dei modelli DRL in background, senza bloccare il training
+import os
+import copy
+import time
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+import torch
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.save_util import recursive_getattr, save_to_zip_file
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+KEEP_LAST = 3  # Checkpoint conservati su disco
+MAX_PENDING = 2  # Snapshot in coda oltre i quali i checkpoint intermedi più vecchi vengono scartati
+
+
+def _to_cpu(value):
+    """Copia ricorsiva su CPU di tensori annidati (state_dict di policy e optimizer)."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().to("cpu", copy=True)
+    if isinstance(value, dict):
+        return {key: _to_cpu(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(item) for item in value)
+    return copy.deepcopy(value)
+
+
+def snapshot_model(model):
+    """Copia in memoria di ciò che scrive `model.save`: nessun I/O, il training può proseguire subito.
+
+    Restituisce (data, params, pytorch_variables) come BaseAlgorithm.save: attributi serializzabili,
+    state_dict di policy e optimizer, variabili torch (es. ent_coef di SAC).
+    """
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    exclude.update(name.split(".")[0] for name in state_dicts_names + (torch_variable_names or []))
+    data = {name: copy.deepcopy(value) for name, value in model.__dict__.items() if name not in exclude}
+    pytorch_variables = {name: _to_cpu(recursive_getattr(model, name)) for name in torch_variable_names or []}
+    return data, _to_cpu(model.get_parameters()), pytorch_variables
+
+
+def load_snapshot(model, path):
+    """Ripristina pesi di policy e optimizer da un checkpoint (zip stable-baselines3) di AsyncCheckpointer.
+
+    Il checkpoint è un normale zip di `model.save`: si può caricare anche con PPO.load(path).
+    """
+    model.set_parameters(str(path), exact_match=True, device=model.device)
+    logging.info(f"✅ Pesi di policy e optimizer ripristinati da {path}")
+    return model
+
+
+class AsyncCheckpointer:
+    """Serializza e carica i checkpoint su un thread dedicato.
+
+    Il learner consegna solo snapshot in memoria; se il writer/uploader resta indietro
+    vengono scartati gli snapshot intermedi più vecchi, mai il salvataggio finale.
+    """
+
+    def __init__(self, save_dir, name_prefix="trading_model", keep_last=KEEP_LAST, max_pending=MAX_PENDING,
+                 upload_fn=None):
+        self.save_dir = Path(save_dir)
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        self.name_prefix = name_prefix
+        self.keep_last = keep_last
+        self.max_pending = max_pending
+        self.upload_fn = upload_fn
+
+        self.saved = []
+        self.dropped = 0
+        self.write_time = 0.0
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def submit_snapshot(self, snapshot, num_timesteps):
+        """Accoda uno snapshot intermedio di `snapshot_model` (non bloccante)."""
+        with self._condition:
+            while len(self._pending) >= self.max_pending:
+                oldest = next((job for job in self._pending if job[0] == "snapshot"), None)
+                if oldest is None:
+                    break
+                self._pending.remove(oldest)
+                self.dropped += 1
+                logging.warning(f"⚠️ Checkpoint a {oldest[1]} step scartato: il writer è in ritardo.")
+            self._pending.append(("snapshot", num_timesteps, snapshot))
+            self._condition.notify()
+
+    def submit_final(self, model, path):
+        """Accoda il salvataggio completo del modello (zip stable-baselines3) e il suo upload."""
+        with self._condition:
+            self._pending.append(("final", path, model))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                kind, target, payload = self._pending.popleft()
+            start = time.perf_counter()
+            try:
+                if kind == "snapshot":
+                    self._write_snapshot(target, payload)
+                else:
+                    payload.save(target)
+                    logging.info(f"✅ Modello salvato in {target}.")
+                    self._upload(target)
+            except Exception as e:
+                logging.error(f"❌ Errore nel salvataggio del checkpoint: {e}")
+            self.write_time += time.perf_counter() - start
+
+    def _write_snapshot(self, num_timesteps, snapshot):
+        """Scrive lo zip nello stesso formato di `model.save` (caricabile con PPO.load e simili)."""
+        data, params, pytorch_variables = snapshot
+        path = self.save_dir / f"{self.name_prefix}_{num_timesteps}_steps.zip"
+        tmp_path = path.with_suffix(".tmp")
+        save_to_zip_file(tmp_path, data=data, params=params, pytorch_variables=pytorch_variables)
+        os.replace(tmp_path, path)
+        self.saved.append(path)
+        logging.info(f"💾 Checkpoint salvato in background: {path}")
+
+        while len(self.saved) > self.keep_last:
+            stale = self.saved.pop(0)
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+        self._upload(path)
+
+    def _upload(self, path):
+        if self.upload_fn is not None:
+            self.upload_fn(path)
+
+    def close(self, timeout=None):
+        """Completa i lavori in coda e ferma il thread (da chiamare a fine training)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        logging.info(f"📦 Checkpoint: {len(self.saved)} conservati, {self.dropped} scartati, "
+                     f"{self.write_time:.1f}s di I/O fuori dal learner.")
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """Sostituto non bloccante di CheckpointCallback: ogni `save_freq` chiamate copia il modello e lo consegna al writer."""
+
+    def __init__(self, checkpointer, save_freq, verbose=0):
+        super().__init__(verbose)
+        self.checkpointer = checkpointer
+        self.save_freq = save_freq
+
+    def _on_step(self):
+        if self.n_calls % self.save_freq == 0:
+            self.checkpointer.submit_snapshot(snapshot_model(self.model), self.num_timesteps)
+        return True
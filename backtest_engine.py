@@ -0,0 +1,324 @@
+# backtest_engine.py - Backtest event-driven: replay di barre e tick salvati con simulatore di esecuzione
+import time
+import hashlib
+import logging
+from collections import deque, namedtuple
+import numpy as np
+import pandas as pd
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Tipi di evento (a parità di timestamp i tick precedono la chiusura della barra)
+TRADE, BAR_CLOSE, FILL = 0, 1, 2
+EVENT_NAMES = ("trade", "bar_close", "fill")
+
+TRADING_FEE = 0.001
+SLIPPAGE_BPS = 2.0  # Slippage oltre lo spread, in punti base
+DEFAULT_SPREAD = 0.0005  # Spread relativo usato se non è noto ask/bid del simbolo
+DEFAULT_POSITION_FRACTION = 0.05  # Quota della liquidità per ordine se non c'è un RiskManagement
+
+Event = namedtuple("Event", ["kind", "timestamp", "symbol", "price", "size"])
+
+
+def _to_milliseconds(timestamps):
+    """Timestamp in millisecondi interi (numerici invariati, date convertite)."""
+    timestamps = pd.Series(timestamps)
+    if pd.api.types.is_numeric_dtype(timestamps):
+        return timestamps.to_numpy(dtype=np.int64)
+    return ((pd.to_datetime(timestamps) - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)).to_numpy(dtype=np.int64)
+
+
+# ===========================
+# 🔹 Spread e Simulatore di Esecuzione
+# ===========================
+def spreads_from_tickers(tickers):
+    """Spread relativo (ask - bid) / bid per simbolo, come in DynamicTradingManager.fetch_eur_trading_pairs."""
+    return {symbol: (ticker["ask"] - ticker["bid"]) / ticker["bid"]
+            for symbol, ticker in tickers.items() if ticker.get("ask") and ticker.get("bid")}
+
+
+def spreads_from_manager(manager, symbols):
+    """Spread correnti letti dall'exchange di un DynamicTradingManager."""
+    tickers = {}
+    for symbol in symbols:
+        try:
+            tickers[symbol] = manager.exchange.fetch_ticker(symbol)
+        except Exception as e:
+            logging.warning(f"⚠️ Ticker non disponibile per {symbol}: {e}")
+    return spreads_from_tickers(tickers)
+
+
+class FillSimulator:
+    """Prezzo di esecuzione = lato ask/bid (reale o stimato dallo spread) + slippage; commissione sul nozionale."""
+
+    def __init__(self, fee=TRADING_FEE, slippage_bps=SLIPPAGE_BPS, spreads=None, default_spread=DEFAULT_SPREAD):
+        self.fee = fee
+        self.slippage = slippage_bps / 10_000
+        self.spreads = spreads or {}
+        self.default_spread = default_spread
+
+    def fill_price(self, side, price, symbol, bid=np.nan, ask=np.nan):
+        """Prezzo eseguito per un ordine a mercato (`side` = +1 acquisto, -1 vendita)."""
+        half_spread = self.spreads.get(symbol, self.default_spread) / 2
+        if side > 0:
+            base = ask if ask == ask else price * (1 + half_spread)
+            return base * (1 + self.slippage)
+        base = bid if bid == bid else price * (1 - half_spread)
+        return base * (1 - self.slippage)
+
+
+# ===========================
+# 🔹 Flusso di Eventi
+# ===========================
+def build_event_stream(bars, ticks=None, symbol_column="coin_id", price_column="close"):
+    """Unisce barre e tick in array ordinati per (timestamp, tipo): niente lookup pandas durante il replay."""
+    frames = [(bars, BAR_CLOSE, price_column, "volume")]
+    if ticks is not None and len(ticks):
+        frames.append((ticks, TRADE, "price" if "price" in ticks.columns else price_column, "amount"))
+
+    symbols = sorted(set().union(*(frame[symbol_column].astype(str).unique() for frame, *_ in frames)))
+    codes = {symbol: i for i, symbol in enumerate(symbols)}
+    columns = {"timestamp": [], "kind": [], "symbol": [], "price": [], "size": [], "bid": [], "ask": []}
+    for frame, kind, price_col, size_col in frames:
+        n = len(frame)
+        columns["timestamp"].append(_to_milliseconds(frame["timestamp"]))
+        columns["kind"].append(np.full(n, kind, dtype=np.int8))
+        columns["symbol"].append(frame[symbol_column].astype(str).map(codes).to_numpy(dtype=np.int32))
+        columns["price"].append(frame[price_col].to_numpy(dtype=np.float64))
+        columns["size"].append(frame[size_col].to_numpy(dtype=np.float64) if size_col in frame else np.zeros(n))
+        for side in ("bid", "ask"):
+            columns[side].append(frame[side].to_numpy(dtype=np.float64) if side in frame else np.full(n, np.nan))
+
+    stream = {name: np.concatenate(parts) for name, parts in columns.items()}
+    order = np.lexsort((stream["kind"], stream["timestamp"]))  # Ordinamento stabile: replay deterministico
+    stream = {name: np.ascontiguousarray(values[order]) for name, values in stream.items()}
+    stream["symbols"] = symbols
+    return stream
+
+
+# ===========================
+# 🔹 Motore di Backtest
+# ===========================
+class BacktestEngine:
+    """Replay event-driven di barre e tick con ordini a mercato eseguiti al prossimo evento del simbolo.
+
+    `strategy(engine, event)` riceve ogni evento (chiusura barra, tick, esecuzione) e invia
+    ordini con `engine.submit_order`. Un `risk_manager` (RiskManagement) dimensiona gli
+    ordini, blocca gli acquisti con il kill switch e applica il trailing stop; un
+    `portfolio_optimizer` (PortfolioOptimizer) ribilancia ogni `rebalance_every` barre.
+    """
+
+    def __init__(self, bars, strategy=None, ticks=None, initial_balance=100.0, fill_simulator=None,
+                 risk_manager=None, portfolio_optimizer=None, rebalance_every=0, risk_check_every=100,
+                 optimizer_window=100, symbol_column="coin_id", price_column="close"):
+        self.stream = build_event_stream(bars, ticks, symbol_column, price_column)
+        self.symbols = self.stream["symbols"]
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.strategy = strategy
+        self.initial_balance = float(initial_balance)
+        self.fills = fill_simulator or FillSimulator()
+        self.risk_manager = risk_manager
+        self.portfolio_optimizer = portfolio_optimizer
+        self.rebalance_every = rebalance_every
+        self.risk_check_every = risk_check_every
+        self.optimizer_window = optimizer_window
+        self.reset()
+
+    def reset(self):
+        n_symbols = len(self.symbols)
+        self.cash = self.initial_balance
+        self.positions = np.zeros(n_symbols)
+        self.last_price = np.zeros(n_symbols)  # 0 = simbolo non ancora quotato
+        self.peak_price = np.zeros(n_symbols)  # Massimo dall'apertura della posizione (trailing stop)
+        self.pending = [[] for _ in range(n_symbols)]
+        self.trades = []  # (timestamp, simbolo, lato, quantità, prezzo, commissione)
+        self.rejected = 0
+        self.timestamp = None
+        self._history = deque(maxlen=self.optimizer_window * max(n_symbols, 1))
+
+    # ===========================
+    # 🔹 Ordini
+    # ===========================
+    def equity(self):
+        return self.cash + float(self.positions @ self.last_price)
+
+    def submit_order(self, symbol, side, notional=None, quantity=None):
+        """Ordine a mercato: acquisto per `notional` (default: dimensionato dal RiskManagement), vendita per `quantity`."""
+        index = self.symbol_index[symbol] if isinstance(symbol, str) else symbol
+        if side > 0:
+            if self.risk_manager is not None and self.risk_manager.kill_switch_activated:
+                self.rejected += 1
+                return False
+            if notional is None:
+                notional = (self.risk_manager.calculate_position_size(self.cash, {"momentum": 0.0})
+                            if self.risk_manager is not None else self.cash * DEFAULT_POSITION_FRACTION)
+        self.pending[index].append((side, notional, quantity))
+        return True
+
+    def _execute_pending(self, index, price, bid, ask):
+        """Esegue gli ordini in attesa del simbolo al prezzo dell'evento corrente (niente look-ahead)."""
+        orders, self.pending[index] = self.pending[index], []
+        symbol = self.symbols[index]
+        for side, notional, quantity in orders:
+            fill_price = self.fills.fill_price(side, price, symbol, bid, ask)
+            if side > 0:
+                notional = min(notional, self.cash / (1 + self.fills.fee))
+                if notional <= 0:
+                    self.rejected += 1
+                    continue
+                quantity = notional / fill_price
+                fee = notional * self.fills.fee
+                self.cash -= notional + fee
+                if self.positions[index] == 0:
+                    self.peak_price[index] = fill_price
+                self.positions[index] += quantity
+            else:
+                quantity = min(quantity if quantity is not None else self.positions[index], self.positions[index])
+                if quantity <= 0:
+                    self.rejected += 1
+                    continue
+                fee = quantity * fill_price * self.fills.fee
+                self.cash += quantity * fill_price - fee
+                self.positions[index] -= quantity
+            self.trades.append((self.timestamp, index, side, quantity, fill_price, fee))
+            if self.strategy is not None:
+                self.strategy(self, Event(FILL, self.timestamp, symbol, fill_price, quantity))
+
+    # ===========================
+    # 🔹 Gestione del Rischio e Ribilanciamento
+    # ===========================
+    def _apply_trailing_stops(self, index, price):
+        if self.positions[index] <= 0 or self.risk_manager is None:
+            return
+        self.peak_price[index] = max(self.peak_price[index], price)
+        if price < self.peak_price[index] * (1 - self.risk_manager.trailing_stop_pct) and not self.pending[index]:
+            self.submit_order(index, -1)
+
+    def _check_risk(self):
+        equity = self.equity()
+        self.risk_manager.highest_balance = max(self.risk_manager.highest_balance, equity)
+        self.risk_manager.check_drawdown(equity)
+
+    def _rebalance(self):
+        """Pesi dal PortfolioOptimizer sulla finestra recente di chiusure, tradotti in ordini."""
+        from pypfopt.exceptions import OptimizationError
+        window = pd.DataFrame(list(self._history), columns=["timestamp", "symbol", "close"])
+        if window["timestamp"].nunique() < 3:
+            return  # Storia insufficiente per stimare rendimenti e covarianze
+        self.portfolio_optimizer.market_data = window
+        self.portfolio_optimizer.balance = self.equity()
+        try:
+            weights = self.portfolio_optimizer.optimize_portfolio()
+        except OptimizationError as e:  # Solo il mancato ottimo del solver: ogni altro errore interrompe il backtest
+            logging.warning(f"⚠️ Ribilanciamento saltato, ottimizzazione non riuscita: {e}")
+            return
+        equity = self.equity()
+        for symbol, weight in dict(weights).items():
+            index = self.symbol_index.get(symbol)
+            if index is None or self.last_price[index] <= 0:
+                continue
+            delta = weight * equity - self.positions[index] * self.last_price[index]
+            if delta > 0:
+                self.submit_order(index, 1, notional=delta)
+            elif delta < 0:
+                self.submit_order(index, -1, quantity=-delta / self.last_price[index])
+
+    # ===========================
+    # 🔹 Replay
+    # ===========================
+    def run(self):
+        """Esegue il replay completo e restituisce metriche, throughput e hash deterministico del risultato."""
+        self.reset()
+        # Liste Python: l'accesso per elemento è molto più rapido che su scalari NumPy
+        stream = {name: values.tolist() for name, values in self.stream.items() if name != "symbols"}
+        timestamps, kinds, symbol_ids = stream["timestamp"], stream["kind"], stream["symbol"]
+        prices, sizes, bids, asks = stream["price"], stream["size"], stream["bid"], stream["ask"]
+        n_events = len(timestamps)
+        equity_curve = np.empty(int(np.count_nonzero(self.stream["kind"] == BAR_CLOSE)))
+        bars_seen = 0
+
+        start = time.perf_counter()
+        for i in range(n_events):
+            index, price = symbol_ids[i], prices[i]
+            self.timestamp = timestamps[i]
+            self.last_price[index] = price
+            if self.pending[index]:
+                self._execute_pending(index, price, bids[i], asks[i])
+            self._apply_trailing_stops(index, price)
+
+            if self.strategy is not None:
+                self.strategy(self, Event(kinds[i], self.timestamp, self.symbols[index], price, sizes[i]))
+            if kinds[i] != BAR_CLOSE:
+                continue
+
+            self._history.append((self.timestamp, self.symbols[index], price))
+            equity_curve[bars_seen] = self.equity()
+            bars_seen += 1
+            if self.risk_manager is not None and self.risk_check_every and bars_seen % self.risk_check_every == 0:
+                self._check_risk()
+            if self.portfolio_optimizer is not None and self.rebalance_every and bars_seen % self.rebalance_every == 0:
+                self._rebalance()
+        elapsed = time.perf_counter() - start
+
+        processed = n_events + len(self.trades)
+        trades = np.array(self.trades, dtype=np.float64).reshape(-1, 6)
+        result = {
+            "final_equity": self.equity(),
+            "return": self.equity() / self.initial_balance - 1,
+            "trades": len(self.trades),
+            "rejected_orders": self.rejected,
+            "fees": float(trades[:, 5].sum()),
+            "events": processed,
+            "events_per_sec": processed / elapsed if elapsed > 0 else float("inf"),
+            "equity_curve": equity_curve,
+            "hash": result_hash(trades, equity_curve),
+        }
+        logging.info(f"🏁 Backtest: {processed:,} eventi in {elapsed:.2f}s ({result['events_per_sec']:,.0f} eventi/s), "
+                     f"{result['trades']} esecuzioni, rendimento {result['return']:+.2%}, hash {result['hash'][:16]}")
+        return result
+
+
+def result_hash(trades, equity_curve, decimals=8):
+    """Hash SHA-256 di esecuzioni ed equity (arrotondate) per i test di regressione."""
+    digest = hashlib.sha256()
+    digest.update(np.round(trades, decimals).tobytes())
+    digest.update(np.round(equity_curve, decimals).tobytes())
+    return digest.hexdigest()
+
+
+# ===========================
+# 🔹 Strategia di Esempio
+# ===========================
+def sma_crossover_strategy(fast=10, slow=30):
+    """Incrocio di medie mobili sulle chiusure: acquisto sopra, vendita sotto."""
+    closes = {}
+
+    def strategy(engine, event):
+        if event.kind != BAR_CLOSE:
+            return
+        window = closes.setdefault(event.symbol, deque(maxlen=slow))
+        window.append(event.price)
+        if len(window) < slow:
+            return
+        fast_mean = sum(list(window)[-fast:]) / fast
+        slow_mean = sum(window) / slow
+        held = engine.positions[engine.symbol_index[event.symbol]] > 0
+        if fast_mean > slow_mean and not held:
+            engine.submit_order(event.symbol, 1)
+        elif fast_mean < slow_mean and held:
+            engine.submit_order(event.symbol, -1)
+
+    return strategy
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n_bars, coins = 50_000, ["bitcoin", "ethereum", "solana"]
+    synthetic = pd.DataFrame({
+        "timestamp": np.repeat(np.arange(n_bars) * 60_000, len(coins)),
+        "coin_id": coins * n_bars,
+        "close": 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n_bars * len(coins)))),
+        "volume": rng.uniform(1e3, 1e5, n_bars * len(coins)),
+    })
+    BacktestEngine(synthetic, strategy=sma_crossover_strategy()).run()
@@ -0,0 +1,170 @@
+# batched_env.py - Ambiente di trading batched: B episodi indipendenti avanzano in lockstep come array
+import time
+import logging
+import numpy as np
+import pandas as pd
+from stable_baselines3.common.vec_env import VecEnv
+
+try:
+    from gymnasium import spaces  # stable-baselines3 >= 2.0
+except ImportError:
+    from gym import spaces
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+SCALPING_FEE = 0.0005
+STANDARD_FEE = 0.001
+INVEST_FRACTION = 0.05  # Quota del saldo investita ad ogni BUY (come lo scalping di trading_environment)
+MAX_DRAWDOWN = 0.05  # Stesso controllo di drawdown di trading_environment.step
+
+
+class BatchedTradingVecEnv(VecEnv):
+    """B episodi di trading simulati insieme: saldi, posizioni, commissioni e drawdown sono operazioni vettoriali.
+
+    Espone l'interfaccia VecEnv di stable-baselines3; gli episodi terminati vengono
+    riavviati automaticamente da un punto casuale dello storico.
+    """
+
+    def __init__(self, data, num_envs=1024, initial_balance=100.0, max_steps=500, scalping=True,
+                 invest_fraction=INVEST_FRACTION, price_column="close", seed=None):
+        frame = data.select_dtypes(include=[np.number])
+        self.prices = np.ascontiguousarray(np.asarray(data[price_column], dtype=np.float64))
+        self.market = np.ascontiguousarray(frame.to_numpy(dtype=np.float32))
+        if len(self.prices) < 3:
+            raise ValueError("❌ Dati insufficienti per l'ambiente batched.")
+
+        self.max_steps = min(max_steps, len(self.prices) - 2)
+        self.initial_balance = float(initial_balance)
+        self.fee = SCALPING_FEE if scalping else STANDARD_FEE
+        self.invest_fraction = invest_fraction
+        self.rng = np.random.default_rng(seed)
+
+        self.balance = np.full(num_envs, self.initial_balance)
+        self.shares_held = np.zeros(num_envs)
+        self.net_worth = np.full(num_envs, self.initial_balance)
+        self.start = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.episode_returns = np.zeros(num_envs)
+        self._actions = None
+
+        observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(self.market.shape[1] + 2,), dtype=np.float32)
+        super().__init__(num_envs, observation_space, spaces.Discrete(3))
+
+    # ===========================
+    # 🔹 Stato e Osservazioni
+    # ===========================
+    def _reset_envs(self, mask):
+        """Riavvia gli episodi selezionati da un punto casuale dello storico."""
+        count = int(mask.sum())
+        if count == 0:
+            return
+        self.start[mask] = self.rng.integers(0, len(self.prices) - self.max_steps - 1, size=count)
+        self.steps[mask] = 0
+        self.balance[mask] = self.initial_balance
+        self.shares_held[mask] = 0.0
+        self.net_worth[mask] = self.initial_balance
+        self.episode_returns[mask] = 0.0
+
+    def _observations(self):
+        """Riga di mercato corrente + saldo e valore della posizione normalizzati sul capitale iniziale."""
+        index = self.start + self.steps
+        obs = np.empty((self.num_envs, self.observation_space.shape[0]), dtype=np.float32)
+        obs[:, :-2] = self.market[index]
+        obs[:, -2] = self.balance / self.initial_balance
+        obs[:, -1] = self.shares_held * self.prices[index] / self.initial_balance
+        return obs
+
+    # ===========================
+    # 🔹 Interfaccia VecEnv
+    # ===========================
+    def reset(self):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._observations()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self._actions
+        price = self.prices[self.start + self.steps]
+
+        # SELL: chiude tutta la posizione al netto delle commissioni
+        sell = (actions == 0) & (self.shares_held > 0)
+        self.balance += np.where(sell, self.shares_held * price * (1 - self.fee), 0.0)
+        self.shares_held[sell] = 0.0
+
+        # BUY: investe una quota del saldo disponibile
+        buy = (actions == 2) & (self.balance > 0)
+        invest_amount = np.where(buy, self.balance * self.invest_fraction, 0.0)
+        self.shares_held += invest_amount / price * (1 - self.fee)
+        self.balance -= invest_amount
+
+        self.net_worth = self.balance + self.shares_held * price
+        self.steps += 1
+
+        rewards = self.net_worth - self.balance
+        self.episode_returns += rewards
+        drawdown = rewards < -MAX_DRAWDOWN * self.balance  # Fermo protettivo come in trading_environment
+        dones = (self.steps >= self.max_steps) | drawdown
+
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            terminal_obs = self._observations()
+            for i in np.flatnonzero(dones):
+                infos[i]["terminal_observation"] = terminal_obs[i]
+                infos[i]["episode"] = {"r": float(self.episode_returns[i]), "l": int(self.steps[i])}
+                infos[i]["TimeLimit.truncated"] = bool(not drawdown[i])
+            self._reset_envs(dones)
+
+        return self._observations(), rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._get_indices(indices))
+
+    def _get_indices(self, indices):
+        if indices is None:
+            return range(self.num_envs)
+        return [indices] if isinstance(indices, int) else indices
+
+
+# ===========================
+# 🔹 Benchmark
+# ===========================
+def benchmark_batched_env(data, batch_sizes=(1, 64, 1024, 4096), steps=1_000, seed=0):
+    """Misura gli step/sec dell'ambiente batched al crescere di B."""
+    results = {}
+    rng = np.random.default_rng(seed)
+    for batch_size in batch_sizes:
+        env = BatchedTradingVecEnv(data, num_envs=batch_size, seed=seed)
+        env.reset()
+        actions = rng.integers(0, 3, size=(steps, batch_size))
+        start = time.perf_counter()
+        for step_actions in actions:
+            env.step(step_actions)
+        results[batch_size] = steps * batch_size / (time.perf_counter() - start)
+        logging.info(f"🏎️ B={batch_size}: {results[batch_size]:,.0f} step/s "
+                     f"(x{results[batch_size] / results[batch_sizes[0]]:.1f} rispetto a B={batch_sizes[0]}).")
+    return results
+
+
+if __name__ == "__main__":
+    synthetic = pd.DataFrame({"close": 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, 100_000)))})
+    benchmark_batched_env(synthetic)
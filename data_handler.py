@@ -6,7 +6,6 @@ import json
 import logging
 import websockets
 from datetime import datetime
-from sklearn.preprocessing import MinMaxScaler
 import data_api_module
 from indicators import TradingIndicators
 import shutil
@@ -24,8 +23,16 @@ WEBSOCKET_URL = "wss://stream.binance.com:9443/ws/btcusdt@trade"
 # Configurazione logging avanzato
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Creazione dello scaler per la normalizzazione dei dati
-scaler = MinMaxScaler()
+# Scaler per la normalizzazione dei dati (scikit-learn viene caricato al primo utilizzo)
+scaler = None
+
+def get_scaler():
+    """Restituisce lo scaler condiviso, creandolo solo quando serve."""
+    global scaler
+    if scaler is None:
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler()
+    return scaler
 
 async def process_websocket_message(message):
     """Elabora il messaggio ricevuto dal WebSocket per dati real-time per scalping."""
@@ -53,21 +60,32 @@ async def process_websocket_message(message):
     except Exception as e:
         logging.error(f"❌ Errore nell'elaborazione del messaggio WebSocket: {e}")
 
-async def consume_websocket():
-    """Consuma dati dal WebSocket per operazioni di scalping."""
+async def consume_websocket(pair_ranking=None):
+    """Consuma dati dal WebSocket per operazioni di scalping.
+
+    Con `pair_ranking` (PairRankingService) la connessione segue le coppie classificate tramite SUBSCRIBE/UNSUBSCRIBE.
+    """
     async with websockets.connect(WEBSOCKET_URL) as websocket:
         logging.info("✅ Connessione WebSocket stabilita per dati real-time.")
+        subscriber = None
+        if pair_ranking is not None:
+            from pair_scheduler import websocket_subscriber
+            subscriber = pair_ranking.subscribe(websocket_subscriber(websocket, asyncio.get_running_loop()))
         try:
             async for message in websocket:
                 await process_websocket_message(message)
         except websockets.ConnectionClosed:
             logging.warning("⚠️ Connessione WebSocket chiusa. Riconnessione in corso...")
+            if subscriber is not None:
+                pair_ranking.unsubscribe(subscriber)  # La nuova connessione si registra di nuovo
             await asyncio.sleep(5)
-            await consume_websocket()
+            await consume_websocket(pair_ranking)
         except Exception as e:
             logging.error(f"❌ Errore durante la ricezione dei dati WebSocket: {e}")
+            if subscriber is not None:
+                pair_ranking.unsubscribe(subscriber)
             await asyncio.sleep(5)
-            await consume_websocket()
+            await consume_websocket(pair_ranking)
 
 async def fetch_and_prepare_historical_data():
     """Scarica, elabora e normalizza i dati storici."""
@@ -90,39 +108,44 @@ async def fetch_and_prepare_historical_data():
         logging.error(f"❌ Errore durante il processo di dati storici: {e}")
         return pd.DataFrame()
 
+def load_raw_ohlcv(filename=RAW_DATA_FILE):
+    """Barre OHLCV grezze (non normalizzate) di tutte le coin, con timestamp come colonna."""
+    with open(filename, "r") as file:
+        raw_data = json.load(file)
+
+    historical_data_list = []
+    for crypto in raw_data:
+        prices = crypto.get("historical_prices", [])
+        for entry in prices:
+            try:
+                timestamp = entry.get("timestamp")
+                open_price = entry.get("open")
+                high_price = entry.get("high")
+                low_price = entry.get("low")
+                close_price = entry.get("close")
+                volume = entry.get("volume")
+
+                if timestamp and close_price:
+                    historical_data_list.append({
+                        "timestamp": timestamp,
+                        "coin_id": crypto.get("id", "unknown"),
+                        "close": close_price,
+                        "open": open_price,
+                        "high": high_price,
+                        "low": low_price,
+                        "volume": volume,
+                    })
+            except Exception as e:
+                logging.error(f"⚠️ Errore nel parsing dei dati storici per {crypto.get('id', 'unknown')}: {e}")
+
+    df = pd.DataFrame(historical_data_list)
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
 def process_historical_data():
     """Elabora e normalizza i dati storici."""
     try:
-        with open(RAW_DATA_FILE, "r") as file:
-            raw_data = json.load(file)
-
-        historical_data_list = []
-        for crypto in raw_data:
-            prices = crypto.get("historical_prices", [])
-            for entry in prices:
-                try:
-                    timestamp = entry.get("timestamp")
-                    open_price = entry.get("open")
-                    high_price = entry.get("high")
-                    low_price = entry.get("low")
-                    close_price = entry.get("close")
-                    volume = entry.get("volume")
-
-                    if timestamp and close_price:
-                        historical_data_list.append({
-                            "timestamp": timestamp,
-                            "coin_id": crypto.get("id", "unknown"),
-                            "close": close_price,
-                            "open": open_price,
-                            "high": high_price,
-                            "low": low_price,
-                            "volume": volume,
-                        })
-                except Exception as e:
-                    logging.error(f"⚠️ Errore nel parsing dei dati storici per {crypto.get('id', 'unknown')}: {e}")
-
-        df = pd.DataFrame(historical_data_list)
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df = load_raw_ohlcv()
         df.set_index("timestamp", inplace=True)
 
         # Calcolo degli indicatori tecnici sui dati storici
@@ -146,7 +169,7 @@ def normalize_data(df):
     """Normalizza i dati per il trading AI."""
     try:
         cols_to_normalize = ["close", "open", "high", "low", "volume", "rsi", "macd", "macd_signal", "ema", "bollinger_upper", "bollinger_lower"]
-        df[cols_to_normalize] = scaler.fit_transform(df[cols_to_normalize])
+        df[cols_to_normalize] = get_scaler().fit_transform(df[cols_to_normalize])
         return df
     except Exception as e:
         logging.error(f"❌ Errore durante la normalizzazione dei dati: {e}")
@@ -4,19 +4,11 @@ import os
 import time
 import logging
 import requests
-import optuna
 import numpy as np
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
 import shutil
+import itertools
 from pathlib import Path
 from datetime import datetime
-from stable_baselines3 import PPO, DQN, A2C, SAC
-from stable_baselines3.common.vec_env import DummyVecEnv
-from stable_baselines3.common.buffers import ReplayBuffer
-from stable_baselines3.common.callbacks import CheckpointCallback
-from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 from trading_environment import TradingEnv
 from data_handler import load_normalized_data
 from data_api_module import main_fetch_all_data as load_raw_data
@@ -40,18 +32,46 @@ CLOUD_BACKUP_DIR.mkdir(parents=True, exist_ok=True)
 # 📌 URL per il backup su Cloud
 CLOUD_BACKUP_URL = "https://your-cloud-backup-service.com/upload"
 
+# 📌 Contatore per dare un nome univoco agli agenti senza nome (vista sul replay buffer condiviso)
+_agent_counter = itertools.count()
+
+# 📌 Numero di ambienti in sottoprocessi per i rollout (1 = ambiente singolo nel processo principale)
+N_ENVS = 1
+
 # ===========================
 # 🔹 Rete Neurale Personalizzata con PyTorch
 # ===========================
-class CustomFeatureExtractor(BaseFeaturesExtractor):
-    def __init__(self, observation_space, features_dim=128):
-        super(CustomFeatureExtractor, self).__init__(observation_space, features_dim)
-        self.fc1 = nn.Linear(observation_space.shape[0], 256)
-        self.fc2 = nn.Linear(256, features_dim)
-
-    def forward(self, x):
-        x = F.relu(self.fc1(x))
-        return self.fc2(x)
+# 📌 torch e stable-baselines3 vengono importati solo al primo utilizzo:
+# `drl_agent.CustomFeatureExtractor` viene costruita su richiesta (PEP 562).
+_custom_feature_extractor = None
+
+def _build_custom_feature_extractor():
+    """Costruisce la classe CustomFeatureExtractor importando torch solo quando serve."""
+    global _custom_feature_extractor
+    if _custom_feature_extractor is None:
+        import torch.nn as nn
+        import torch.nn.functional as F
+        from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+        class CustomFeatureExtractor(BaseFeaturesExtractor):
+            def __init__(self, observation_space, features_dim=128):
+                super(CustomFeatureExtractor, self).__init__(observation_space, features_dim)
+                self.fc1 = nn.Linear(observation_space.shape[0], 256)
+                self.fc2 = nn.Linear(256, features_dim)
+
+            def forward(self, x):
+                x = F.relu(self.fc1(x))
+                return self.fc2(x)
+
+        CustomFeatureExtractor.__qualname__ = "CustomFeatureExtractor"  # Serializzabile come drl_agent.CustomFeatureExtractor
+        _custom_feature_extractor = CustomFeatureExtractor
+    return _custom_feature_extractor
+
+def __getattr__(name):
+    """Risolve in modo lazy gli attributi che dipendono da torch."""
+    if name == "CustomFeatureExtractor":
+        return _build_custom_feature_extractor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ===========================
 # 🔹 FUNZIONI DI BACKUP AUTOMATICO
@@ -68,9 +88,15 @@ def backup_model_to_cloud(model_path):
     except Exception as e:
         logging.error(f"❌ Errore nel backup su cloud: {e}")
 
-def save_model(model, model_name):
-    """Salva il modello localmente e ne esegue il backup su cloud."""
+def save_model(model, model_name, checkpointer=None):
+    """Salva il modello localmente e ne esegue il backup su cloud.
+
+    Con un `checkpointer` salvataggio e upload avvengono sul suo thread in background.
+    """
     model_path = MODEL_DIR / model_name
+    if checkpointer is not None:
+        checkpointer.submit_final(model, model_path)
+        return
     model.save(model_path)
     logging.info(f"✅ Modello salvato in {model_path}.")
     backup_model_to_cloud(model_path)
@@ -79,13 +105,17 @@ def save_model(model, model_name):
 # 🔹 CLASSE DRLAgent CON GESTIONE AVANZATA
 # ===========================
 class DRLAgent:
-    def __init__(self, trading_mode="auto", algorithm="PPO"):
+    def __init__(self, trading_mode="auto", algorithm="PPO", agent_name=None):
         """Inizializza l'agente di trading."""
         self.trading_mode = trading_mode
         self.algorithm = algorithm
+        self.agent_name = agent_name or f"{algorithm}_{next(_agent_counter)}"
         self.exchange = None
-        self.replay_buffer = ReplayBuffer(buffer_size=1000000)
+        # 📌 Vista per-agente su un replay buffer condiviso: la memoria viene allocata solo alla prima transizione
+        from replay_storage import get_shared_replay_storage
+        self.replay_buffer = get_shared_replay_storage().view(self.agent_name)
         self.risk_manager = RiskManagement()  # ✅ Integrazione della gestione del rischio
+        self.live_policy = None  # Percorso di inferenza live, caricato al primo predict
 
         if self.trading_mode == "auto":
             self.trading_mode = self.detect_best_mode()
@@ -103,6 +133,24 @@ class DRLAgent:
         market_data = load_normalized_data()
         return "live" if not market_data.empty else "backtest"
 
+    def load_live_policy(self, model_name="best_model.zip", trace=False):
+        """Prepara l'inferenza a bassa latenza del modello allenato (CPU, thread fissi, niente autograd)."""
+        from live_inference import load_live_policy
+        self.live_policy = load_live_policy(MODEL_DIR / model_name, self.algorithm, trace=trace)
+        return self.live_policy
+
+    def predict(self, state):
+        """Azione deterministica per lo stato corrente."""
+        if self.live_policy is None:
+            self.load_live_policy()
+        return self.live_policy.predict(state)
+
+    def predict_batch(self, states):
+        """Azioni per più account/simboli ({chiave: stato}) in un unico forward della policy."""
+        if self.live_policy is None:
+            self.load_live_policy()
+        return self.live_policy.predict_batch(states)
+
     def execute_trade(self, pair, amount):
         """Esegue un'operazione di trading con gestione del rischio."""
         amount = self.risk_manager.apply_risk_management(pair, amount)  # 📌 🔥 Applica la gestione del rischio
@@ -121,10 +169,25 @@ class DRLAgent:
 # ===========================
 # 🔹 TRAINING E TEST DELL'AGENTE
 # ===========================
-def train_agent(model_name="best_model.zip", total_timesteps=100_000, algorithm="PPO"):
+def hyperparameter_tuning(algorithm="PPO", n_trials=None):
+    """Ricerca degli iperparametri su studio Optuna persistente: riprende il lavoro già fatto invece di ripartire da zero."""
+    from hyperparameter_search import tune_hyperparameters, DEFAULT_TRIALS
+    return tune_hyperparameters(algorithm, n_trials=n_trials or DEFAULT_TRIALS)
+
+def train_agent(model_name="best_model.zip", total_timesteps=100_000, algorithm="PPO", n_envs=N_ENVS):
     """Allena l'agente RL e usa il miglior portafoglio ottimizzato per il trading."""
-    env = DummyVecEnv([lambda: TradingEnv()])
-    best_params = hyperparameter_tuning()
+    from stable_baselines3 import PPO, DQN, A2C, SAC
+    from stable_baselines3.common.vec_env import DummyVecEnv
+    from async_checkpoint import AsyncCheckpointer, AsyncCheckpointCallback
+
+    shared_data = None
+    if n_envs > 1:
+        # 📌 Rollout paralleli: un simbolo o una fetta temporale per worker, dati in memoria condivisa
+        from parallel_envs import build_vec_env
+        env, shared_data = build_vec_env(load_normalized_data(), n_envs)
+    else:
+        env = DummyVecEnv([lambda: TradingEnv()])
+    best_params = hyperparameter_tuning(algorithm) if algorithm != "SAC" else {}
 
     # 📌 🔥 Ottimizziamo il portafoglio prima di allenare il modello
     portfolio_manager = PortfolioOptimization()
@@ -133,20 +196,28 @@ def train_agent(model_name="best_model.zip", total_timesteps=100_000, algorithm=
     logging.info(f"📊 Coppie di trading ottimizzate selezionate: {optimized_pairs}")
 
     if algorithm == "PPO":
-        model = PPO("MlpPolicy", env, verbose=1)
+        model = PPO("MlpPolicy", env, verbose=1, **best_params)
     elif algorithm == "DQN":
-        model = DQN("MlpPolicy", env, verbose=1)
+        model = DQN("MlpPolicy", env, verbose=1, **best_params)
     elif algorithm == "A2C":
-        model = A2C("MlpPolicy", env, verbose=1)
+        model = A2C("MlpPolicy", env, verbose=1, **best_params)
     elif algorithm == "SAC":
         model = SAC("MlpPolicy", env, verbose=1)
     else:
         raise ValueError("Algoritmo RL non supportato.")
 
-    checkpoint_callback = CheckpointCallback(save_freq=10_000, save_path=str(MODEL_DIR), name_prefix="trading_model")
-    model.learn(total_timesteps=total_timesteps, callback=checkpoint_callback)
-
-    save_model(model, model_name)
+    # 📌 Checkpoint: il learner copia solo i pesi in memoria, serializzazione e upload girano in background
+    checkpointer = AsyncCheckpointer(MODEL_DIR, name_prefix="trading_model", upload_fn=backup_model_to_cloud)
+    # save_freq è contato per chiamata a step(): con N ambienti ogni chiamata vale N step
+    checkpoint_callback = AsyncCheckpointCallback(checkpointer, save_freq=max(10_000 // env.num_envs, 1))
+    try:
+        model.learn(total_timesteps=total_timesteps, callback=checkpoint_callback)
+        save_model(model, model_name, checkpointer)
+    finally:
+        checkpointer.close()
+        if shared_data is not None:
+            env.close()
+            shared_data.close()
 
 # ===========================
 # 🔹 AVVIO AUTOMATICO SU ORACLE FREE 24/7
@@ -0,0 +1,183 @@
+# env_core.py - Nucleo array-based per gli step degli ambienti di trading
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+VOLATILITY_WINDOW = 10  # Barre precedenti usate per la volatilità dello scalping
+VOLATILITY_THRESHOLD = 0.02  # Soglia per attivare scalping
+
+ACCOUNT_FIELDS = ("balance", "shares_held", "net_worth")
+
+
+class AccountView:
+    """Vista dict-like su una riga degli array degli account (`account["balance"]`, ecc.)."""
+
+    __slots__ = ("_core", "_index")
+
+    def __init__(self, core, index):
+        self._core = core
+        self._index = index
+
+    def __getitem__(self, field):
+        return getattr(self._core, field)[self._index]
+
+    def __setitem__(self, field, value):
+        getattr(self._core, field)[self._index] = value
+
+    def get(self, field, default=None):
+        return self[field] if field in ACCOUNT_FIELDS else default
+
+    def __repr__(self):
+        return repr({field: float(self[field]) for field in ACCOUNT_FIELDS})
+
+
+class ArrayEnvCore:
+    """Prezzi, volatilità, osservazioni e stato degli account in array NumPy contigui.
+
+    Tutto ciò che dipende solo dai dati viene calcolato una volta; ogni step
+    si riduce a poche operazioni scalari sugli array.
+    """
+
+    def __init__(self, data, initial_balances, price_column="close",
+                 volatility_window=VOLATILITY_WINDOW, volatility_threshold=VOLATILITY_THRESHOLD):
+        self.account_names = list(initial_balances)
+        self.index = {name: i for i, name in enumerate(self.account_names)}
+        self.initial_balances = np.array([initial_balances[name] for name in self.account_names], dtype=np.float64)
+
+        self.balance = self.initial_balances.copy()
+        self.shares_held = np.zeros(len(self.account_names), dtype=np.float64)
+        self.net_worth = self.initial_balances.copy()
+        self.accounts = {name: AccountView(self, i) for i, name in enumerate(self.account_names)}
+
+        self.volatility_window = volatility_window
+        self.volatility_threshold = volatility_threshold
+        self.load(data, price_column)
+
+    def load(self, data, price_column="close"):
+        """Fotografa prezzi, volatilità mobile e osservazioni in array contigui."""
+        close = pd.Series(np.asarray(data[price_column], dtype=np.float64))
+        self.prices = np.ascontiguousarray(close.to_numpy())
+
+        # Volatilità delle `volatility_window` barre precedenti (barra corrente esclusa), come np.std su iloc
+        volatility = close.rolling(self.volatility_window, min_periods=1).std(ddof=0).shift(1)
+        self.volatility = np.ascontiguousarray(volatility.to_numpy())
+        self.scalping = np.nan_to_num(self.volatility, nan=0.0) > self.volatility_threshold
+
+        self.observations = np.ascontiguousarray(data.select_dtypes(include=[np.number]).to_numpy(dtype=np.float32))
+        self.n_steps = len(self.prices)
+
+    def observation(self, step):
+        """Riga delle osservazioni per lo step (vista senza copia; l'ultima barra oltre la fine)."""
+        return self.observations[min(step, self.n_steps - 1)]
+
+    def reset(self, balances=None):
+        """Riporta gli account al saldo indicato (di default quello iniziale) senza posizioni aperte."""
+        self.balance[:] = self.initial_balances if balances is None else balances
+        self.shares_held[:] = 0.0
+        self.net_worth[:] = self.balance
+
+    def take_action(self, i, action, price, fee, invest_amount_fn):
+        """Esegue SELL (0) / HOLD (1) / BUY (2) per l'account `i` e aggiorna il net worth.
+
+        `invest_amount_fn(balance)` viene chiamata solo per un BUY con saldo disponibile.
+        """
+        if action == 0:
+            if self.shares_held[i] > 0:
+                self.balance[i] += self.shares_held[i] * price * (1 - fee)
+                self.shares_held[i] = 0.0
+        elif action == 2 and self.balance[i] > 0:
+            invest_amount = invest_amount_fn(self.balance[i])
+            self.shares_held[i] += (invest_amount / price) * (1 - fee)
+            self.balance[i] -= invest_amount
+        self.net_worth[i] = self.balance[i] + self.shares_held[i] * price
+
+    def rewards(self):
+        """Reward per account (net worth - saldo), come dict."""
+        return dict(zip(self.account_names, (self.net_worth - self.balance).tolist()))
+
+
+class FastPathMixin:
+    """Commuta un ambiente tra il percorso pandas originale e il nucleo array `self.core`."""
+
+    def _init_fast_path(self, enabled, initial_balances):
+        self.core = ArrayEnvCore(self._snapshot_data(), initial_balances)
+        self._snapshot_key = self._snapshot_source()
+        self.fast_path = False
+        self.set_fast_path(enabled)
+
+    def _snapshot_data(self):
+        """Dati fotografati nel nucleo (gli ambienti possono restringerli, es. alle coppie selezionate)."""
+        return self.data
+
+    def _snapshot_source(self):
+        tickers = getattr(self, "tickers", None)
+        return id(self.data), len(self.data), tuple(tickers) if isinstance(tickers, (list, tuple)) else tickers
+
+    def refresh_snapshot(self, force=False):
+        """Ricostruisce prezzi e osservazioni del nucleo se dati o coppie sono cambiati (chiamata al reset)."""
+        key = self._snapshot_source()
+        if force or key != self._snapshot_key:
+            self.core.load(self._snapshot_data())
+            self._snapshot_key = key
+            logging.info(f"🔄 Snapshot dell'ambiente ricostruito ({self.core.n_steps} barre).")
+
+    def _get_observation(self):
+        """Osservazione dello step corrente: riga dell'array sul percorso veloce, riga di `data` altrimenti."""
+        if self.fast_path:
+            return self.core.observation(self.current_step)
+        data = self._snapshot_data()
+        row = min(self.current_step, len(data) - 1)
+        return data.select_dtypes(include=[np.number]).iloc[row].to_numpy(dtype=np.float32)
+
+    def set_fast_path(self, enabled):
+        """Attiva/disattiva il nucleo array trasferendo lo stato degli account."""
+        if enabled and not self.fast_path:
+            for name, account in self.accounts.items():
+                view = self.core.accounts[name]
+                for field in ACCOUNT_FIELDS:
+                    view[field] = account.get(field, view[field])
+            self.accounts = self.core.accounts
+        elif not enabled and self.fast_path:
+            self.accounts = {name: {field: float(view[field]) for field in ACCOUNT_FIELDS}
+                             for name, view in self.core.accounts.items()}
+        self.fast_path = enabled
+
+    def _account_arrays(self):
+        """Saldi e net worth per account (ordine di `core.account_names`), senza copie sul percorso veloce."""
+        if self.fast_path:
+            return self.core.balance, self.core.net_worth
+        names = self.core.account_names
+        return [self.accounts[name]["balance"] for name in names], [self.accounts[name]["net_worth"] for name in names]
+
+
+# ===========================
+# 🔹 Benchmark Step/sec
+# ===========================
+def benchmark_env_step(env, steps=10_000, seed=0):
+    """Confronta gli step/sec di `_take_action` + `_is_scalping_condition` tra percorso pandas e nucleo array."""
+    rng = np.random.default_rng(seed)
+    n_steps = min(steps, len(env.data) - 1)
+    actions = rng.integers(0, 3, size=n_steps)
+    accounts = list(env.accounts)
+    results = {}
+
+    for fast_path in (False, True):
+        env.set_fast_path(True)
+        env.core.reset()  # Stesso stato iniziale per entrambi i percorsi
+        env.set_fast_path(fast_path)
+        start = time.perf_counter()
+        for step, action in enumerate(actions):
+            env.current_step = step
+            for account in accounts:
+                env._take_action(account, action)
+            if hasattr(env, "_is_scalping_condition"):
+                env._is_scalping_condition()
+        results["array" if fast_path else "pandas"] = n_steps / (time.perf_counter() - start)
+
+    logging.info(f"🏎️ {type(env).__module__}: pandas {results['pandas']:,.0f} step/s, "
+                 f"array {results['array']:,.0f} step/s (x{results['array'] / results['pandas']:.1f}).")
+    return results
@@ -0,0 +1,145 @@
+# feature_store.py - Cache su disco delle matrici di feature, indicizzata per impronta dei dati
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Percorso del feature store (USB se disponibile, altrimenti disco locale)
+FEATURE_STORE_DIR = Path("/mnt/usb_trading_data/feature_store") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/feature_store")
+
+METADATA_FILE = "metadata.json"
+MAX_ENTRIES_PER_SPEC = 3  # Versioni conservate per ogni specifica di feature
+
+
+def _hash_dataframe(df):
+    """Impronta del contenuto di un DataFrame (indice incluso)."""
+    digest = hashlib.sha256()
+    digest.update(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def _hash_partition(path):
+    """Impronta di una partizione su disco: percorso, dimensione e data di modifica."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def fingerprint_sources(sources):
+    """Calcola l'impronta delle sorgenti (file parquet/json, DataFrame o array)."""
+    if not isinstance(sources, (list, tuple)):
+        sources = [sources]
+
+    digest = hashlib.sha256()
+    for source in sources:
+        if isinstance(source, pd.DataFrame):
+            digest.update(_hash_dataframe(source).encode())
+        elif isinstance(source, np.ndarray):
+            digest.update(np.ascontiguousarray(source).tobytes())
+        elif os.path.exists(str(source)):
+            digest.update(_hash_partition(str(source)).encode())
+        else:
+            digest.update(f"missing:{source}".encode())  # Una partizione assente cambia comunque la chiave
+    return digest.hexdigest()[:16]
+
+
+def fingerprint_spec(spec):
+    """Calcola l'impronta della specifica delle feature (colonne, look_back, scaler...)."""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class FeatureStore:
+    """Salva le matrici di feature come file .npy memory-mappable, invalidati quando arrivano nuove barre."""
+
+    def __init__(self, root=FEATURE_STORE_DIR, max_entries_per_spec=MAX_ENTRIES_PER_SPEC):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries_per_spec = max_entries_per_spec
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, sources, spec):
+        """Chiave dell'entry: impronta della specifica + impronta delle sorgenti."""
+        return f"{fingerprint_spec(spec)}_{fingerprint_sources(sources)}"
+
+    def get(self, key):
+        """Restituisce gli array dell'entry in modalità memory-map, oppure None se assente."""
+        entry_dir = self.root / key
+        metadata_path = entry_dir / METADATA_FILE
+        if not metadata_path.exists():  # Il metadata viene scritto per ultimo: senza di esso l'entry è incompleta
+            return None
+        try:
+            with open(metadata_path, "r") as f:
+                metadata = json.load(f)
+            return {name: np.load(entry_dir / f"{name}.npy", mmap_mode="r") for name in metadata["arrays"]}
+        except Exception as e:
+            logging.warning(f"⚠️ Entry {key} del feature store illeggibile, verrà ricalcolata: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+    def put(self, key, arrays, spec=None):
+        """Salva gli array in modo atomico (directory temporanea + rename)."""
+        entry_dir = self.root / key
+        tmp_dir = self.root / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        for name, array in arrays.items():
+            np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(array))
+        with open(tmp_dir / METADATA_FILE, "w") as f:
+            json.dump({"arrays": list(arrays), "spec": spec, "created": time.time()}, f, default=str)
+
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # Un altro processo ha già salvato la stessa entry
+        self._prune(key.split("_")[0])
+        return self.get(key)
+
+    def get_or_compute(self, sources, spec, compute_fn):
+        """Restituisce le feature dalla cache o le calcola con `compute_fn()` e le salva."""
+        key = self.make_key(sources, spec)
+        arrays = self.get(key)
+        if arrays is not None:
+            self.hits += 1
+            logging.info(f"⚡ Feature caricate dal feature store ({key}).")
+            return arrays
+
+        self.misses += 1
+        start = time.perf_counter()
+        arrays = self.put(key, compute_fn(), spec)
+        logging.info(f"✅ Feature calcolate e salvate nel feature store ({key}) in {time.perf_counter() - start:.2f}s.")
+        return arrays
+
+    def _prune(self, spec_hash):
+        """Rimuove le versioni obsolete di una specifica, conservando le più recenti."""
+        entries = sorted(self.root.glob(f"{spec_hash}_*"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for stale in entries[self.max_entries_per_spec:]:
+            shutil.rmtree(stale, ignore_errors=True)
+            logging.info(f"🗑️ Entry obsoleta del feature store rimossa: {stale.name}")
+
+    def clear(self):
+        """Svuota completamente il feature store."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+
+def sliding_windows(series, look_back):
+    """Finestre (n - look_back, look_back[, colonne]) come vista senza copia, allineate a prepare_lstm_data.
+
+    Con meno di `look_back` barre restituisce un array vuoto, come prepare_lstm_data.
+    """
+    series = np.asarray(series)
+    if len(series) < look_back:
+        return np.empty((0, look_back) + series.shape[1:], dtype=series.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(series, look_back, axis=0)[:-1]
+    return windows if series.ndim == 1 else np.swapaxes(windows, 1, 2)
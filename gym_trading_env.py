@@ -6,7 +6,8 @@ import pandas as pd
 import data_handler
 from risk_management import RiskManagement
 import indicators
-import drl_agent
+from env_core import FastPathMixin
+from performance_recorder import PerformanceRecorder
 import logging
 import os
 import json
@@ -37,11 +38,11 @@ def backup_to_cloud(file_path):
     except Exception as e:
         logging.error(f"❌ Errore durante il backup su cloud: {e}")
 
-class TradingEnv(gym.Env):
+class TradingEnv(FastPathMixin, gym.Env):
     """
     Ambiente di trading AI con supporto per scalping e multi-account.
     """
-    def __init__(self, data: pd.DataFrame, initial_balances={"Danny": 100, "Giuseppe": 100}):
+    def __init__(self, data: pd.DataFrame, initial_balances={"Danny": 100, "Giuseppe": 100}, fast_path=True):
         super(TradingEnv, self).__init__()
         self.data = data_handler.load_normalized_data(data)
         self.current_step = 0
@@ -59,15 +60,24 @@ class TradingEnv(gym.Env):
         # Moduli di gestione del rischio per ogni account
         self.risk_management = {account: RiskManagement(self.accounts[account]["balance"], account) for account in self.accounts}
 
-        # AI Trading Agent (DRL) per ogni account
+        # AI Trading Agent (DRL) per ogni account (torch viene caricato solo qui)
+        import drl_agent
         self.drl_agents = {account: drl_agent.DRLAgent(model_type='PPO', data=self.data) for account in self.accounts}
 
         # 📌 Modalità scalping per alta volatilità
         self.scalping_mode = {account: False for account in self.accounts}
 
+        # 📌 Prezzi, volatilità e stato degli account in array contigui (step = poche operazioni scalari)
+        self._init_fast_path(fast_path, initial_balances)
+
+        # 📌 Metriche per step in array preallocati: log leggibili solo campionati e a fine episodio
+        self.recorder = PerformanceRecorder(self.core.account_names, name="gym_trading_env",
+                                            flush_dir=os.path.join(BACKUP_DIR, "metrics"))
+
     def reset(self):
         """Resetta l'ambiente e registra lo stato iniziale per il backtesting."""
         self.current_step = 0
+        self.refresh_snapshot()
         for account in self.accounts:
             self.accounts[account]["balance"] = self.accounts[account]["net_worth"]
             self.accounts[account]["shares_held"] = 0
@@ -87,12 +97,21 @@ class TradingEnv(gym.Env):
 
         self.current_step += 1
         done = self.current_step >= self.max_steps - 1
-        rewards = {account: self.accounts[account]["net_worth"] - self.accounts[account]["balance"] for account in self.accounts}
-        self.log_performance(actions)
+        if self.fast_path:
+            rewards = self.core.rewards()
+        else:
+            rewards = {account: self.accounts[account]["net_worth"] - self.accounts[account]["balance"] for account in self.accounts}
+        self.log_performance(actions, rewards)
         return self._get_observation(), rewards, done, {}
 
     def _take_action(self, account, action):
         """Esegue un'azione di trading per un account con gestione del rischio e delle commissioni."""
+        if self.fast_path:
+            risk = self.risk_management[account]
+            self.core.take_action(self.core.index[account], action, self.core.prices[self.current_step], 0.001,
+                                  lambda balance: min(risk.get_max_investment(balance), risk.get_risk_level()))
+            return
+
         current_price = self.data.iloc[self.current_step]['close']
         risk_limit = self.risk_management[account].get_risk_level()
         trading_fee = 0.001  # 0.1% commissione di trading
@@ -114,5 +133,15 @@ class TradingEnv(gym.Env):
 
     def _is_scalping_condition(self):
         """Determina se il mercato è adatto per lo scalping."""
+        if self.fast_path:
+            return bool(self.core.scalping[self.current_step])
         volatility = np.std(self.data.iloc[max(0, self.current_step-10):self.current_step]['close'])
         return volatility > 0.02  # Soglia per attivare scalping
+
+    def log_performance(self, actions, rewards=None):
+        """Registra lo step nel recorder; "RESET" chiude l'episodio con un riepilogo per account."""
+        if isinstance(actions, str):
+            self.recorder.end_episode()
+            return
+        balance, net_worth = self._account_arrays()
+        self.recorder.record(self.current_step, actions, balance, net_worth, rewards)
@@ -0,0 +1,241 @@
+# hyperparameter_search.py - Ricerca iperparametri Optuna parallela, persistente e con pruning
+import os
+import json
+import time
+import logging
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Studi Optuna persistenti (USB se disponibile, altrimenti disco locale)
+TUNING_DIR = Path("/mnt/usb_trading_data/tuning") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/tuning")
+
+DEFAULT_TRIALS = 50  # Trial totali per studio: le esecuzioni successive completano solo quelli mancanti
+TRIAL_TIMESTEPS = 20_000  # Timestep di training per trial
+EVAL_INTERVAL = 4_000  # Ogni quanti timestep riportare la reward intermedia al pruner
+EVAL_STEPS = 500  # Lunghezza del rollout breve di valutazione
+EVAL_SEED = 0  # Stessi episodi di valutazione per tutti i trial (reward confrontabili)
+CPUS_PER_TRIAL = 1
+
+# 📌 Spazi di ricerca per algoritmo (chiavi = argomenti dei costruttori stable-baselines3)
+SEARCH_SPACES = {
+    "PPO": {
+        "learning_rate": ("float_log", 1e-5, 1e-2),
+        "n_steps": ("categorical", [256, 512, 1024, 2048]),
+        "batch_size": ("categorical", [32, 64, 128, 256]),
+        "gamma": ("float", 0.9, 0.9999),
+        "gae_lambda": ("float", 0.8, 1.0),
+        "ent_coef": ("float_log", 1e-8, 1e-1),
+    },
+    "A2C": {
+        "learning_rate": ("float_log", 1e-5, 1e-2),
+        "n_steps": ("categorical", [5, 8, 16, 32]),
+        "gamma": ("float", 0.9, 0.9999),
+        "ent_coef": ("float_log", 1e-8, 1e-1),
+    },
+    "DQN": {
+        "learning_rate": ("float_log", 1e-5, 1e-2),
+        "batch_size": ("categorical", [32, 64, 128, 256]),
+        "gamma": ("float", 0.9, 0.9999),
+        "exploration_fraction": ("float", 0.05, 0.5),
+        "buffer_size": ("categorical", [10_000, 50_000, 100_000]),
+    },
+}
+
+
+# ===========================
+# 🔹 Studio Persistente
+# ===========================
+def storage_url(backend="sqlite"):
+    """Storage dello studio: SQLite (default) o journal file (più robusto con molti processi)."""
+    TUNING_DIR.mkdir(parents=True, exist_ok=True)
+    if backend == "journal":
+        from optuna.storages import JournalStorage
+        try:
+            from optuna.storages.journal import JournalFileBackend
+        except ImportError:  # optuna < 4.0
+            from optuna.storages import JournalFileStorage as JournalFileBackend
+        return JournalStorage(JournalFileBackend(str(TUNING_DIR / "optuna_journal.log")))
+    return f"sqlite:///{(TUNING_DIR / 'optuna_studies.db').as_posix()}"
+
+
+def make_pruner(kind="median"):
+    """Pruner per le reward intermedie: mediana o ASHA (successive halving asincrono)."""
+    import optuna
+    if kind == "asha":
+        return optuna.pruners.SuccessiveHalvingPruner(min_resource=1, reduction_factor=3)
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+
+
+def load_study(algorithm, backend="sqlite", pruner="median"):
+    """Crea o riprende lo studio persistente dell'algoritmo."""
+    import optuna
+    return optuna.create_study(study_name=f"drl_{algorithm}", storage=storage_url(backend),
+                               direction="maximize", pruner=make_pruner(pruner), load_if_exists=True)
+
+
+def warm_start(study, algorithm):
+    """Accoda una sola volta i migliori parametri salvati in uno studio nuovo (solo dal processo padre)."""
+    previous_best = load_best_params(algorithm)
+    if previous_best and not study.trials:
+        study.enqueue_trial(previous_best)  # Warm start dalla ricerca precedente
+        logging.info(f"🔥 Warm start dello studio {study.study_name} con {previous_best}")
+    return study
+
+
+def best_params_file(algorithm):
+    return TUNING_DIR / f"best_params_{algorithm}.json"
+
+
+def load_best_params(algorithm):
+    """Migliori parametri salvati per l'algoritmo, oppure None."""
+    path = best_params_file(algorithm)
+    if path.exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return None
+
+
+def save_best_params(algorithm, params):
+    TUNING_DIR.mkdir(parents=True, exist_ok=True)
+    with open(best_params_file(algorithm), "w") as f:
+        json.dump(params, f, indent=4)
+
+
+# ===========================
+# 🔹 Obiettivo con Pruning
+# ===========================
+def sample_params(trial, algorithm):
+    """Campiona i parametri dallo spazio di ricerca dell'algoritmo."""
+    params = {}
+    for name, (kind, *args) in SEARCH_SPACES[algorithm].items():
+        if kind == "categorical":
+            params[name] = trial.suggest_categorical(name, args[0])
+        elif kind == "float_log":
+            params[name] = trial.suggest_float(name, args[0], args[1], log=True)
+        else:
+            params[name] = trial.suggest_float(name, args[0], args[1])
+    return params
+
+
+def default_env_factory(coin_id=None):
+    """Ambiente batched sulle barre storiche di una sola coin: rollout brevi e veloci per la valutazione dei trial.
+
+    Senza `coin_id` usa la coin con più barre; per sceglierne un'altra passare
+    `functools.partial(default_env_factory, coin_id=...)` (resta picklable).
+    """
+    from batched_env import BatchedTradingVecEnv
+    from data_handler import load_processed_data, HISTORICAL_DATA_FILE
+    data = load_processed_data(HISTORICAL_DATA_FILE)
+    if "coin_id" in data.columns:
+        if coin_id is None:
+            coin_id = data["coin_id"].value_counts().sort_index(kind="stable").idxmax()
+        data = data[data["coin_id"] == coin_id]
+        if "timestamp" in data.columns:
+            data = data.sort_values("timestamp", kind="stable")
+        logging.info(f"🪙 Ambiente di tuning su {coin_id} ({len(data)} barre).")
+    return BatchedTradingVecEnv(data, num_envs=8)
+
+
+def evaluate_policy_reward(model, env, steps=EVAL_STEPS, seed=EVAL_SEED):
+    """Reward media per step di un rollout breve e deterministico, su episodi riproducibili (`seed`)."""
+    if seed is not None:
+        env.seed(seed)
+    obs = env.reset()
+    total = 0.0
+    for _ in range(steps):
+        actions, _ = model.predict(obs, deterministic=True)
+        obs, rewards, _, _ = env.step(actions)
+        total += float(np.mean(rewards))
+    return total / steps
+
+
+def objective(trial, algorithm, env_factory, timesteps=TRIAL_TIMESTEPS, eval_interval=EVAL_INTERVAL):
+    """Allena a blocchi, riporta la reward intermedia e interrompe i trial poco promettenti."""
+    import optuna
+    import stable_baselines3
+
+    params = sample_params(trial, algorithm)
+    env, eval_env = env_factory(), env_factory()
+    model = getattr(stable_baselines3, algorithm)("MlpPolicy", env, verbose=0, **params)
+
+    reward = float("-inf")
+    for step, done_timesteps in enumerate(range(eval_interval, timesteps + 1, eval_interval)):
+        model.learn(total_timesteps=eval_interval, reset_num_timesteps=False)
+        reward = evaluate_policy_reward(model, eval_env)
+        trial.report(reward, step)
+        if trial.should_prune():
+            raise optuna.TrialPruned(f"Reward {reward:.4f} dopo {done_timesteps} timestep")
+    return reward
+
+
+# ===========================
+# 🔹 Worker Paralleli
+# ===========================
+def limit_trial_cpus(cpus_per_trial, worker_index=None):
+    """Limita thread (anche dei pool BLAS già caricati) e (su Linux) core utilizzabili da ogni worker."""
+    from walk_forward import limit_worker_threads
+    limit_worker_threads(cpus_per_trial)
+    if worker_index is not None and hasattr(os, "sched_setaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+        start = (worker_index * cpus_per_trial) % len(available)
+        os.sched_setaffinity(0, available[start:start + cpus_per_trial] or available)
+    import torch
+    torch.set_num_threads(cpus_per_trial)
+
+
+def _run_worker(worker_index, algorithm, n_trials, backend, pruner, cpus_per_trial, env_factory):
+    """Processo worker: esegue `n_trials` trial sullo studio condiviso."""
+    import optuna
+    limit_trial_cpus(cpus_per_trial, worker_index)
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = load_study(algorithm, backend, pruner)
+    study.optimize(lambda trial: objective(trial, algorithm, env_factory), n_trials=n_trials,
+                   catch=(ValueError, RuntimeError))
+    return n_trials
+
+
+def tune_hyperparameters(algorithm="PPO", n_trials=DEFAULT_TRIALS, n_workers=None, cpus_per_trial=CPUS_PER_TRIAL,
+                         backend="sqlite", pruner="median", env_factory=default_env_factory):
+    """Porta lo studio a `n_trials` trial conclusi distribuendoli su più processi e restituisce i migliori parametri.
+
+    Uno studio già completo non esegue nuovi trial; `env_factory` deve essere una funzione di modulo (picklable).
+    """
+    import optuna
+    if algorithm not in SEARCH_SPACES:
+        logging.warning(f"⚠️ Nessuno spazio di ricerca per {algorithm}, uso i parametri di default.")
+        return {}
+
+    study = warm_start(load_study(algorithm, backend, pruner), algorithm)
+    finished = [t for t in study.trials if t.state in (optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)]
+    remaining = n_trials - len(finished)
+    if remaining <= 0:
+        logging.info(f"✅ Studio {study.study_name} già completo ({len(finished)} trial), nessun nuovo trial.")
+    else:
+        n_workers = max(1, min(n_workers or (os.cpu_count() or 1) // cpus_per_trial, remaining))
+        shares = [remaining // n_workers + (1 if i < remaining % n_workers else 0) for i in range(n_workers)]
+        logging.info(f"🔍 {remaining} trial da eseguire su {n_workers} processi ({cpus_per_trial} CPU per trial).")
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_run_worker, i, algorithm, share, backend, pruner, cpus_per_trial, env_factory)
+                       for i, share in enumerate(shares)]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"❌ Errore in un worker di tuning: {e}")
+        logging.info(f"⏱️ Tuning completato in {time.perf_counter() - start:.1f}s.")
+        study = load_study(algorithm, backend, pruner)
+
+    try:
+        best_params = study.best_params
+    except ValueError:
+        logging.warning("⚠️ Nessun trial completato con successo.")
+        return load_best_params(algorithm) or {}
+    save_best_params(algorithm, best_params)
+    logging.info(f"🏆 Migliori iperparametri {algorithm} (reward {study.best_value:.4f}): {best_params}")
+    return best_params
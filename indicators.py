@@ -13,6 +13,15 @@ SENTIMENT_API_URL = "https://your-sentiment-api.com/analyze"
 
 def calculate_indicators(data):
     """Calcola tutti gli indicatori tecnici principali e li aggiunge ai dati di mercato."""
+    data = calculate_technical_indicators(data)
+
+    # 📌 Sentiment Analysis da news e social media
+    data['Sentiment_Score'] = fetch_sentiment_data()
+
+    return data
+
+def calculate_technical_indicators(data):
+    """Indicatori ricavati solo dalle barre OHLCV (nessuna chiamata esterna): riproducibili e memorizzabili."""
     
     # 📌 RSI (Relative Strength Index) per trend reversal e scalping
     data['RSI'] = talib.RSI(data['close'], timeperiod=14)
@@ -56,9 +65,6 @@ def calculate_indicators(data):
     data['SuperTrend_Upper'] = data['close'] + (2 * atr)
     data['SuperTrend_Lower'] = data['close'] - (2 * atr)
 
-    # 📌 Sentiment Analysis da news e social media
-    data['Sentiment_Score'] = fetch_sentiment_data()
-
     return data
 
 def fetch_sentiment_data():
@@ -75,6 +81,10 @@ def fetch_sentiment_data():
         logging.error(f"❌ Errore API Sentiment Analysis: {e}")
         return np.nan
 
+def get_technical_indicators_list():
+    """Indicatori calcolati da calculate_technical_indicators (senza il sentiment)."""
+    return [name for name in get_indicators_list() if name != 'Sentiment_Score']
+
 def get_indicators_list():
     """Restituisce una lista di tutti gli indicatori disponibili."""
     return [
@@ -0,0 +1,200 @@
+# large_universe.py - Ottimizzazione del portafoglio su universi ampi (250+ asset) con modello fattoriale
+import time
+import logging
+import tracemalloc
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import squareform
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+N_FACTORS = 10
+MAX_CANDIDATES = 50  # Asset passati all'ottimizzazione media-varianza densa
+RECLUSTER_EVERY = 50  # Chiamate tra due ricalcoli del clustering HRP
+DTYPE = np.float32
+
+# 📌 Obiettivi del benchmark: secondi per fit + HRP + Sharpe massimo e picco di memoria in MB
+BENCHMARK_TARGETS = {100: (0.1, 16), 250: (0.25, 32), 1000: (1.0, 128)}
+
+
+# ===========================
+# 🔹 Covarianza Fattoriale
+# ===========================
+class FactorCovariance:
+    """Σ = B diag(f) B' + diag(d) con k fattori statistici: O(n k) in memoria invece di O(n²)."""
+
+    def __init__(self, loadings, factor_variance, specific_variance):
+        self.loadings = loadings  # (asset x fattori)
+        self.factor_variance = factor_variance
+        self.specific_variance = specific_variance
+
+    @classmethod
+    def fit(cls, returns, n_factors=N_FACTORS, dtype=DTYPE):
+        """Fattori principali dei rendimenti (barre x asset) via SVD della matrice centrata."""
+        values = np.asarray(returns, dtype=dtype)
+        centered = values - values.mean(axis=0)
+        n_factors = min(n_factors, min(centered.shape) - 1)
+        _, singular, vt = np.linalg.svd(centered, full_matrices=False)
+        loadings = np.ascontiguousarray(vt[:n_factors].T)
+        factor_variance = singular[:n_factors] ** 2 / (len(values) - 1)
+        total = centered.var(axis=0, ddof=1)
+        specific = np.maximum(total - (loadings ** 2) @ factor_variance, total * 1e-3)
+        return cls(loadings, factor_variance.astype(dtype), specific.astype(dtype))
+
+    def variance(self):
+        return (self.loadings ** 2) @ self.factor_variance + self.specific_variance
+
+    def matvec(self, weights, index=None):
+        """Σ w (eventualmente sul sottoinsieme `index`) senza costruire la matrice."""
+        loadings = self.loadings if index is None else self.loadings[index]
+        specific = self.specific_variance if index is None else self.specific_variance[index]
+        return loadings @ (self.factor_variance * (loadings.T @ weights)) + specific * weights
+
+    def dense(self, index=None):
+        loadings = self.loadings if index is None else self.loadings[index]
+        specific = self.specific_variance if index is None else self.specific_variance[index]
+        return (loadings * self.factor_variance) @ loadings.T + np.diag(specific)
+
+    def correlation(self):
+        dense = self.dense()
+        scale = 1 / np.sqrt(np.diag(dense))
+        return np.clip(dense * scale[:, None] * scale[None, :], -1, 1)
+
+
+# ===========================
+# 🔹 Ottimizzatore per Universi Ampi
+# ===========================
+class LargeUniverseOptimizer:
+    """Statistiche float32, covarianza fattoriale, clustering HRP in cache e preselezione dei candidati.
+
+    Il clustering (O(n²)) viene ricalcolato solo quando cambiano i simboli o ogni
+    `recluster_every` chiamate; la bisezione HRP usa Σ fattoriale (O(n k) per cluster).
+    """
+
+    def __init__(self, n_factors=N_FACTORS, max_candidates=MAX_CANDIDATES, recluster_every=RECLUSTER_EVERY,
+                 dtype=DTYPE):
+        self.n_factors = n_factors
+        self.max_candidates = max_candidates
+        self.recluster_every = recluster_every
+        self.dtype = dtype
+        self.symbols = []
+        self.mu = None
+        self.covariance = None
+        self._order = None
+        self._order_symbols = None
+        self._calls_since_cluster = 0
+        self._last_weights = {}  # Soluzione precedente di max_sharpe (partenza a caldo)
+        self.stats = {"clusterings": 0, "cache_hits": 0}
+
+    def fit(self, returns):
+        """Rendimenti (barre x asset) come DataFrame; gli asset con storico mancante vengono riempiti a 0."""
+        frame = returns if isinstance(returns, pd.DataFrame) else pd.DataFrame(returns)
+        self.symbols = list(frame.columns)
+        values = frame.to_numpy(dtype=self.dtype, na_value=0.0)
+        self.mu = values.mean(axis=0)
+        self.covariance = FactorCovariance.fit(values, self.n_factors, self.dtype)
+        return self
+
+    # 📌 Preselezione dei candidati
+    def preselect(self, max_candidates=None):
+        """Indici dei migliori asset per rendimento/volatilità (argpartition, nessun ordinamento completo)."""
+        max_candidates = max_candidates or self.max_candidates
+        score = self.mu / np.sqrt(self.covariance.variance())
+        if len(score) <= max_candidates:
+            return np.arange(len(score))
+        best = np.argpartition(-score, max_candidates - 1)[:max_candidates]
+        return best[np.argsort(-score[best])]
+
+    # 📌 HRP con clustering in cache
+    def _cluster_order(self):
+        self._calls_since_cluster += 1
+        if (self._order is not None and self._order_symbols == self.symbols
+                and self._calls_since_cluster < self.recluster_every):
+            self.stats["cache_hits"] += 1
+            return self._order
+        distance = np.sqrt(np.clip((1 - self.covariance.correlation()) / 2, 0, None))
+        np.fill_diagonal(distance, 0)
+        self._order = leaves_list(linkage(squareform(distance, checks=False), method="single"))
+        self._order_symbols = list(self.symbols)
+        self._calls_since_cluster = 0
+        self.stats["clusterings"] += 1
+        return self._order
+
+    def _cluster_variance(self, index, inverse_variance):
+        weights = inverse_variance[index] / inverse_variance[index].sum()
+        return float(weights @ self.covariance.matvec(weights, index))
+
+    def hrp_weights(self):
+        """Pesi Hierarchical Risk Parity (bisezione ricorsiva sull'ordine quasi-diagonale)."""
+        inverse_variance = 1 / self.covariance.variance()
+        weights = np.ones(len(self.symbols))
+        clusters = [self._cluster_order()]
+        while clusters:
+            clusters = [half for cluster in clusters if len(cluster) > 1
+                        for half in (cluster[:len(cluster) // 2], cluster[len(cluster) // 2:])]
+            for left, right in zip(clusters[::2], clusters[1::2]):
+                left_variance = self._cluster_variance(left, inverse_variance)
+                right_variance = self._cluster_variance(right, inverse_variance)
+                alpha = 1 - left_variance / (left_variance + right_variance)
+                weights[left] *= alpha
+                weights[right] *= 1 - alpha
+        return dict(zip(self.symbols, weights))
+
+    def max_sharpe(self, max_volatility=None, max_candidates=None):
+        """Sharpe massimo vincolato sui soli candidati preselezionati (Σ densa solo per il sottoinsieme).
+
+        Riparte dalla soluzione precedente quando i candidati la contengono ancora.
+        Se SLSQP non converge restituisce i pesi HRP (equi-pesati se anche questi non sono finiti).
+        """
+        from portfolio_optimization import max_sharpe_weights
+        candidates = self.preselect(max_candidates)
+        x0 = np.array([self._last_weights.get(self.symbols[i], 0.0) for i in candidates])
+        x0 = x0 / x0.sum() if x0.sum() > 0 else None
+        weights, result = max_sharpe_weights(self.mu[candidates].astype(np.float64),
+                                             self.covariance.dense(candidates).astype(np.float64),
+                                             max_volatility, risk_free=0.0, x0=x0)
+        if not result.success:
+            logging.warning(f"⚠️ Sharpe massimo non riuscito ({result.message}), uso i pesi HRP.")
+            fallback = self.hrp_weights()
+            if not np.all(np.isfinite(list(fallback.values()))):
+                fallback = dict.fromkeys(self.symbols, 1 / len(self.symbols))
+            return fallback  # La partenza a caldo resta l'ultima soluzione valida
+        self._last_weights = {self.symbols[i]: float(weight) for i, weight in zip(candidates, weights) if weight > 1e-6}
+        return self._last_weights
+
+
+def benchmark_large_universe(asset_counts=(100, 250, 1000), bars=500, targets=BENCHMARK_TARGETS, seed=0):
+    """Tempo e picco di memoria (tracemalloc) di fit + HRP + Sharpe massimo, confrontati con gli obiettivi."""
+    import portfolio_optimization  # noqa: F401 - import (pypfopt) escluso dalle misure
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n_assets in asset_counts:
+        factors = rng.normal(0, 0.01, (bars, 5))
+        returns = pd.DataFrame(factors @ rng.normal(0, 1, (5, n_assets)) * 0.3 + rng.normal(0.0005, 0.01, (bars, n_assets)),
+                               columns=[f"PAIR{i}/EUR" for i in range(n_assets)])
+        def full_pass():
+            optimizer = LargeUniverseOptimizer()
+            optimizer.fit(returns)
+            optimizer.hrp_weights()
+            optimizer.max_sharpe(0.02)
+            return optimizer
+
+        start = time.perf_counter()
+        optimizer = full_pass()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()  # Misura separata: tracemalloc rallenta le allocazioni
+        full_pass()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        optimizer.hrp_weights()  # Clustering dalla cache
+        cached_hrp = time.perf_counter() - start
+        time_target, memory_target = targets.get(n_assets, (np.inf, np.inf))
+        results[n_assets] = {"seconds": elapsed, "peak_mb": peak_mb, "cached_hrp_s": cached_hrp,
+                             "within_targets": elapsed <= time_target and peak_mb <= memory_target}
+        logging.info(f"🏎️ {n_assets} asset: {elapsed:.3f}s (obiettivo {time_target}s), picco {peak_mb:.1f} MB "
+                     f"(obiettivo {memory_target} MB), HRP in cache {cached_hrp * 1000:.1f} ms.")
+    return results
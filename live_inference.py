@@ -0,0 +1,127 @@
+# live_inference.py - Percorso di inferenza a bassa latenza per le policy DRL in trading live
+import time
+import logging
+import threading
+from collections import deque
+import numpy as np
+import torch
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+INFERENCE_THREADS = 1  # Thread torch fissi: latenza stabile, nessuna contesa con il resto del bot
+MAX_BATCH = 64  # Righe preallocate per le decisioni batched (account x simboli)
+LATENCY_WINDOW = 1_000  # Ultime chiamate usate per i percentili di latenza
+
+
+class _DeterministicPolicy(torch.nn.Module):
+    """Involucro che espone solo la decisione deterministica della policy (tracciabile con torch.jit)."""
+
+    def __init__(self, policy):
+        super().__init__()
+        self.policy = policy
+
+    def forward(self, obs):
+        return self.policy._predict(obs, deterministic=True)
+
+
+class LivePolicy:
+    """Decisioni della policy senza il preprocessing di `model.predict` e senza autograd.
+
+    Le osservazioni vengono copiate in un tensore preallocato, la policy gira in
+    `torch.inference_mode` e, se richiesto, in forma tracciata. Il numero di thread torch
+    viene fissato una sola volta alla costruzione e vale per tutto il processo.
+    Le azioni seguono `model.predict`: riscalate per le policy con squashing (SAC), altrimenti
+    limitate ai bound dello spazio. Ogni chiamata registra la propria latenza.
+    Il buffer di input è unico: le chiamate da più thread vengono serializzate da un lock.
+    """
+
+    def __init__(self, model, n_threads=INFERENCE_THREADS, max_batch=MAX_BATCH, trace=False):
+        self.n_threads = n_threads
+        if torch.get_num_threads() != n_threads:
+            torch.set_num_threads(n_threads)  # Impostazione globale: cambiarla ad ogni chiamata non è thread-safe
+        self._lock = threading.Lock()
+        self.policy = model.policy.to("cpu")
+        self.policy.set_training_mode(False)
+        self.obs_shape = tuple(model.observation_space.shape)
+        self.action_space = model.action_space
+        self.max_batch = max_batch
+        self._input = torch.zeros((max_batch,) + self.obs_shape, dtype=torch.float32)
+        self._input_np = self._input.numpy()  # Stessa memoria del tensore: la copia non alloca
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self._forward = _DeterministicPolicy(self.policy)
+        if trace:
+            self._forward = self._trace(self._forward)
+
+    def _trace(self, module):
+        """Traccia la policy con torch.jit; in caso di errore resta il percorso eager."""
+        try:
+            with torch.no_grad():
+                traced = torch.jit.trace(module, self._input[:1].clone(), check_trace=False)
+            logging.info("✅ Policy tracciata con torch.jit per l'inferenza live.")
+            return traced
+        except Exception as e:
+            logging.warning(f"⚠️ Tracing della policy non riuscito, uso il percorso eager: {e}")
+            return module
+
+    def _actions(self, count):
+        with torch.inference_mode():
+            actions = self._forward(self._input[:count]).numpy()
+        if hasattr(self.action_space, "low"):
+            if getattr(self.policy, "squash_output", False):
+                actions = self.policy.unscale_action(actions)  # Uscita tanh in [-1, 1] -> bound dello spazio
+            else:
+                actions = np.clip(actions, self.action_space.low, self.action_space.high)
+        return actions
+
+    def predict(self, obs):
+        """Azione deterministica per una singola osservazione."""
+        start = time.perf_counter()
+        with self._lock:
+            self._input_np[0] = np.reshape(obs, self.obs_shape)
+            action = self._actions(1)[0]
+        self.latencies.append(time.perf_counter() - start)
+        return action
+
+    def predict_batch(self, observations):
+        """Azioni per più account/simboli in un solo forward.
+
+        `observations` è un dict {chiave: osservazione}; restituisce {chiave: azione}.
+        """
+        start = time.perf_counter()
+        keys = list(observations)
+        actions = []
+        with self._lock:
+            for offset in range(0, len(keys), self.max_batch):
+                chunk = keys[offset:offset + self.max_batch]
+                for row, key in enumerate(chunk):
+                    self._input_np[row] = np.reshape(observations[key], self.obs_shape)
+                actions.extend(self._actions(len(chunk)))
+        self.latencies.append(time.perf_counter() - start)
+        return dict(zip(keys, actions))
+
+    def latency_report(self, budget=None):
+        """Percentili di latenza (ms) delle ultime chiamate; con `budget` (s) segnala se l'intervallo è troppo stretto."""
+        if not self.latencies:
+            return {}
+        samples = np.array(self.latencies) * 1000
+        report = {
+            "calls": len(samples),
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "p99_ms": float(np.percentile(samples, 99)),
+            "max_ms": float(samples.max()),
+        }
+        logging.info(f"⏱️ Latenza decisioni: p50 {report['p50_ms']:.3f} ms, p99 {report['p99_ms']:.3f} ms, "
+                     f"max {report['max_ms']:.3f} ms su {report['calls']} chiamate.")
+        if budget is not None and report["p99_ms"] > budget * 1000:
+            logging.warning(f"⚠️ Latenza p99 oltre l'intervallo di scalping ({budget * 1000:.0f} ms).")
+        return report
+
+
+def load_live_policy(model_path, algorithm="PPO", trace=False, n_threads=INFERENCE_THREADS):
+    """Carica un modello stable-baselines3 su CPU e ne prepara il percorso di inferenza live."""
+    import stable_baselines3
+    model = getattr(stable_baselines3, algorithm).load(model_path, device="cpu")
+    return LivePolicy(model, n_threads=n_threads, trace=trace)
@@ -0,0 +1,182 @@
+# ohlcv_cache.py - Cache OHLCV condivisa e incrementale per le chiamate ccxt
+import os
+import time
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager, ExitStack
+from pathlib import Path
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Candele persistite per i riavvii (USB se disponibile, altrimenti disco locale)
+OHLCV_CACHE_DIR = Path("/mnt/usb_trading_data/ohlcv_cache") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/ohlcv_cache")
+
+MAX_CANDLES = 1_000  # Candele recenti trattenute per chiave
+WINDOW_CANDLES = 500  # Finestra restituita di default (come fetch_ohlcv senza limit su Binance)
+PAGE_CANDLES = 1_000  # Candele per richiesta nei download incrementali con `since=`
+MIN_REFRESH = 30  # Secondi minimi tra due aggiornamenti della stessa chiave (aggiorna la candela in corso)
+
+
+def _exchange_id(exchange):
+    return exchange if isinstance(exchange, str) else exchange.id
+
+
+def timeframe_ms(exchange, timeframe):
+    return exchange.parse_timeframe(timeframe) * 1000
+
+
+def next_page_since(exchange, timeframe, page, since, limit=PAGE_CANDLES, now=None):
+    """Timestamp da cui chiedere la pagina successiva, o None se l'ultima candela scaricata è quella corrente."""
+    if not page or len(page) < limit or page[-1][0] <= since:
+        return None
+    now = time.time() * 1000 if now is None else now
+    last = int(page[-1][0])
+    return None if last + timeframe_ms(exchange, timeframe) > now else last
+
+
+def join_pages(pages):
+    """Concatena pagine consecutive: ogni pagina riparte dall'ultima candela della precedente (sovrapposta)."""
+    candles = []
+    for page in pages:
+        if page:
+            candles = [candle for candle in candles if candle[0] < page[0][0]] + list(page)
+    return candles
+
+
+class OHLCVCache:
+    """Candele per (exchange, simbolo, timeframe) aggiornate scaricando solo le nuove con `since=`.
+
+    Ogni chiave tiene al massimo `max_candles` righe [timestamp, open, high, low, close, volume]
+    (le più vecchie vengono scartate), viene salvata su disco dopo ogni aggiornamento e ha
+    un lock proprio: lettori concorrenti della stessa chiave attendono un unico download.
+    """
+
+    def __init__(self, directory=OHLCV_CACHE_DIR, max_candles=MAX_CANDLES, min_refresh=MIN_REFRESH):
+        self.directory = Path(directory)
+        self.max_candles = max_candles
+        self.min_refresh = min_refresh
+        self._candles = {}
+        self._fetched_at = {}
+        self._windows = {}  # Finestra più ampia già scaricata per intero in questa sessione
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self.stats = {"hits": 0, "incremental": 0, "full": 0}
+
+    # ===========================
+    # 🔹 Persistenza
+    # ===========================
+    def _path(self, key):
+        exchange_id, symbol, timeframe = key
+        return self.directory / f"{exchange_id}_{symbol.replace('/', '-')}_{timeframe}.npy"
+
+    def _load(self, key):
+        path = self._path(key)
+        if path.exists():
+            try:
+                self._candles[key] = np.load(path)
+            except Exception as e:
+                logging.warning(f"⚠️ Cache OHLCV illeggibile per {key}: {e}")
+
+    def _save(self, key):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, self._candles[key])
+        os.replace(tmp_path, path)
+
+    # ===========================
+    # 🔹 Lettura e Aggiornamento
+    # ===========================
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def locked(self, exchange, keys):
+        """Tiene i lock di più (simbolo, timeframe) per un download in blocco; ordine fisso contro i deadlock.
+
+        Dentro il blocco si usano since/is_fresh/needs_full/merge, non `get` (il lock non è rientrante).
+        """
+        exchange_id = _exchange_id(exchange)
+        with ExitStack() as stack:
+            for symbol, timeframe in sorted(set(keys)):
+                stack.enter_context(self._lock((exchange_id, symbol, timeframe)))
+            yield self
+
+    def since(self, exchange, symbol, timeframe):
+        """Timestamp da cui riprendere il download (ultima candela, che può essere ancora aperta) o None."""
+        key = (_exchange_id(exchange), symbol, timeframe)
+        if key not in self._candles:
+            self._load(key)
+        candles = self._candles.get(key)
+        return int(candles[-1, 0]) if candles is not None and len(candles) else None
+
+    def is_fresh(self, exchange, symbol, timeframe):
+        key = (_exchange_id(exchange), symbol, timeframe)
+        return key in self._candles and time.time() - self._fetched_at.get(key, 0) < self.min_refresh
+
+    def needs_full(self, exchange, symbol, timeframe, window=WINDOW_CANDLES):
+        """True se la chiave non ha abbastanza storico per `window` candele e va scaricata per intero."""
+        key = (_exchange_id(exchange), symbol, timeframe)
+        candles = self._candles.get(key)
+        if candles is None or not len(candles):
+            return True
+        if hasattr(exchange, "parse_timeframe"):  # Buco più lungo della cache: meglio ripartire da zero che paginare
+            gap = time.time() * 1000 - candles[-1, 0]
+            if gap > self.max_candles * timeframe_ms(exchange, timeframe):
+                return True
+        return len(candles) < window and self._windows.get(key, 0) < window
+
+    def merge(self, exchange, symbol, timeframe, new_candles, window=None):
+        """Unisce candele appena scaricate (sostituendo quelle con timestamp uguale o successivo) e salva."""
+        key = (_exchange_id(exchange), symbol, timeframe)
+        new_candles = np.asarray(new_candles, dtype=np.float64).reshape(-1, 6)
+        current = self._candles.get(key)
+        if current is not None and len(current) and len(new_candles):
+            current = current[current[:, 0] < new_candles[0, 0]]
+            merged = np.concatenate((current, new_candles))
+        else:
+            merged = new_candles if len(new_candles) else current
+        if merged is None:
+            return np.empty((0, 6))
+        self._candles[key] = np.ascontiguousarray(merged[-self.max_candles:])
+        self._fetched_at[key] = time.time()
+        if window is not None:
+            self._windows[key] = max(self._windows.get(key, 0), window)
+        self._save(key)
+        return self._candles[key]
+
+    def get(self, exchange, symbol, timeframe="1h", window=WINDOW_CANDLES):
+        """Ultime `window` candele come array (n, 6); scarica solo quelle mancanti, al massimo ogni `min_refresh` secondi."""
+        key = (_exchange_id(exchange), symbol, timeframe)
+        window = min(window, self.max_candles)
+        with self._lock(key):
+            since = self.since(exchange, symbol, timeframe)
+            if self.is_fresh(exchange, symbol, timeframe) and not self.needs_full(exchange, symbol, timeframe, window):
+                self.stats["hits"] += 1
+                return self._candles[key][-window:]
+            if self.needs_full(exchange, symbol, timeframe, window):
+                self.stats["full"] += 1
+                candles = self.merge(exchange, symbol, timeframe,
+                                     exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=window), window)
+            else:
+                self.stats["incremental"] += 1
+                pages = []
+                while since is not None:  # Pagina finché l'ultima candela non è quella in corso
+                    page = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=PAGE_CANDLES)
+                    pages.append(page)
+                    since = next_page_since(exchange, timeframe, page, since, PAGE_CANDLES)
+                candles = self.merge(exchange, symbol, timeframe, join_pages(pages))
+            return candles[-window:]
+
+
+# 📌 Cache condivisa da tutto il processo
+OHLCV_CACHE = OHLCVCache()
+
+
+def fetch_ohlcv_cached(exchange, symbol, timeframe="1h", window=WINDOW_CANDLES, cache=OHLCV_CACHE):
+    """Sostituto di `exchange.fetch_ohlcv(symbol, timeframe, limit=window)` che scarica solo le candele nuove."""
+    return cache.get(exchange, symbol, timeframe, window)
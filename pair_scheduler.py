@@ -0,0 +1,180 @@
+# pair_scheduler.py - Ri-screening in background delle coppie con notifiche delle variazioni
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+BASE_INTERVAL = 300  # Secondi tra due screening alla volatilità di riferimento
+MIN_INTERVAL = 60
+MAX_INTERVAL = 1_800
+REFERENCE_VOLATILITY = 0.02  # Come la soglia di DynamicTradingManager
+
+# 📌 Insieme classificato corrente (immutabile: i lettori non prendono lock)
+RankedPairs = namedtuple("RankedPairs", ["version", "pairs", "updated_at", "volatility"])
+# 📌 Variazione pubblicata ai sottoscrittori
+PairsDiff = namedtuple("PairsDiff", ["version", "added", "removed", "pairs"])
+
+
+def diff_pairs(previous, current, version):
+    """Coppie aggiunte e rimosse (nell'ordine del ranking) tra due insiemi classificati."""
+    previous_set, current_set = set(previous), set(current)
+    return PairsDiff(version, [pair for pair in current if pair not in previous_set],
+                     [pair for pair in previous if pair not in current_set], list(current))
+
+
+class PairRankingService:
+    """Ripete lo screening di un DynamicTradingManager su un thread in background.
+
+    `current` restituisce subito l'ultimo insieme classificato, senza mai attendere uno screening.
+    La versione cresce solo quando l'insieme delle coppie cambia: ai sottoscrittori arriva un PairsDiff
+    con le coppie aggiunte e rimosse, mentre un insieme invariato (anche se riordinato) non genera notifiche.
+    L'intervallo tra gli screening si accorcia con volatilità alta e si allunga con mercato calmo.
+    """
+
+    def __init__(self, manager, base_interval=BASE_INTERVAL, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, reference_volatility=REFERENCE_VOLATILITY, initial_pairs=None):
+        self.manager = manager
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.reference_volatility = reference_volatility
+
+        pairs = list(initial_pairs if initial_pairs is not None else manager.load_backup_pairs())
+        self._current = RankedPairs(1 if pairs else 0, pairs, time.time() if pairs else None, None)
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.interval = base_interval
+        self.stats = {"scans": 0, "changes": 0, "failures": 0, "last_scan_s": 0.0}
+
+    @property
+    def current(self):
+        return self._current
+
+    # ===========================
+    # 🔹 Sottoscrittori
+    # ===========================
+    def subscribe(self, callback, replay=True):
+        """Registra `callback(diff)`; con `replay` riceve subito l'insieme corrente come tutte coppie aggiunte."""
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+        current = self._current
+        if replay and current.pairs:
+            self._notify_one(callback, diff_pairs([], current.pairs, current.version))
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._subscribers_lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def _notify_one(self, callback, diff):
+        try:
+            callback(diff)
+        except Exception as e:
+            logging.error(f"❌ Errore nel sottoscrittore {getattr(callback, '__name__', callback)}: {e}")
+
+    def _publish(self, diff):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            self._notify_one(callback, diff)
+
+    # ===========================
+    # 🔹 Screening e Cadenza
+    # ===========================
+    def next_interval(self, volatility):
+        """Intervallo inversamente proporzionale alla volatilità media delle coppie, entro [min, max]."""
+        if not volatility or volatility != volatility:
+            return self.base_interval
+        interval = self.base_interval * self.reference_volatility / volatility
+        return float(min(max(interval, self.min_interval), self.max_interval))
+
+    def scan_once(self):
+        """Esegue uno screening e pubblica la variazione; restituisce il PairsDiff o None se invariato."""
+        start = time.perf_counter()
+        pairs = self.manager.select_trading_pairs()
+        self.stats["scans"] += 1
+        self.stats["last_scan_s"] = time.perf_counter() - start
+        volatility = getattr(self.manager, "last_screen_stats", {}).get("volatility")
+        self.interval = self.next_interval(volatility)
+
+        previous = self._current
+        if not pairs or set(pairs) == set(previous.pairs):
+            # Stesso insieme: si aggiorna solo l'ordine del ranking, senza nuova versione né notifiche
+            self._current = previous._replace(pairs=list(pairs or previous.pairs), updated_at=time.time(),
+                                              volatility=volatility)
+            logging.info(f"🔁 Ranking invariato (v{previous.version}), prossimo screening tra {self.interval:.0f}s.")
+            return None
+
+        diff = diff_pairs(previous.pairs, pairs, previous.version + 1)
+        self._current = RankedPairs(diff.version, list(pairs), time.time(), volatility)
+        self.stats["changes"] += 1
+        logging.info(f"📈 Ranking v{diff.version}: +{diff.added} -{diff.removed}, "
+                     f"prossimo screening tra {self.interval:.0f}s.")
+        self._publish(diff)
+        return diff
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan_once()
+            except Exception as e:
+                self.stats["failures"] += 1
+                self.interval = min(self.interval * 2, self.max_interval)  # Backoff: l'insieme corrente resta valido
+                logging.error(f"❌ Errore nello screening in background, nuovo tentativo tra {self.interval:.0f}s: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pair-ranking", daemon=True)
+            self._thread.start()
+        return self
+
+    def refresh_now(self):
+        """Anticipa il prossimo screening senza attenderne il risultato."""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+# ===========================
+# 🔹 Adattatori per i Consumatori
+# ===========================
+def stream_name(symbol, stream="trade"):
+    """Nome dello stream Binance per un simbolo ccxt (BTC/EUR -> btceur@trade)."""
+    return f"{symbol.replace('/', '').lower()}@{stream}"
+
+
+def websocket_subscriber(websocket, loop, stream="trade"):
+    """Callback che invia SUBSCRIBE/UNSUBSCRIBE su una connessione websockets aperta nel `loop` indicato."""
+    def on_change(diff):
+        for method, pairs in (("UNSUBSCRIBE", diff.removed), ("SUBSCRIBE", diff.added)):
+            if pairs:
+                message = json.dumps({"method": method, "params": [stream_name(pair, stream) for pair in pairs],
+                                      "id": diff.version})
+                asyncio.run_coroutine_threadsafe(websocket.send(message), loop)
+    return on_change
+
+
+def env_subscriber(env):
+    """Callback che passa il nuovo insieme all'ambiente (applicato a fine episodio)."""
+    return env.update_trading_pairs
+
+
+def optimizer_subscriber(optimizer):
+    """Callback che restringe l'universo del PortfolioOptimizer alle coppie classificate."""
+    return optimizer.update_universe
@@ -0,0 +1,115 @@
+# pair_screener.py - Screening e ranking delle coppie su matrici di chiusure allineate
+import time
+import logging
+import numpy as np
+from scipy.signal import lfilter
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+MAX_SPREAD = 0.002
+SCREEN_LENGTH = 500  # Chiusure più recenti usate per simbolo
+
+
+def align_closes(candles, length=SCREEN_LENGTH):
+    """Matrice (simboli x length) delle ultime chiusure allineate a destra; le serie corte restano NaN a sinistra."""
+    matrix = np.full((len(candles), length), np.nan)
+    for row, ohlcv in enumerate(candles):
+        closes = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)[-length:, 4] if len(ohlcv) else ()
+        if len(closes):
+            matrix[row, length - len(closes):] = closes
+    return matrix
+
+
+def _backfill_rows(matrix):
+    """Riempie i NaN iniziali di ogni riga con il primo valore valido (per i filtri ricorsivi)."""
+    valid = ~np.isnan(matrix)
+    first = np.where(valid.any(axis=1), valid.argmax(axis=1), matrix.shape[1] - 1)
+    first_values = matrix[np.arange(len(matrix)), first]
+    return np.where(np.arange(matrix.shape[1]) < first[:, None], first_values[:, None], matrix)
+
+
+def ema_rows(matrix, span=None, alpha=None):
+    """EMA lungo il tempo per tutte le righe insieme (filtro IIR in C, nessun ciclo Python)."""
+    alpha = alpha if alpha is not None else 2 / (span + 1)
+    initial = (1 - alpha) * matrix[:, :1]
+    smoothed, _ = lfilter([alpha], [1, alpha - 1], matrix, axis=1, zi=initial)
+    return smoothed
+
+
+def rsi_rows(closes, period=RSI_PERIOD):
+    """RSI di Wilder dell'ultima barra per ogni riga."""
+    delta = np.diff(closes, axis=1)
+    gains = ema_rows(np.clip(delta, 0, None), alpha=1 / period)[:, -1]
+    losses = ema_rows(np.clip(-delta, 0, None), alpha=1 / period)[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(losses > 0, 100 - 100 / (1 + gains / losses), 100.0)
+
+
+def macd_rows(closes):
+    """MACD e linea di segnale dell'ultima barra per ogni riga."""
+    macd = ema_rows(closes, MACD_FAST) - ema_rows(closes, MACD_SLOW)
+    return macd[:, -1], ema_rows(macd, MACD_SIGNAL)[:, -1]
+
+
+def relative_volatility(closes):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nanstd(closes, axis=1) / np.nanmean(closes, axis=1)
+
+
+def rank_pairs(symbols, candles_1h, candles_4h, volumes, spreads, top_n=10, min_volume=1_000_000,
+               volatility_threshold=0.02, max_spread=MAX_SPREAD, prefer_volatile=True):
+    """Filtri e ranking in forma vettoriale, con gli stessi criteri di DynamicTradingManager.
+
+    Restituisce (top_n simboli ordinati per volatilità 1h+4h, dict delle colonne calcolate).
+    """
+    start = time.perf_counter()
+    closes_1h = align_closes(candles_1h)
+    closes_4h = align_closes(candles_4h)
+    filled_1h = _backfill_rows(closes_1h)
+
+    volatility_1h, volatility_4h = relative_volatility(closes_1h), relative_volatility(closes_4h)
+    rsi = rsi_rows(filled_1h)
+    macd, macd_signal = macd_rows(filled_1h)
+    volumes, spreads = np.asarray(volumes, dtype=np.float64), np.asarray(spreads, dtype=np.float64)
+
+    mask = (
+        (volumes >= min_volume) & (spreads < max_spread) &
+        ((volatility_1h >= volatility_threshold) | (volatility_4h >= volatility_threshold)) &
+        (rsi > 50) & (macd > macd_signal)
+    )
+    score = volatility_1h + volatility_4h
+    score = score if prefer_volatile else -score
+
+    eligible = np.flatnonzero(mask & np.isfinite(score))
+    k = min(top_n, len(eligible))
+    if k:
+        best = eligible[np.argpartition(-score[eligible], k - 1)[:k]]
+        best = best[np.argsort(-score[best], kind="stable")]
+    else:
+        best = eligible[:0]
+
+    columns = {"volatility_1h": volatility_1h, "volatility_4h": volatility_4h, "rsi": rsi, "macd": macd,
+               "macd_signal": macd_signal, "spread": spreads, "volume": volumes, "eligible": mask}
+    logging.info(f"📊 Ranking di {len(symbols)} coppie in {(time.perf_counter() - start) * 1000:.1f} ms: "
+                 f"{int(mask.sum())} idonee, {k} selezionate.")
+    return [symbols[i] for i in best], columns
+
+
+def benchmark_ranking(n_symbols=2_000, length=SCREEN_LENGTH, seed=0):
+    """Tempo di ranking di un universo sintetico di `n_symbols` coppie."""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_symbols, length)), axis=1))
+    candles = [np.column_stack([np.arange(length), row, row, row, row, np.ones(length)]) for row in closes]
+    start = time.perf_counter()
+    rank_pairs([f"PAIR{i}/EUR" for i in range(n_symbols)], candles, candles,
+               rng.uniform(1e5, 1e7, n_symbols), rng.uniform(0, 0.004, n_symbols))
+    elapsed = (time.perf_counter() - start) * 1000
+    logging.info(f"🏎️ {n_symbols} coppie classificate in {elapsed:.1f} ms.")
+    return elapsed
+
+
+if __name__ == "__main__":
+    benchmark_ranking()
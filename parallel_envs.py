@@ -0,0 +1,158 @@
+# parallel_envs.py - Ambienti di trading in sottoprocessi con dati di mercato in memoria condivisa
+import time
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+START_METHOD = "spawn"  # Sicuro con torch/TensorFlow e disponibile anche su Windows
+
+
+# ===========================
+# 🔹 Dati di Mercato in Memoria Condivisa
+# ===========================
+class SharedMarketData:
+    """Copia le barre una sola volta in un blocco di memoria condivisa, ordinato per simbolo e timestamp.
+
+    I worker ricevono solo la `spec` (nome del blocco, forma, colonne) e leggono le righe
+    del proprio simbolo o intervallo temporale come vista, senza copie via pickle.
+    """
+
+    def __init__(self, data, symbol_column="coin_id"):
+        frame = data.reset_index() if "timestamp" not in data.columns else data.copy()
+        if "timestamp" in frame.columns and not pd.api.types.is_numeric_dtype(frame["timestamp"]):
+            frame["timestamp"] = (pd.to_datetime(frame["timestamp"]) - pd.Timestamp(0)) // pd.Timedelta(milliseconds=1)
+
+        if symbol_column in frame.columns:
+            codes, symbols = pd.factorize(frame[symbol_column], sort=True)
+            frame[symbol_column] = codes
+        else:
+            symbols = pd.Index(["default"])
+        sort_columns = [col for col in (symbol_column, "timestamp") if col in frame.columns]
+        frame = frame.sort_values(sort_columns) if sort_columns else frame
+
+        columns = [col for col in frame.columns if pd.api.types.is_numeric_dtype(frame[col])]
+        values = frame[columns].to_numpy(dtype=np.float64)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self.array = np.ndarray(values.shape, dtype=np.float64, buffer=self.shm.buf)
+        self.array[:] = values
+
+        self.spec = {
+            "name": self.shm.name,
+            "shape": values.shape,
+            "columns": columns,
+            "symbol_column": symbol_column if symbol_column in columns else None,
+            "symbols": list(symbols),
+        }
+        logging.info(f"🧠 Dati di mercato in memoria condivisa: {values.shape[0]} barre, "
+                     f"{len(symbols)} simboli, {values.nbytes / 1024 ** 2:.1f} MB.")
+
+    def symbol_ranges(self):
+        """Intervalli di righe contigui per ogni simbolo."""
+        column = self.spec["symbol_column"]
+        if column is None:
+            return [(0, self.spec["shape"][0])]
+        codes = self.array[:, self.spec["columns"].index(column)]
+        boundaries = np.flatnonzero(np.diff(codes)) + 1
+        starts = np.concatenate(([0], boundaries))
+        ends = np.concatenate((boundaries, [len(codes)]))
+        return list(zip(starts.tolist(), ends.tolist()))
+
+    def split(self, n_workers):
+        """Assegna a ogni worker un simbolo diverso o, se i simboli non bastano, una fetta temporale."""
+        ranges = self.symbol_ranges()
+        if len(ranges) >= n_workers:
+            ranges.sort(key=lambda r: r[1] - r[0], reverse=True)
+            return ranges[:n_workers]
+
+        slices = []
+        per_symbol = int(np.ceil(n_workers / len(ranges)))
+        for start, end in ranges:
+            bounds = np.linspace(start, end, per_symbol + 1).astype(int)
+            slices.extend(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        return slices[:n_workers]
+
+    def close(self, unlink=True):
+        """Rilascia il blocco di memoria condivisa (da chiamare dopo la chiusura dei worker)."""
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def attach_shared_array(spec, start, end):
+    """Nel worker: collega il blocco condiviso e restituisce (vista in sola lettura delle righe [start, end), handle).
+
+    I worker avviati da SubprocVecEnv condividono il resource tracker del processo principale,
+    che resta l'unico a chiamare `unlink()`.
+    """
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    array = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf)[start:end]
+    array.flags.writeable = False  # Una scrittura accidentale modificherebbe i dati di tutti i worker
+    return array, shm
+
+
+def attach_shared_frame(spec, start, end):
+    """Nel worker: collega il blocco condiviso e restituisce (DataFrame delle righe [start, end), handle)."""
+    array, shm = attach_shared_array(spec, start, end)
+    frame = pd.DataFrame(array, columns=spec["columns"], copy=False)
+    if spec["symbol_column"] is not None:
+        codes = frame[spec["symbol_column"]].to_numpy(dtype=np.int64)
+        frame[spec["symbol_column"]] = np.asarray(spec["symbols"], dtype=object)[codes]
+    return frame, shm
+
+
+def make_env_fn(spec, start, end, env_kwargs=None):
+    """Costruttore dell'ambiente per SubprocVecEnv (serializza solo la spec, non i dati).
+
+    Il worker usa SharedMarketEnv, che legge prezzi e osservazioni direttamente dal blocco
+    condiviso in sola lettura: trading_environment.TradingEnv non è adatto ai worker perché
+    riprepara (copia e ricampiona) i dati e accetta solo azioni {account: azione}.
+    """
+    def _init():
+        from shared_market_env import SharedMarketEnv
+        return SharedMarketEnv(spec, start, end, **(env_kwargs or {}))
+    return _init
+
+
+def build_vec_env(data, n_envs, env_kwargs=None, start_method=START_METHOD):
+    """Crea un SubprocVecEnv con `n_envs` worker, ognuno su un simbolo o una fetta temporale diversa.
+
+    `data` va preparato una volta nel processo principale (barre già ordinate e normalizzate):
+    i worker non lo modificano. `env_kwargs` sono gli argomenti di SharedMarketEnv.
+    Restituisce (vec_env, shared_data): chiudere prima il vec_env, poi `shared_data.close()`.
+    """
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    shared_data = SharedMarketData(data)
+    slices = shared_data.split(n_envs)
+    env_fns = [make_env_fn(shared_data.spec, start, end, env_kwargs) for start, end in slices]
+    logging.info(f"⚙️ Avvio di {len(env_fns)} ambienti paralleli: {slices}")
+    return SubprocVecEnv(env_fns, start_method=start_method), shared_data
+
+
+# ===========================
+# 🔹 Benchmark di Scalabilità
+# ===========================
+def benchmark_rollout_scaling(data, worker_counts=(1, 2, 4, 8), steps=2_000, env_kwargs=None):
+    """Misura gli step/sec dei rollout al crescere del numero di worker e ne registra la scalabilità."""
+    results = {}
+    for n_envs in worker_counts:
+        vec_env, shared_data = build_vec_env(data, n_envs, env_kwargs)
+        try:
+            vec_env.reset()
+            actions = np.array([vec_env.action_space.sample() for _ in range(vec_env.num_envs)])
+            start = time.perf_counter()
+            for _ in range(steps):
+                vec_env.step(actions)
+            elapsed = time.perf_counter() - start
+        finally:
+            vec_env.close()
+            shared_data.close()
+
+        results[n_envs] = steps * vec_env.num_envs / elapsed
+        speedup = results[n_envs] / results[worker_counts[0]]
+        logging.info(f"🏎️ {n_envs} worker: {results[n_envs]:,.0f} step/s (x{speedup:.2f} rispetto a {worker_counts[0]}).")
+    return results
@@ -0,0 +1,227 @@
+# parameter_sweep.py - Sweep parallelo dei parametri di strategia con dati di mercato in memoria condivisa
+import os
+import json
+import time
+import hashlib
+import logging
+import itertools
+import multiprocessing
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parallel_envs import SharedMarketData, attach_shared_frame, START_METHOD
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Risultati degli sweep (USB se disponibile, altrimenti disco locale)
+SWEEP_DIR = Path("/mnt/usb_trading_data/sweeps") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/sweeps")
+
+TRADING_FEE = 0.001
+RSI_PERIOD = 14
+VOLATILITY_WINDOW = 10  # Come env_core: volatilità delle ultime 10 barre
+TRAIL_WINDOW = 24  # Barre su cui misurare il massimo per il trailing stop
+FLUSH_EVERY = 64  # Risultati per file parquet
+GRID_POINTS = 5  # Punti per dimensione quando un intervallo continuo entra in una griglia
+
+# 📌 Soglie oggi fisse nel codice (RSI 30/70, volatilità 0.02, allocazione scalping 0.05, trailing stop 5-15%)
+DEFAULT_SPACE = {
+    "rsi_buy": (20.0, 40.0),
+    "rsi_sell": (60.0, 80.0),
+    "volatility_threshold": (0.005, 0.05),
+    "scalping_allocation": (0.01, 0.2),
+    "standard_allocation": [0.1, 0.25, 0.5],
+    "trailing_stop": (0.05, 0.15),
+}
+
+
+# ===========================
+# 🔹 Generazione dei Parametri
+# ===========================
+def expand_grid(space, grid_points=GRID_POINTS):
+    """Prodotto cartesiano: le liste restano valori discreti, le tuple (min, max) diventano `grid_points` punti."""
+    axes = {name: list(values) if isinstance(values, list) else np.linspace(*values, grid_points).tolist()
+            for name, values in space.items()}
+    return [dict(zip(axes, combination)) for combination in itertools.product(*axes.values())]
+
+
+def _scale(space, unit):
+    """Converte punti in [0, 1)^d nei valori dello spazio (indice per le liste, interpolazione per le tuple)."""
+    samples = []
+    for row in unit:
+        params = {}
+        for (name, values), u in zip(space.items(), row):
+            if isinstance(values, list):
+                params[name] = values[min(int(u * len(values)), len(values) - 1)]
+            else:
+                params[name] = float(values[0] + u * (values[1] - values[0]))
+        samples.append(params)
+    return samples
+
+
+def random_samples(space, n_samples, seed=0):
+    return _scale(space, np.random.default_rng(seed).random((n_samples, len(space))))
+
+
+def latin_hypercube(space, n_samples, seed=0):
+    """Latin hypercube: ogni dimensione divisa in `n_samples` strati, ognuno campionato una volta."""
+    rng = np.random.default_rng(seed)
+    strata = np.argsort(rng.random((len(space), n_samples)), axis=1).T
+    return _scale(space, (strata + rng.random((n_samples, len(space)))) / n_samples)
+
+
+def sample_parameters(space, method="grid", n_samples=100, seed=0):
+    if method == "grid":
+        return expand_grid(space)
+    if method == "random":
+        return random_samples(space, n_samples, seed)
+    if method == "lhs":
+        return latin_hypercube(space, n_samples, seed)
+    raise ValueError(f"Metodo di campionamento non supportato: {method}")
+
+
+def params_id(params):
+    """Id stabile di un set di parametri (per riprendere uno sweep interrotto)."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=float).encode()).hexdigest()[:16]
+
+
+# ===========================
+# 🔹 Worker
+# ===========================
+_worker = {}
+
+
+def _init_worker(spec, threads):
+    """Limita i thread (anche dei pool BLAS già caricati) e collega una sola volta per processo il blocco condiviso."""
+    from walk_forward import limit_worker_threads
+    limit_worker_threads(threads)
+    frame, shm = attach_shared_frame(spec, 0, spec["shape"][0])
+    _worker.update(frame=frame, shm=shm, market=None)
+
+
+def market_series(frame, symbol_column="coin_id"):
+    """Per simbolo: array di chiusure, rendimenti, RSI, volatilità e massimo mobile (calcolati una volta)."""
+    from rule_evaluator import RuleContext
+    groups = frame.groupby(symbol_column) if symbol_column in frame.columns else [("default", frame)]
+    market = {}
+    for symbol, group in groups:
+        close = group["close"].astype(float).reset_index(drop=True)
+        returns = close.pct_change().fillna(0.0).to_numpy()
+        market[symbol] = {
+            "returns": returns,
+            "rsi": RuleContext(group)["rsi"],
+            "volatility": close.rolling(VOLATILITY_WINDOW, min_periods=1).std(ddof=0).shift(1).fillna(0.0).to_numpy(),
+            "drawdown": (close / close.rolling(TRAIL_WINDOW, min_periods=1).max() - 1).to_numpy(),
+        }
+    return market
+
+
+def evaluate_threshold_strategy(params, market, fee=TRADING_FEE):
+    """Backtest vettoriale delle soglie: ingresso RSI < rsi_buy, uscita RSI > rsi_sell o trailing stop.
+
+    L'allocazione è `scalping_allocation` quando la volatilità supera la soglia, altrimenti
+    `standard_allocation`. La posizione segue il segnale della barra precedente (nessun look-ahead).
+    """
+    results = []
+    for series in market.values():
+        entries = series["rsi"] < params["rsi_buy"]
+        exits = (series["rsi"] > params["rsi_sell"]) | (series["drawdown"] < -params["trailing_stop"])
+        state = pd.Series(np.where(entries, 1.0, np.where(exits, 0.0, np.nan))).ffill().fillna(0.0).to_numpy()
+        size = np.where(series["volatility"] > params["volatility_threshold"],
+                        params["scalping_allocation"], params["standard_allocation"])
+        exposure = np.zeros_like(state)
+        exposure[1:] = (state * size)[:-1]
+        pnl = exposure * series["returns"] - np.abs(np.diff(exposure, prepend=0.0)) * fee
+
+        equity = np.cumprod(1 + pnl)
+        std = pnl.std()
+        results.append((equity[-1] - 1, pnl.mean() / std * np.sqrt(len(pnl)) if std > 0 else 0.0,
+                        float((1 - equity / np.maximum.accumulate(equity)).max()),
+                        int(np.count_nonzero(np.diff(state) > 0))))
+    total_return, sharpe, max_drawdown, trades = np.mean(results, axis=0)
+    return {"total_return": total_return, "sharpe": sharpe, "max_drawdown": max_drawdown, "trades": trades}
+
+
+def _run_task(evaluate_fn, params):
+    if _worker["market"] is None:
+        _worker["market"] = market_series(_worker["frame"])
+    return params, evaluate_fn(params, _worker["market"])
+
+
+# ===========================
+# 🔹 Risultati Colonnari e Ripresa
+# ===========================
+def load_results(results_dir):
+    """Tutti i risultati salvati (un file parquet per blocco)."""
+    parts = sorted(Path(results_dir).glob("part-*.parquet"))
+    return pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True) if parts else pd.DataFrame()
+
+
+def _flush(results_dir, rows):
+    if not rows:
+        return
+    results_dir.mkdir(parents=True, exist_ok=True)
+    index = len(list(results_dir.glob("part-*.parquet")))
+    tmp_path = results_dir / f"part-{index:05d}.tmp"
+    pd.DataFrame(rows).to_parquet(tmp_path)
+    os.replace(tmp_path, results_dir / f"part-{index:05d}.parquet")
+    rows.clear()
+
+
+def run_sweep(data, space=DEFAULT_SPACE, method="lhs", n_samples=256, name="threshold_strategy",
+              evaluate_fn=evaluate_threshold_strategy, n_workers=None, threads=1, seed=0, results_dir=None):
+    """Valuta i set di parametri su un pool di processi; riprende saltando quelli già nei risultati.
+
+    I dati vengono copiati una volta in memoria condivisa: ogni task serializza solo i parametri.
+    `evaluate_fn(params, market)` deve essere una funzione di modulo e restituire un dict di metriche.
+    """
+    results_dir = Path(results_dir) if results_dir is not None else SWEEP_DIR / name
+    samples = sample_parameters(space, method, n_samples, seed)
+    done = load_results(results_dir)
+    done_ids = set(done["params_id"]) if not done.empty else set()
+    todo = [params for params in samples if params_id(params) not in done_ids]
+    logging.info(f"🔍 Sweep {name}: {len(samples)} set di parametri, {len(samples) - len(todo)} già valutati.")
+
+    if todo:
+        n_workers = max(1, min(n_workers or os.cpu_count() or 1, len(todo)))
+        shared_data = SharedMarketData(data)
+        rows = []
+        start = time.perf_counter()
+        try:
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context(START_METHOD),
+                                     initializer=_init_worker, initargs=(shared_data.spec, threads)) as executor:
+                futures = [executor.submit(_run_task, evaluate_fn, params) for params in todo]
+                for future in as_completed(futures):
+                    try:
+                        params, metrics = future.result()
+                    except Exception as e:
+                        logging.error(f"❌ Errore nella valutazione di un set di parametri: {e}")
+                        continue
+                    rows.append({"params_id": params_id(params), **params, **metrics})
+                    if len(rows) >= FLUSH_EVERY:
+                        _flush(results_dir, rows)
+        finally:
+            _flush(results_dir, rows)  # I risultati completati restano anche in caso di interruzione
+            shared_data.close()
+        elapsed = time.perf_counter() - start
+        logging.info(f"⏱️ {len(todo)} valutazioni in {elapsed:.1f}s con {n_workers} processi "
+                     f"({len(todo) / elapsed:,.1f} set/s).")
+
+    results = load_results(results_dir)
+    return results.sort_values("sharpe", ascending=False, ignore_index=True) if "sharpe" in results else results
+
+
+def benchmark_sweep_scaling(data, worker_counts=(1, 2, 4, 8), n_samples=64, space=DEFAULT_SPACE):
+    """Misura i set di parametri al secondo al crescere del numero di processi."""
+    import tempfile
+    results = {}
+    for n_workers in worker_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            run_sweep(data, space, "random", n_samples, n_workers=n_workers, results_dir=tmp)
+            results[n_workers] = n_samples / (time.perf_counter() - start)
+        logging.info(f"🏎️ {n_workers} processi: {results[n_workers]:,.1f} set/s "
+                     f"(x{results[n_workers] / results[worker_counts[0]]:.2f} rispetto a {worker_counts[0]}).")
+    return results
@@ -0,0 +1,185 @@
+# performance_recorder.py - Metriche di trading per step in array preallocati, log campionati e riepiloghi per episodio
+import time
+import logging
+import tempfile
+import numpy as np
+from pathlib import Path
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+RING_CAPACITY = 65_536  # Step trattenuti in memoria prima di un flush
+LOG_EVERY = 1_000  # Un log leggibile ogni N step (0 = solo riepiloghi di episodio)
+ACTION_NAMES = ("SELL", "HOLD", "BUY")
+
+
+class PerformanceRecorder:
+    """Saldo, net worth, azione e reward per account e step in un anello di array preallocati.
+
+    `record` scrive solo negli array; a buffer pieno (o a fine episodio) le colonne
+    vengono salvate in un unico file `.npz`. I log leggibili sono campionati ogni
+    `log_every` step e riassunti a fine episodio.
+    """
+
+    def __init__(self, account_names, name="trading_env", flush_dir=None, capacity=RING_CAPACITY, log_every=LOG_EVERY):
+        self.account_names = list(account_names)
+        self.name = name
+        self.flush_dir = Path(flush_dir) if flush_dir is not None else None
+        self.capacity = capacity
+        self.log_every = log_every
+
+        n_accounts = len(self.account_names)
+        self.step = np.zeros(capacity, dtype=np.int64)
+        self.action = np.full((capacity, n_accounts), -1, dtype=np.int8)
+        self.balance = np.zeros((capacity, n_accounts), dtype=np.float64)
+        self.net_worth = np.zeros((capacity, n_accounts), dtype=np.float64)
+        self.reward = np.zeros((capacity, n_accounts), dtype=np.float64)
+        self._size = 0
+        self._batch = 0
+        self._episode = 0
+
+        # 📌 Statistiche dell'episodio corrente (indipendenti dal contenuto dell'anello)
+        self._episode_steps = 0
+        self._episode_start = np.full(n_accounts, np.nan)
+        self._reward_sum = np.zeros(n_accounts)
+        self._action_counts = np.zeros((n_accounts, len(ACTION_NAMES)), dtype=np.int64)
+
+        self.overhead = 0.0  # Secondi spesi in record/flush/log
+        self.records = 0
+
+    # ===========================
+    # 🔹 Registrazione
+    # ===========================
+    def record(self, step, actions, balance, net_worth, rewards=None):
+        """Registra uno step: `actions` e `rewards` sono dict per account, `balance`/`net_worth` sequenze per account."""
+        start = time.perf_counter()
+        row = self._size
+        self.step[row] = step
+        for i, account in enumerate(self.account_names):
+            action = actions.get(account, -1)
+            self.action[row, i] = action
+            if 0 <= action < len(ACTION_NAMES):
+                self._action_counts[i, action] += 1
+        self.balance[row] = balance
+        self.net_worth[row] = net_worth
+        if rewards is not None:
+            self.reward[row] = [rewards[account] for account in self.account_names]
+            self._reward_sum += self.reward[row]
+        else:
+            self.reward[row] = 0.0
+
+        if self._episode_steps == 0:
+            self._episode_start[:] = self.net_worth[row]
+        self._episode_steps += 1
+        self._size += 1
+        self.records += 1
+
+        if self.log_every and self.records % self.log_every == 0:
+            self._log_sample(row)
+        if self._size == self.capacity:
+            self.flush()
+        self.overhead += time.perf_counter() - start
+
+    def _log_sample(self, row):
+        for i, account in enumerate(self.account_names):
+            logging.info(f"📈 {account} → Step {self.step[row]}, Azione: {self.action[row, i]}, "
+                         f"Balance: {self.balance[row, i]:.2f}, Net Worth: {self.net_worth[row, i]:.2f}")
+
+    # ===========================
+    # 🔹 Flush e Riepiloghi
+    # ===========================
+    def flush(self):
+        """Salva le righe in memoria come colonne in un file `.npz` e svuota l'anello."""
+        if self._size == 0:
+            return None
+        path = None
+        if self.flush_dir is not None:
+            self.flush_dir.mkdir(parents=True, exist_ok=True)
+            path = self.flush_dir / f"{self.name}_ep{self._episode:05d}_{self._batch:05d}.npz"
+            rows = slice(0, self._size)
+            np.savez(path, accounts=np.array(self.account_names), step=self.step[rows], action=self.action[rows],
+                     balance=self.balance[rows], net_worth=self.net_worth[rows], reward=self.reward[rows])
+            self._batch += 1
+        self._size = 0
+        return path
+
+    def end_episode(self):
+        """Riepilogo leggibile dell'episodio per account, flush delle metriche e azzeramento delle statistiche."""
+        if self._episode_steps == 0:
+            return {}
+        start = time.perf_counter()
+        last = (self._size or self.capacity) - 1
+        summary = {}
+        for i, account in enumerate(self.account_names):
+            final = float(self.net_worth[last, i])
+            initial = float(self._episode_start[i])
+            counts = dict(zip(ACTION_NAMES, self._action_counts[i].tolist()))
+            summary[account] = {"steps": self._episode_steps, "net_worth": final,
+                                "return": final / initial - 1 if initial else 0.0,
+                                "reward": float(self._reward_sum[i]), "actions": counts}
+            logging.info(f"🏁 {self.name} episodio {self._episode} - {account}: {self._episode_steps} step, "
+                         f"Net Worth {final:.2f} ({summary[account]['return']:+.2%}), azioni {counts}")
+        self.flush()
+        self._episode += 1
+        self._batch = 0
+        self._episode_steps = 0
+        self._reward_sum[:] = 0.0
+        self._action_counts[:] = 0
+        self.overhead += time.perf_counter() - start
+        return summary
+
+    def overhead_report(self, elapsed=None):
+        """Costo del logging: µs per step e, se `elapsed` è dato, quota del tempo totale."""
+        report = {"records": self.records, "overhead_s": self.overhead,
+                  "us_per_step": self.overhead / self.records * 1e6 if self.records else 0.0}
+        if elapsed:
+            report["share"] = self.overhead / elapsed
+        logging.info(f"⏱️ {self.name}: logging {report['us_per_step']:.2f} µs/step su {self.records} step"
+                     + (f" ({report['share']:.1%} del tempo totale)." if elapsed else "."))
+        return report
+
+
+# ===========================
+# 🔹 Benchmark Overhead
+# ===========================
+def benchmark_performance_logging(n_accounts=2, steps=100_000, seed=0):
+    """Confronta il costo per step del log INFO per account (RotatingFileHandler) con PerformanceRecorder."""
+    from logging.handlers import RotatingFileHandler
+
+    rng = np.random.default_rng(seed)
+    accounts = [f"account_{i}" for i in range(n_accounts)]
+    actions = rng.integers(0, 3, size=(steps, n_accounts))
+    balance = rng.uniform(50, 150, size=(steps, n_accounts))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = logging.getLogger("performance_benchmark")
+        logger.propagate = False
+        handler = RotatingFileHandler(Path(tmp) / "bench.log", maxBytes=1e6, backupCount=5)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        start = time.perf_counter()
+        for step in range(steps):
+            for i, account in enumerate(accounts):
+                logger.info(f"📈 {account} → Azione: {actions[step, i]}, Balance: {balance[step, i]:.2f}, "
+                            f"Net Worth: {balance[step, i]:.2f}")
+        results["per_step_logging"] = (time.perf_counter() - start) / steps * 1e6
+        logger.removeHandler(handler)
+        handler.close()
+
+        recorder = PerformanceRecorder(accounts, name="benchmark", flush_dir=Path(tmp) / "metrics", log_every=0)
+        start = time.perf_counter()
+        for step in range(steps):
+            recorder.record(step, dict(zip(accounts, actions[step].tolist())), balance[step], balance[step])
+        recorder.end_episode()
+        results["recorder"] = (time.perf_counter() - start) / steps * 1e6
+
+    logging.info(f"🏎️ Logging per step: {results['per_step_logging']:.2f} µs/step, "
+                 f"recorder: {results['recorder']:.2f} µs/step "
+                 f"(x{results['per_step_logging'] / results['recorder']:.1f}).")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_performance_logging()
@@ -0,0 +1,165 @@
+# portfolio_env.py - Ambiente di trading multi-asset: posizioni (account x asset) e liquidità in array NumPy
+import time
+import logging
+import gym
+from gym import spaces
+import numpy as np
+import pandas as pd
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TRADING_FEE = 0.001
+SCALPING_FEE = 0.0005
+MAX_DRAWDOWN = 0.05  # Stesso fermo protettivo di trading_environment.step
+
+
+def price_matrix(data, assets=None, max_assets=5, price_column="close", symbol_column="coin_id"):
+    """Prezzi (barre x asset) da dati long (timestamp, coin_id, close) o già in colonne per asset.
+
+    Senza `assets` vengono scelti i `max_assets` asset con più volume (o con più barre).
+    """
+    if symbol_column in data.columns:
+        if assets is None:
+            ranking = data.groupby(symbol_column)["volume" if "volume" in data.columns else price_column]
+            ranking = ranking.sum() if "volume" in data.columns else ranking.count()
+            assets = ranking.nlargest(max_assets).index.tolist()
+        selected = data[data[symbol_column].isin(assets)]  # Indice preso dopo il filtro: stessa lunghezza
+        index = "timestamp" if "timestamp" in selected.columns else selected.index
+        frame = selected.pivot_table(index=index, columns=symbol_column, values=price_column, aggfunc="last")
+    else:
+        assets = list(assets or data.select_dtypes(include=[np.number]).columns[:max_assets])
+        frame = data[assets]
+    frame = frame.reindex(columns=assets).sort_index().ffill().bfill()
+    return np.ascontiguousarray(frame.to_numpy(dtype=np.float64)), list(assets)
+
+
+class MultiAssetTradingEnv(gym.Env):
+    """Più account su più asset: l'azione è una matrice di pesi obiettivo (account x [asset..., liquidità]).
+
+    Lo stato è una matrice di quantità detenute (account x asset) più un vettore di liquidità;
+    ribilanciamento, commissioni e net worth sono operazioni matriciali, quindi il costo
+    di uno step cresce solo con la dimensione degli array, non con cicli Python per asset.
+    """
+
+    def __init__(self, data, initial_balances={"Danny": 100, "Giuseppe": 100}, assets=None, max_assets=5,
+                 max_steps=500, scalping=True, price_column="close", symbol_column="coin_id"):
+        super(MultiAssetTradingEnv, self).__init__()
+        self.prices, self.assets = price_matrix(data, assets, max_assets, price_column, symbol_column)
+        if len(self.prices) < 2:
+            raise ValueError("❌ Dati insufficienti per l'ambiente multi-asset.")
+
+        self.account_names = list(initial_balances)
+        self.initial_balances = np.array([initial_balances[name] for name in self.account_names], dtype=np.float64)
+        self.fee = SCALPING_FEE if scalping else TRADING_FEE
+        self.max_steps = min(max_steps, len(self.prices) - 1)
+
+        n_accounts, n_assets = len(self.account_names), len(self.assets)
+        self.holdings = np.zeros((n_accounts, n_assets))
+        self.cash = self.initial_balances.copy()
+        self.net_worth = self.initial_balances.copy()
+        self.current_step = 0
+
+        # Pesi obiettivo per account: una colonna per asset + la liquidità (normalizzati a somma 1)
+        self.action_space = spaces.Box(low=0, high=1, shape=(n_accounts, n_assets + 1), dtype=np.float32)
+        # Prezzi relativi all'inizio episodio, pesi correnti per asset e quota di liquidità per account
+        self.observation_space = spaces.Box(low=0, high=np.inf, shape=(n_assets + n_accounts * (n_assets + 1),),
+                                            dtype=np.float32)
+        self._start_prices = self.prices[0]
+
+    # ===========================
+    # 🔹 Stato e Osservazioni
+    # ===========================
+    @property
+    def accounts(self):
+        """Riepilogo per account (liquidità, posizioni, net worth) come dict, per compatibilità con gli altri ambienti."""
+        return {name: {"balance": float(self.cash[i]), "net_worth": float(self.net_worth[i]),
+                       "holdings": dict(zip(self.assets, self.holdings[i].tolist()))}
+                for i, name in enumerate(self.account_names)}
+
+    def weights(self, prices=None):
+        """Pesi correnti (account x [asset..., liquidità])."""
+        prices = self.prices[self.current_step] if prices is None else prices
+        values = np.concatenate((self.holdings * prices, self.cash[:, None]), axis=1)
+        return values / np.maximum(values.sum(axis=1, keepdims=True), 1e-12)
+
+    def _get_observation(self):
+        prices = self.prices[self.current_step]
+        return np.concatenate((prices / self._start_prices, self.weights(prices).ravel())).astype(np.float32)
+
+    def reset(self):
+        self.current_step = 0
+        self._start_prices = self.prices[0]
+        self.holdings[:] = 0.0
+        self.cash[:] = self.initial_balances
+        self.net_worth[:] = self.initial_balances
+        return self._get_observation()
+
+    # ===========================
+    # 🔹 Ribilanciamento Vettoriale
+    # ===========================
+    def _normalize(self, actions):
+        weights = np.clip(np.asarray(actions, dtype=np.float64).reshape(self.action_space.shape), 0.0, None)
+        totals = weights.sum(axis=1, keepdims=True)
+        weights[:, -1:] += totals == 0  # Pesi tutti nulli = tutto in liquidità
+        return weights / np.maximum(weights.sum(axis=1, keepdims=True), 1e-12)
+
+    def _rebalance(self, weights, prices):
+        """Porta le posizioni ai pesi obiettivo al prezzo corrente, pagando commissioni sul volume scambiato."""
+        values = self.holdings * prices
+        net_worth = self.cash + values.sum(axis=1)
+        target = weights[:, :-1] * net_worth[:, None]
+        fees = self.fee * np.abs(target - values).sum(axis=1)
+
+        # Se commissioni + investito superano il net worth, gli acquisti vengono ridotti in proporzione
+        invested = target.sum(axis=1)
+        overflow = np.maximum(invested + fees - net_worth, 0.0)
+        scale = np.where(invested > 0, 1.0 - overflow / np.maximum(invested, 1e-12), 1.0)
+        target *= scale[:, None]
+
+        self.holdings = target / prices
+        self.cash = net_worth - target.sum(axis=1) - fees
+        return fees
+
+    def step(self, actions):
+        """Ribilancia ogni account verso i pesi obiettivo e valuta il portafoglio alla barra successiva."""
+        self._rebalance(self._normalize(actions), self.prices[self.current_step])
+        self.current_step += 1
+
+        previous = self.net_worth
+        self.net_worth = self.cash + self.holdings @ self.prices[self.current_step]
+        rewards = self.net_worth - previous
+
+        done = self.current_step >= self.max_steps
+        drawdown = rewards < -MAX_DRAWDOWN * previous
+        if drawdown.any():
+            logging.warning(f"⚠️ Drawdown elevato per {np.asarray(self.account_names)[drawdown].tolist()}, "
+                            f"fermo le operazioni per protezione.")
+            done = True
+        return self._get_observation(), dict(zip(self.account_names, rewards.tolist())), done, {}
+
+
+# ===========================
+# 🔹 Benchmark Costo per Step
+# ===========================
+def benchmark_asset_scaling(asset_counts=(5, 20, 50, 100), n_accounts=2, steps=2_000, seed=0):
+    """Misura il tempo per step al crescere del numero di asset (dati sintetici)."""
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n_assets in asset_counts:
+        returns = rng.normal(0, 0.01, size=(steps + 1, n_assets))
+        data = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), columns=[f"asset_{i}" for i in range(n_assets)])
+        env = MultiAssetTradingEnv(data, {f"account_{i}": 100 for i in range(n_accounts)},
+                                   max_assets=n_assets, max_steps=steps)
+        env.reset()
+        actions = rng.random((steps,) + env.action_space.shape)
+        start = time.perf_counter()
+        for action in actions:
+            env.step(action)
+        results[n_assets] = (time.perf_counter() - start) / steps * 1e6
+        logging.info(f"🏎️ {n_assets} asset: {results[n_assets]:.1f} µs/step")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_asset_scaling()
@@ -1,4 +1,5 @@
 # portfolio_optimization
+import time
 import numpy as np
 import pandas as pd
 import logging
@@ -8,18 +9,94 @@ from pypfopt.risk_models import CovarianceShrinkage
 from pypfopt.expected_returns import mean_historical_return
 from pypfopt.hierarchical_risk_parity import HRPOpt
 from risk_management import RiskManagement
+from streaming_estimators import StreamingMoments
 
 # 📌 Configurazione del logging avanzato
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+RISK_FREE_RATE = 0.01  # Annuale
+FREQUENCY = 252  # Barre per anno, come il default di pypfopt
+NONZERO_WEIGHT = 1e-4  # Sotto questa soglia un peso conta come nullo nei report
+
+
+def per_bar_risk_free(rate=RISK_FREE_RATE, frequency=FREQUENCY):
+    """Tasso privo di rischio annuale convertito nelle stesse unità dei rendimenti per barra."""
+    return (1 + rate) ** (1 / frequency) - 1
+
+# 📌 Statistiche e derivate analitiche per SLSQP (mu e Sigma calcolati una sola volta)
+def return_statistics(returns):
+    """Rendimenti medi e matrice di covarianza come array NumPy contigui."""
+    values = np.asarray(returns, dtype=np.float64)
+    return values.mean(axis=0), np.atleast_2d(np.cov(values, rowvar=False))
+
+def negative_sharpe(weights, mu, sigma, risk_free=RISK_FREE_RATE):
+    """Sharpe ratio cambiato di segno e il suo gradiente rispetto ai pesi."""
+    sigma_w = sigma @ weights
+    volatility = np.sqrt(max(weights @ sigma_w, 1e-18))
+    excess = weights @ mu - risk_free
+    value = -excess / volatility
+    gradient = -(mu / volatility - excess * sigma_w / volatility ** 3)
+    return value, gradient
+
+def max_sharpe_weights(mu, sigma, max_volatility=None, risk_free=RISK_FREE_RATE, x0=None):
+    """Pesi long-only a Sharpe massimo con Jacobiani espliciti.
+
+    Il limite di volatilità è un vincolo di disuguaglianza liscio (max_volatility² - w'Σw >= 0)
+    invece di un obiettivo infinito, così SLSQP resta nella regione ammissibile senza salti.
+    Restituisce (pesi, OptimizeResult).
+    """
+    n_assets = len(mu)
+    ones = np.ones(n_assets)
+    constraints = [{'type': 'eq', 'fun': lambda weights: weights.sum() - 1, 'jac': lambda weights: ones}]
+    if max_volatility is not None:
+        limit = max_volatility ** 2
+        constraints.append({'type': 'ineq', 'fun': lambda weights: limit - weights @ sigma @ weights,
+                            'jac': lambda weights: -2 * (sigma @ weights)})
+    initial_guess = ones / n_assets if x0 is None else np.asarray(x0, dtype=np.float64)
+    result = minimize(negative_sharpe, initial_guess, args=(mu, sigma, risk_free), jac=True, method='SLSQP',
+                      bounds=[(0, 1)] * n_assets, constraints=constraints)
+    return (result.x if result.success else np.zeros(n_assets)), result
+
 class PortfolioOptimizer:
     """Ottimizzatore del portafoglio con gestione avanzata del rischio, supporto per scalping e auto-adattamento."""
 
-    def __init__(self, market_data, balance, risk_tolerance=0.05, scalping=False):
+    def __init__(self, market_data, balance, risk_tolerance=0.05, scalping=False, estimator=None, frequency=FREQUENCY):
         self.market_data = market_data
+        self.estimator = estimator  # StreamingMoments: se presente sostituisce pivot e stime sullo storico
+        self.frequency = frequency
         self.scalping = scalping
-        self.risk_management = RiskManagement(max_risk=risk_tolerance)
+        self.risk_tolerance = risk_tolerance
+        self.risk_management = RiskManagement(max_drawdown=risk_tolerance)
         self.balance = balance  # Il saldo attuale viene considerato per regolare l'allocazione
+        self.universe = None  # Coppie classificate dal PairRankingService (None = tutti i simboli)
+        self.frontier_solver = None  # FrontierSolver riutilizzato tra le barre (partenza a caldo)
+        self.large_universe = None  # LargeUniverseOptimizer: clustering HRP in cache tra le chiamate
+
+    def update_universe(self, diff):
+        """Riceve un PairsDiff e limita le prossime ottimizzazioni alle coppie classificate."""
+        self.universe = list(diff.pairs)
+
+    def _universe_data(self):
+        if self.universe is None or "symbol" not in self.market_data.columns:
+            return self.market_data
+        return self.market_data[self.market_data["symbol"].isin(self.universe)]
+
+    @classmethod
+    def streaming(cls, symbols, balance, risk_tolerance=0.05, scalping=False, history=None, **estimator_kwargs):
+        """Ottimizzatore alimentato barra per barra con `on_bar`, opzionalmente inizializzato dallo storico."""
+        estimator = StreamingMoments(symbols, **estimator_kwargs)
+        if history is not None:
+            estimator.seed(history)
+        return cls(None, balance, risk_tolerance, scalping, estimator=estimator)
+
+    def on_bar(self, prices, timestamp=None):
+        """Aggiorna le stime in O(asset²) con le chiusure della nuova barra e ri-ottimizza.
+
+        I pesi passano da RiskManagement.apply_risk_constraints: long-only, con somma al più
+        `max_exposure` (il resto resta in liquidità).
+        """
+        self.estimator.update(prices, timestamp)
+        return self.optimize_portfolio()
 
     def optimize_portfolio(self):
         """Ottimizza il portafoglio in base al tipo di trading (scalping o dati storici) e gestione del rischio."""
@@ -32,9 +109,12 @@ class PortfolioOptimizer:
 
     def _optimize_historical(self):
         """Ottimizzazione classica basata su dati storici con gestione avanzata del rischio."""
-        prices = self.market_data.pivot_table(index="timestamp", columns="symbol", values="close")
-        mu = mean_historical_return(prices)
-        S = CovarianceShrinkage(prices).ledoit_wolf()
+        if self.estimator is not None:
+            mu, S = self.estimator.statistics(self.universe, self.frequency)
+        else:
+            prices = self._universe_data().pivot_table(index="timestamp", columns="symbol", values="close")
+            mu = mean_historical_return(prices)
+            S = CovarianceShrinkage(prices).ledoit_wolf()
         ef = EfficientFrontier(mu, S)
 
         # Massimizza Sharpe Ratio con gestione del rischio dinamica
@@ -45,7 +125,12 @@ class PortfolioOptimizer:
 
     def _optimize_scalping(self):
         """Ottimizzazione per scalping basata su alta frequenza e liquidità con gestione del rischio."""
-        recent_prices = self.market_data.pivot_table(index="timestamp", columns="symbol", values="close").iloc[-20:]
+        if self.estimator is not None:
+            recent_prices = self.estimator.recent_prices()
+            if self.universe is not None:
+                recent_prices = recent_prices[[symbol for symbol in self.universe if symbol in recent_prices.columns]]
+        else:
+            recent_prices = self._universe_data().pivot_table(index="timestamp", columns="symbol", values="close").iloc[-20:]
         hrp = HRPOpt(recent_prices)
         hrp_weights = hrp.optimize()
 
@@ -54,28 +139,57 @@ class PortfolioOptimizer:
         logging.info(f"⚡ Allocazione scalping ottimizzata con gestione del rischio: {optimized_weights}")
         return optimized_weights
 
-    def optimize_with_constraints(self):
-        """Ottimizza il portafoglio con vincoli avanzati e gestione del rischio basata sul saldo disponibile."""
-        max_risk_allowed = self.risk_management.adjust_risk(self.balance)
-
-        # Funzione obiettivo: massimizzare Sharpe Ratio con penalizzazione per rischio elevato
-        def objective(weights):
-            port_return = np.dot(weights, self.market_data.mean())
-            port_volatility = np.sqrt(np.dot(weights.T, np.dot(self.market_data.cov(), weights)))
-            sharpe_ratio = (port_return - 0.01) / port_volatility
-
-            # Penalizza se il rischio supera il massimo consentito
-            if port_volatility > max_risk_allowed:
-                return np.inf  
-
-            return -sharpe_ratio  # Minimizza il negativo per massimizzare Sharpe Ratio
-
-        constraints = {'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1}
-        bounds = [(0, 1) for _ in range(len(self.market_data.columns))]
-        initial_guess = np.ones(len(self.market_data.columns)) / len(self.market_data.columns)
-        result = minimize(objective, initial_guess, method='SLSQP', bounds=bounds, constraints=constraints)
+    def optimize_accounts(self, account_risk, risk_targets=None):
+        """Un punto della frontiera efficiente per ogni account ({account: volatilità massima} -> {account: pesi}).
 
-        optimized_allocation = result.x if result.success else np.zeros_like(initial_guess)
+        La frontiera viene calcolata una volta per barra per tutti gli account, ripartendo
+        dalle soluzioni della barra precedente.
+        """
+        from frontier_solver import FrontierSolver, RISK_TARGETS
+        if self.estimator is not None:
+            mu, sigma = self.estimator.statistics(self.universe)
+            symbols, mu, sigma = list(mu.index), mu.to_numpy(), sigma.to_numpy()
+        else:
+            symbols = list(self.market_data.columns)
+            mu, sigma = return_statistics(self.market_data)
+        if self.frontier_solver is None:
+            self.frontier_solver = FrontierSolver(risk_targets if risk_targets is not None else RISK_TARGETS)
+        allocations = {account: dict(zip(symbols, weights))
+                       for account, weights in self.frontier_solver.allocate(mu, sigma, account_risk).items()}
+        logging.info(f"🔍 Frontiera condivisa per {len(allocations)} account.")
+        return allocations
+
+    def optimize_large_universe(self, method="hrp", max_volatility=None, max_candidates=None):
+        """Modalità per centinaia di asset: float32, covarianza fattoriale, HRP con clustering in cache
+        oppure Sharpe massimo sui candidati preselezionati. `market_data` contiene i rendimenti (barre x asset)."""
+        from large_universe import LargeUniverseOptimizer
+        if self.large_universe is None:
+            self.large_universe = LargeUniverseOptimizer()
+        returns = self.market_data if self.universe is None else self.market_data[
+            [symbol for symbol in self.universe if symbol in self.market_data.columns]]
+        self.large_universe.fit(returns)
+        if method == "hrp":
+            weights = self.large_universe.hrp_weights()
+        else:
+            weights = self.large_universe.max_sharpe(max_volatility or self.risk_tolerance, max_candidates)
+        logging.info(f"🌐 Allocazione su {len(returns.columns)} asset ({method}): {len(weights)} pesi.")
+        return weights
+
+    def optimize_with_constraints(self, x0=None):
+        """Ottimizza il portafoglio con vincoli avanzati e gestione del rischio basata sul saldo disponibile.
+
+        mu e Sigma vengono calcolati una volta; SLSQP usa il gradiente analitico dello Sharpe ratio
+        e la volatilità massima (`risk_tolerance`) come vincolo liscio.
+        """
+        if self.estimator is not None:
+            mu, sigma = (stat.to_numpy() for stat in self.estimator.statistics(self.universe))
+        else:
+            mu, sigma = return_statistics(self.market_data)
+        # mu per barra: anche il tasso privo di rischio va per barra, altrimenti domina e dà soluzioni d'angolo
+        optimized_allocation, result = max_sharpe_weights(mu, sigma, self.risk_tolerance,
+                                                          risk_free=per_bar_risk_free(frequency=self.frequency), x0=x0)
+        if not result.success:
+            logging.warning(f"⚠️ Ottimizzazione vincolata non riuscita: {result.message}")
         logging.info(f"🔍 Allocazione finale con vincoli di rischio: {optimized_allocation}")
         return optimized_allocation
 
@@ -84,13 +198,43 @@ def optimize_for_conditions(market_data, balance, market_condition, risk_toleran
     optimizer = PortfolioOptimizer(market_data, balance, risk_tolerance, scalping=(market_condition == "scalping"))
     return optimizer.optimize_with_constraints()
 
+def benchmark_constraint_optimization(asset_counts=(5, 10, 25, 50, 100), n_bars=500, compare_legacy=True, seed=0):
+    """Tempo di optimize_with_constraints al crescere degli asset, con la versione a differenze finite come riferimento.
+
+    Rendimenti e tasso privo di rischio sono per barra; per ogni solver si riportano esito e pesi non nulli,
+    così un'ottimizzazione fallita o degenere (tutto su un asset) non passa per un risultato valido.
+    """
+    rng = np.random.default_rng(seed)
+    risk_free = per_bar_risk_free()
+    results = {}
+    for n_assets in asset_counts:
+        returns = pd.DataFrame(rng.normal(0.0005, 0.01, (n_bars, n_assets)) + rng.normal(0, 0.001, n_assets))
+        start = time.perf_counter()
+        mu, sigma = return_statistics(returns)
+        weights, result = max_sharpe_weights(mu, sigma, 0.05, risk_free=risk_free)
+        results[n_assets] = {"analytic_s": time.perf_counter() - start, "evaluations": result.nfev,
+                             "success": bool(result.success), "nonzero": int((weights > NONZERO_WEIGHT).sum()),
+                             "sharpe": float(-negative_sharpe(weights, mu, sigma, risk_free)[0])}
+
+        if compare_legacy:
+            def objective(weights):  # Obiettivo originale: statistiche pandas ad ogni valutazione
+                port_volatility = np.sqrt(weights @ returns.cov().to_numpy() @ weights)
+                return -(weights @ returns.mean().to_numpy() - risk_free) / port_volatility
+            start = time.perf_counter()
+            legacy = minimize(objective, np.ones(n_assets) / n_assets, method='SLSQP', bounds=[(0, 1)] * n_assets,
+                              constraints={'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
+            results[n_assets].update(legacy_s=time.perf_counter() - start, legacy_evaluations=legacy.nfev,
+                                     legacy_success=bool(legacy.success),
+                                     legacy_nonzero=int((legacy.x > NONZERO_WEIGHT).sum()),
+                                     legacy_sharpe=float(-negative_sharpe(legacy.x, mu, sigma, risk_free)[0]))
+        logging.info(f"🏎️ {n_assets} asset: {results[n_assets]}")
+    return results
+
 def dynamic_allocation(trading_pairs, capital):
     """Distribuisce il capitale basandosi su volatilità, trend e liquidità."""
-    total_score = sum([pair[2] * abs(pair[3] - pair[4]) for pair in trading_pairs])  # Ponderazione
-    allocations = {}
-
-    for pair in trading_pairs:
-        weight = (pair[2] * abs(pair[3] - pair[4])) / total_score  # Combina volatilità e trend
-        allocations[pair[0]] = capital * weight  # Distribuzione intelligente del capitale
-
-    return allocations
+    if len(trading_pairs) == 0:
+        return {}
+    symbols = [pair[0] for pair in trading_pairs]
+    columns = np.array([pair[2:5] for pair in trading_pairs], dtype=np.float64)
+    scores = columns[:, 0] * np.abs(columns[:, 1] - columns[:, 2])  # Combina volatilità e trend
+    return dict(zip(symbols, (capital * scores / scores.sum()).tolist()))  # Distribuzione intelligente del capitale
@@ -0,0 +1,139 @@
+# prediction_cache.py - Memoizzazione delle previsioni per (versione modello, simbolo, ultima barra)
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_MAX_SIZE = 4096  # Previsioni conservate al massimo
+DEFAULT_TTL = 300  # Secondi: una previsione non sopravvive oltre un intervallo di barra ragionevole
+
+
+class PredictionCache:
+    """Cache LRU con TTL per le previsioni dei modelli; le richieste duplicate in corso attendono lo stesso risultato.
+
+    I valori restituiti sono condivisi tra i chiamanti e non vanno modificati.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (valore, scadenza)
+        self._inflight = {}  # key -> Future del calcolo in corso
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.inflight_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key, compute_fn):
+        """Restituisce la previsione in cache, attende quella in corso o la calcola con `compute_fn()`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.inflight_hits += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute_fn()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def invalidate(self, model_version=None):
+        """Svuota la cache, oppure solo le previsioni di una versione del modello."""
+        with self._lock:
+            if model_version is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == model_version]:
+                    del self._entries[key]
+
+    def stats(self):
+        """Metriche di utilizzo: quante chiamate ai modelli sono state risparmiate."""
+        with self._lock:
+            saved = self.hits + self.inflight_hits
+            total = saved + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "inflight_hits": self.inflight_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "model_calls_saved": saved,
+                "hit_rate": saved / total if total else 0.0,
+            }
+
+    def log_stats(self):
+        """Registra le metriche della cache delle previsioni."""
+        stats = self.stats()
+        logging.info(f"🧠 Cache previsioni: hit rate {stats['hit_rate']:.1%}, "
+                     f"{stats['model_calls_saved']} chiamate ai modelli risparmiate su "
+                     f"{stats['model_calls_saved'] + stats['misses']} ({stats['size']} voci).")
+        return stats
+
+
+# 📌 Cache condivisa da RiskManagement, trading_bot e dagli account di MULTI_ACCOUNT
+PREDICTION_CACHE = PredictionCache()
+
+_registry_version = {"mtime": None, "version": 0}
+
+
+def registered_model_version():
+    """Versione dell'ultimo modello registrato da ai_model (riletta solo quando il registro cambia)."""
+    from ai_model import REGISTRY_FILE, load_model_registry
+    try:
+        mtime = os.stat(REGISTRY_FILE).st_mtime_ns
+    except OSError:
+        return 0
+    if mtime != _registry_version["mtime"]:
+        _registry_version["version"] = load_model_registry().get("version", 0)
+        _registry_version["mtime"] = mtime
+    return _registry_version["version"]
+
+
+def prediction_key(symbol, last_bar_timestamp, model_version=None):
+    """Chiave della previsione: (versione modello, simbolo, timestamp dell'ultima barra in input)."""
+    if model_version is None:
+        model_version = registered_model_version()
+    return (model_version, symbol, last_bar_timestamp)
+
+
+def cached_prediction(symbol, last_bar_timestamp, compute_fn, model_version=None, cache=PREDICTION_CACHE):
+    """Esegue `compute_fn()` una sola volta per (versione, simbolo, ultima barra)."""
+    return cache.get_or_compute(prediction_key(symbol, last_bar_timestamp, model_version), compute_fn)
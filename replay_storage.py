@@ -0,0 +1,305 @@
+# replay_storage.py - Replay buffer condiviso, allocato in modo lazy, compatto e su file memory-mapped
+import os
+import json
+import time
+import zlib
+import shutil
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Percorso dei replay buffer su disco (USB se disponibile, altrimenti disco locale)
+REPLAY_DIR = Path("/mnt/usb_trading_data/replay") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/replay")
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_CHUNK_SIZE = 65_536  # Righe aggiunte ad ogni crescita del file
+OBS_DTYPES = {"float32": np.float32, "float16": np.float16, "uint8": np.uint8}
+MAX_RUNS = 3  # Esecuzioni conservate per ogni storage
+
+# 📌 Id dell'esecuzione: ereditato dai processi figli tramite l'ambiente, così condividono lo stesso storage
+RUN_ID = os.environ.setdefault("REPLAY_RUN_ID", f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+
+
+def agent_id_for(name):
+    """Id numerico stabile di un agente (uguale in tutti i processi): crc32 completo a 32 bit."""
+    return zlib.crc32(str(name).encode())
+
+
+class ReplayStorage:
+    """Transizioni (obs, next_obs, action, reward, done, agent) in file memory-mapped che crescono a blocchi.
+
+    Nessuna memoria viene riservata finché non arriva la prima transizione: la dimensione
+    delle osservazioni viene dedotta allora e i file crescono di `chunk_size` righe alla volta.
+    Le osservazioni possono essere salvate in float16 o quantizzate in uint8 su [obs_low, obs_high].
+    Più agenti (o processi, passando lo stesso `lock`) condividono lo stesso storage tramite viste.
+    """
+
+    def __init__(self, directory, capacity=DEFAULT_CAPACITY, chunk_size=DEFAULT_CHUNK_SIZE,
+                 obs_dtype="float16", obs_low=0.0, obs_high=1.0, lock=None):
+        if obs_dtype not in OBS_DTYPES:
+            raise ValueError(f"Tipo di osservazione non supportato: {obs_dtype}")
+        self.directory = Path(directory)
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.obs_dtype = obs_dtype
+        self.obs_low = obs_low
+        self.obs_high = obs_high
+        self.lock = lock or threading.Lock()
+
+        self.obs_dim = None
+        self.action_dim = None
+        self._arrays = {}
+        self._mapped_rows = 0
+        self._header = None
+        self._agent_rows = {}  # agent_id -> (count visto, posizioni assolute delle transizioni dell'agente)
+
+        if (self.directory / "meta.json").exists():
+            self._open_existing()
+
+    # ===========================
+    # 🔹 Allocazione Lazy
+    # ===========================
+    def _fields(self):
+        obs_type = OBS_DTYPES[self.obs_dtype]
+        return {
+            "obs": (obs_type, (self.obs_dim,)),
+            "next_obs": (obs_type, (self.obs_dim,)),
+            "action": (np.float32, (self.action_dim,)),
+            "reward": (np.float32, ()),
+            "done": (np.bool_, ()),
+            "agent": (np.uint32, ()),
+        }
+
+    def _open_existing(self):
+        """Riapre uno storage esistente (altro processo o riavvio)."""
+        with open(self.directory / "meta.json", "r") as f:
+            meta = json.load(f)
+        self.obs_dim, self.action_dim = meta["obs_dim"], meta["action_dim"]
+        self.obs_dtype, self.capacity = meta["obs_dtype"], meta["capacity"]
+        self.obs_low, self.obs_high = meta["obs_low"], meta["obs_high"]
+        self._header = np.memmap(self.directory / "header.dat", dtype=np.int64, mode="r+", shape=(2,))
+        self._map(int(self._header[1]))
+
+    def _initialize(self, obs, action):
+        """Prima transizione: fissa le dimensioni e crea i file (ancora vuoti)."""
+        self.obs_dim = int(np.prod(np.shape(obs)[1:]))
+        self.action_dim = int(np.prod(np.shape(action)[1:])) or 1
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "meta.json", "w") as f:
+            json.dump({"obs_dim": self.obs_dim, "action_dim": self.action_dim, "obs_dtype": self.obs_dtype,
+                       "capacity": self.capacity, "obs_low": self.obs_low, "obs_high": self.obs_high}, f)
+        self._header = np.memmap(self.directory / "header.dat", dtype=np.int64, mode="w+", shape=(2,))
+
+    def _map(self, rows):
+        """(Ri)mappa i file con `rows` righe, estendendoli se necessario (file sparsi: nessun costo su disco)."""
+        if rows <= self._mapped_rows:
+            return
+        for name, (dtype, shape) in self._fields().items():
+            path = self.directory / f"{name}.dat"
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape))
+            with open(path, "ab") as f:
+                if f.tell() < rows * row_bytes:
+                    f.truncate(rows * row_bytes)
+            self._arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(rows,) + shape)
+        self._mapped_rows = rows
+
+    def _refresh(self):
+        """Rimappa i file se un altro processo li ha fatti crescere."""
+        if self._header is not None:
+            self._map(int(self._header[1]))
+
+    def _grow(self, required_rows):
+        rows = min(self.capacity, -(-required_rows // self.chunk_size) * self.chunk_size)
+        if rows > self._mapped_rows:
+            self._map(rows)
+            self._header[1] = rows
+
+    # ===========================
+    # 🔹 Codifica delle Osservazioni
+    # ===========================
+    def _encode(self, obs):
+        obs = np.asarray(obs, dtype=np.float32).reshape(len(obs), self.obs_dim)
+        if self.obs_dtype == "uint8":
+            scaled = (obs - self.obs_low) / (self.obs_high - self.obs_low)
+            return np.rint(np.clip(scaled, 0.0, 1.0) * 255).astype(np.uint8)
+        return obs.astype(OBS_DTYPES[self.obs_dtype])
+
+    def _decode(self, obs):
+        if self.obs_dtype == "uint8":
+            return obs.astype(np.float32) / 255 * (self.obs_high - self.obs_low) + self.obs_low
+        return obs.astype(np.float32)
+
+    # ===========================
+    # 🔹 Scrittura e Campionamento
+    # ===========================
+    @property
+    def count(self):
+        """Transizioni scritte in totale (anche da altri processi)."""
+        return int(self._header[0]) if self._header is not None else 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _check_dimensions(self, obs, action):
+        obs_dim, action_dim = int(np.prod(np.shape(obs)[1:])), int(np.prod(np.shape(action)[1:])) or 1
+        if (obs_dim, action_dim) != (self.obs_dim, self.action_dim):
+            raise ValueError(f"❌ Transizioni con obs_dim={obs_dim}, action_dim={action_dim} incompatibili con lo "
+                             f"storage {self.directory} (obs_dim={self.obs_dim}, action_dim={self.action_dim}).")
+
+    def add(self, obs, next_obs, action, reward, done, agent_id=0):
+        """Aggiunge una o più transizioni (prima dimensione = batch)."""
+        obs = np.atleast_2d(np.asarray(obs, dtype=np.float32))
+        action = np.asarray(action, dtype=np.float32).reshape(len(obs), -1)
+        with self.lock:
+            if self._header is None:
+                if (self.directory / "meta.json").exists():
+                    self._open_existing()  # Creato nel frattempo da un altro processo
+                else:
+                    self._initialize(obs, action)
+            self._check_dimensions(obs, action)
+            start = self.count
+            rows = (start + np.arange(len(obs))) % self.capacity
+            self._grow(min(start + len(obs), self.capacity))
+
+            self._arrays["obs"][rows] = self._encode(obs)
+            self._arrays["next_obs"][rows] = self._encode(np.atleast_2d(next_obs))
+            self._arrays["action"][rows] = action
+            self._arrays["reward"][rows] = np.asarray(reward, dtype=np.float32).reshape(-1)
+            self._arrays["done"][rows] = np.asarray(done, dtype=bool).reshape(-1)
+            self._arrays["agent"][rows] = agent_id
+            self._header[0] = start + len(obs)
+
+    def _rows_for_agent(self, agent_id):
+        """Righe appartenenti a un agente, aggiornate leggendo solo le transizioni nuove (anche dopo la rotazione).
+
+        L'indice conserva le posizioni assolute di scrittura: quelle sovrascritte (più vecchie di
+        `count - capacity`) vengono tagliate in testa, le nuove aggiunte in coda.
+        """
+        self._refresh()
+        count = self.count
+        seen, positions = self._agent_rows.get(agent_id, (0, np.empty(0, dtype=np.int64)))
+        if seen != count:
+            oldest = max(count - self.capacity, 0)
+            new_positions = np.arange(max(seen, oldest), count, dtype=np.int64)
+            new_positions = new_positions[self._arrays["agent"][new_positions % self.capacity] == agent_id]
+            positions = np.concatenate((positions[np.searchsorted(positions, oldest):], new_positions))
+            self._agent_rows[agent_id] = (count, positions)
+        return positions % self.capacity
+
+    def sample(self, batch_size, agent_id=None, rng=None):
+        """Campiona un batch di transizioni (di tutti gli agenti o di uno solo), con osservazioni decodificate."""
+        rng = rng or np.random.default_rng()
+        self._refresh()
+        if agent_id is None:
+            candidates = len(self)
+            rows = rng.integers(0, candidates, size=batch_size) if candidates else np.empty(0, dtype=np.int64)
+        else:
+            agent_rows = self._rows_for_agent(agent_id)
+            rows = agent_rows[rng.integers(0, len(agent_rows), size=batch_size)] if len(agent_rows) else agent_rows
+        if len(rows) == 0:
+            return None
+        rows = np.sort(rows)  # Accesso sequenziale al file
+        return {
+            "obs": self._decode(self._arrays["obs"][rows]),
+            "next_obs": self._decode(self._arrays["next_obs"][rows]),
+            "action": np.asarray(self._arrays["action"][rows]),
+            "reward": np.asarray(self._arrays["reward"][rows]),
+            "done": np.asarray(self._arrays["done"][rows]),
+        }
+
+    def view(self, agent_name):
+        """Vista per-agente sullo storage condiviso."""
+        return AgentReplayView(self, agent_name)
+
+    def memory_usage_mb(self):
+        """Memoria effettivamente occupata dalle righe mappate."""
+        return sum(array.nbytes for array in self._arrays.values()) / 1024 ** 2
+
+
+class AgentReplayView:
+    """Replay buffer di un singolo agente: scrive con il proprio id e campiona solo le proprie transizioni."""
+
+    def __init__(self, storage, agent_name):
+        self.storage = storage
+        self.agent_name = agent_name
+        self.agent_id = agent_id_for(agent_name)
+
+    def add(self, obs, next_obs, action, reward, done):
+        self.storage.add(obs, next_obs, action, reward, done, agent_id=self.agent_id)
+
+    def sample(self, batch_size, rng=None):
+        return self.storage.sample(batch_size, agent_id=self.agent_id, rng=rng)
+
+    def __len__(self):
+        return len(self.storage._rows_for_agent(self.agent_id)) if self.storage.count else 0
+
+
+_shared_storages = {}
+_shared_storages_lock = threading.Lock()
+
+
+def _pid_alive(pid):
+    """True se il processo esiste ancora (su Windows senza psutil, nel dubbio, lo considera vivo)."""
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if os.name == "nt":
+        return True  # Su Windows os.kill(pid, 0) terminerebbe il processo
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Esiste, ma appartiene a un altro utente
+    return True
+
+
+def _register_owner(run_directory):
+    """Segna il processo corrente come utilizzatore dell'esecuzione (un file per PID in `owners/`)."""
+    owners = run_directory / "owners"
+    owners.mkdir(parents=True, exist_ok=True)
+    (owners / str(os.getpid())).touch()
+
+
+def _run_in_use(run_directory):
+    """True se almeno un processo che ha aperto l'esecuzione è ancora vivo."""
+    owners = run_directory / "owners"
+    return any(_pid_alive(int(path.name)) for path in owners.glob("*") if path.name.isdigit())
+
+
+def _prune_runs(directory, keep=MAX_RUNS):
+    """Elimina le esecuzioni più vecchie di uno storage, conservando le `keep` più recenti.
+
+    Le esecuzioni ancora aperte da un processo vivo (anche un altro training) non vengono mai rimosse.
+    """
+    runs = sorted((path for path in directory.glob("*") if path.is_dir() and path.name != RUN_ID),
+                  key=lambda path: path.stat().st_mtime, reverse=True)
+    for stale in runs[keep - 1:]:
+        if _run_in_use(stale):
+            logging.info(f"⏭️ Replay buffer {stale} ancora in uso da un altro processo: non rimosso.")
+            continue
+        shutil.rmtree(stale, ignore_errors=True)
+        logging.info(f"🗑️ Replay buffer di una esecuzione precedente rimosso: {stale}")
+
+
+def get_shared_replay_storage(name="drl_agent", run_id=RUN_ID, **kwargs):
+    """Storage condiviso per nome nel processo: nessuna allocazione finché non viene scritta una transizione.
+
+    Ogni esecuzione scrive in REPLAY_DIR/<name>/<run_id>: i nomi stabili degli agenti (PPO_0, ...)
+    non campionano mai transizioni di esecuzioni precedenti.
+    """
+    with _shared_storages_lock:
+        key = (name, run_id)
+        if key not in _shared_storages:
+            if (REPLAY_DIR / name).exists():
+                _prune_runs(REPLAY_DIR / name)
+            _register_owner(REPLAY_DIR / name / run_id)
+            _shared_storages[key] = ReplayStorage(REPLAY_DIR / name / run_id, **kwargs)
+        return _shared_storages[key]
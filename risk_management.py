@@ -4,8 +4,9 @@ import ccxt
 import numpy as np
 import talib
 import data_handler  # Per gestire i dati di mercato (normalizzati)
+from prediction_cache import cached_prediction
+from ohlcv_cache import fetch_ohlcv_cached
 from datetime import datetime, timedelta
-from ai_model import VolatilityPredictor
 
 # 📌 Configurazione avanzata del logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -13,7 +14,7 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 class RiskManagement:
     """Gestisce il rischio, l'allocazione del capitale e il trailing stop in modo avanzato per il trading SPOT."""
     
-    def __init__(self, max_drawdown=0.20, risk_per_trade=0.02, max_exposure=0.5):
+    def __init__(self, max_drawdown=0.20, risk_per_trade=0.02, max_exposure=0.5, exchange=None):
         self.max_drawdown = max_drawdown  # Percentuale massima di perdita prima di fermare il trading
         self.trailing_stop_pct = 0.05  # Valore predefinito del trailing stop
         self.min_balance = float('inf')
@@ -21,22 +22,41 @@ class RiskManagement:
         self.kill_switch_activated = False
         self.risk_per_trade = risk_per_trade  # Percentuale del saldo investita per trade
         self.max_exposure = max_exposure  # Percentuale massima del saldo totale allocata a trade aperti
-        self.volatility_predictor = VolatilityPredictor()
+        self._volatility_predictor = None  # Caricato al primo utilizzo: ai_model non viene importato all'avvio
+        self.exchange = exchange  # Connessione ccxt per le candele (Binance se non indicata)
+
+    @property
+    def volatility_predictor(self):
+        """Istanzia il predittore di volatilità solo quando serve."""
+        if self._volatility_predictor is None:
+            from ai_model import VolatilityPredictor
+            self._volatility_predictor = VolatilityPredictor()
+        return self._volatility_predictor
 
     def adaptive_stop_loss(self, entry_price, pair):
-    """Calcola uno stop-loss e trailing-stop basato su volatilità e trend."""
-    ohlcv = self.exchange.fetch_ohlcv(pair, timeframe="1h")
-    closes = [candle[4] for candle in ohlcv]
-    volatility = np.std(closes) / np.mean(closes)
+        """Calcola uno stop-loss e trailing-stop basato su volatilità e trend."""
+        if self.exchange is None:
+            self.exchange = ccxt.binance()
+        ohlcv = fetch_ohlcv_cached(self.exchange, pair, "1h")  # Solo le candele nuove dall'ultima chiamata
+        closes = [candle[4] for candle in ohlcv]
+        volatility = np.std(closes) / np.mean(closes)
 
-    stop_loss = entry_price * (1 - (volatility * 1.5))  # Stop-loss adattivo
-    trailing_stop = entry_price * (1 - (volatility * 0.8))  # Trailing-stop meno aggressivo
+        stop_loss = entry_price * (1 - (volatility * 1.5))  # Stop-loss adattivo
+        trailing_stop = entry_price * (1 - (volatility * 0.8))  # Trailing-stop meno aggressivo
 
-    return stop_loss, trailing_stop
+        return stop_loss, trailing_stop
 
     def adjust_risk(self, market_data):
         """Adatta dinamicamente il trailing stop e il capitale in base alla volatilità del mercato."""
-        future_volatility = self.volatility_predictor.predict_volatility(np.array([[market_data['volume'], market_data['price_change'], market_data['rsi'], market_data['bollinger_width']]]))
+        features = np.array([[market_data['volume'], market_data['price_change'], market_data['rsi'], market_data['bollinger_width']]])
+        # Una sola previsione per simbolo e barra, condivisa tra account e chiamanti
+        symbol = market_data.get('symbol')
+        if symbol is None:  # Senza simbolo la chiave non distingue le coppie: niente cache
+            future_volatility = self.volatility_predictor.predict_volatility(features)
+        else:
+            last_bar = market_data.get('timestamp', features.tobytes())
+            future_volatility = cached_prediction(symbol, last_bar,
+                                                  lambda: self.volatility_predictor.predict_volatility(features))
         atr = future_volatility[0] * 100  # Previsione volatilità futura
         
         if atr > 15:
@@ -70,6 +90,22 @@ class RiskManagement:
         max_allowed = balance * self.max_exposure
         return min(adjusted_position_size, max_allowed)
 
+    def apply_risk_constraints(self, weights):
+        """Pesi SPOT (nessun peso negativo) con esposizione totale limitata a `max_exposure`; il resto resta in liquidità.
+
+        Con il kill switch attivo tutti i pesi vanno a zero.
+        """
+        weights = {symbol: max(float(weight), 0.0) for symbol, weight in dict(weights).items()}
+        if self.kill_switch_activated:
+            logging.warning("⚠️ Kill switch attivo: allocazione azzerata.")
+            return dict.fromkeys(weights, 0.0)
+        exposure = sum(weights.values())
+        if exposure > self.max_exposure:
+            scale = self.max_exposure / exposure
+            weights = {symbol: weight * scale for symbol, weight in weights.items()}
+            logging.info(f"📉 Esposizione ridotta da {exposure:.2%} a {self.max_exposure:.2%}.")
+        return weights
+
 class TradingBot:
     """Gestisce il trading SPOT con trailing stop adattivo e gestione avanzata del capitale."""
     
@@ -0,0 +1,208 @@
+# rule_evaluator.py - Valutazione vettoriale delle regole di trading generate da script.generate_trading_logic
+import ast
+import time
+import logging
+import operator
+import itertools
+import numpy as np
+import pandas as pd
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TRADING_FEE = 0.001
+PERIODS_PER_YEAR = 365 * 24  # Barre orarie
+VARIANT_FACTORS = tuple(np.round(np.linspace(0.5, 1.5, 21), 2))  # Moltiplicatori delle soglie per le varianti
+RULE_CHUNK = 64  # Regole valutate insieme (righe delle matrici regole x barre)
+
+_COMPARE = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+            ast.Eq: operator.eq, ast.NotEq: operator.ne}
+_BINARY = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv}
+_ACTIONS = {"buy": 1, "sell": -1}
+
+
+# ===========================
+# 🔹 Variabili delle Regole
+# ===========================
+def _rsi(close, period=14):
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / period, adjust=False).mean()
+    return 100 - 100 / (1 + gain / loss)
+
+
+class RuleContext:
+    """Array NumPy delle variabili usate nelle regole, calcolati al primo utilizzo e riutilizzati.
+
+    Usa le colonne di indicators.calculate_indicators se presenti (RSI, MACD, BB_Lower, ...),
+    altrimenti le ricava da close/high/low/volume.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.close = data["close"].astype(float).reset_index(drop=True)
+        self._cache = {"price": self.close.to_numpy()}
+        self._builders = {
+            "rsi": lambda: self._column("RSI", lambda: _rsi(self.close)),
+            "macd": lambda: self._column("MACD", lambda: self.close.ewm(span=12, adjust=False).mean()
+                                         - self.close.ewm(span=26, adjust=False).mean()),
+            "bollinger_lower": lambda: self._column("BB_Lower", lambda: self._bollinger(-2)),
+            "bollinger_upper": lambda: self._column("BB_Upper", lambda: self._bollinger(2)),
+            "volume": lambda: self._column("volume", lambda: pd.Series(np.zeros(len(self.close)))),
+            "avg_volume": lambda: pd.Series(self["volume"]).rolling(20, min_periods=1).mean(),
+            "stochastic": lambda: self._stochastic(),
+            "momentum": lambda: self.close - self.close.shift(10),
+        }
+
+    def _column(self, name, fallback):
+        if name in self.data.columns:
+            return self.data[name].astype(float).reset_index(drop=True)
+        return fallback()
+
+    def _bollinger(self, width):
+        return self.close.rolling(20).mean() + width * self.close.rolling(20).std()
+
+    def _stochastic(self, period=14):
+        high = self._column("high", lambda: self.close).rolling(period).max()
+        low = self._column("low", lambda: self.close).rolling(period).min()
+        return 100 * (self.close - low) / (high - low)
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._builders:
+                raise KeyError(f"Variabile sconosciuta nella regola: {name}")
+            self._cache[name] = np.asarray(self._builders[name](), dtype=np.float64)
+        return self._cache[name]
+
+
+# ===========================
+# 🔹 Parsing e Compilazione
+# ===========================
+class CompiledRule:
+    """Regola `if <condizione>: buy()/sell()` compilata in una funzione contesto -> maschera booleana."""
+
+    def __init__(self, text, side, condition):
+        self.text = text
+        self.side = side  # +1 acquisto, -1 vendita
+        self._condition = condition
+
+    def mask(self, context):
+        values = self._condition(context)
+        return np.broadcast_to(np.asarray(values, dtype=bool), context["price"].shape)
+
+    def __repr__(self):
+        return f"CompiledRule({self.text!r})"
+
+
+def _compile_node(node):
+    """Traduce un nodo dell'AST in una funzione su array NumPy (nessun eval del testo)."""
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda ctx: combine.reduce([part(ctx) for part in parts])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        operand = _compile_node(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda ctx: np.logical_not(operand(ctx))
+        return lambda ctx: -operand(ctx)
+    if isinstance(node, ast.Compare):
+        operands = [_compile_node(node.left)] + [_compile_node(comparator) for comparator in node.comparators]
+        ops = [_COMPARE[type(op)] for op in node.ops]
+
+        def compare(ctx):
+            values = [operand(ctx) for operand in operands]
+            result = ops[0](values[0], values[1])
+            for op, left, right in zip(ops[1:], values[1:], values[2:]):
+                result = result & op(left, right)
+            return result
+        return compare
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+        left, right, op = _compile_node(node.left), _compile_node(node.right), _BINARY[type(node.op)]
+        return lambda ctx: op(left(ctx), right(ctx))
+    if isinstance(node, ast.Name):
+        return lambda ctx: ctx[node.id]
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return lambda ctx: node.value
+    raise ValueError(f"Costrutto non supportato nella regola: {ast.dump(node)}")
+
+
+def parse_rule(text):
+    """Analizza `if <condizione>: buy()` / `sell()` e restituisce una CompiledRule."""
+    tree = ast.parse(text.strip())
+    if len(tree.body) != 1 or not isinstance(tree.body[0], ast.If):
+        raise ValueError(f"La regola deve essere un singolo 'if': {text}")
+    statement = tree.body[0]
+    call = statement.body[0].value if len(statement.body) == 1 and isinstance(statement.body[0], ast.Expr) else None
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in _ACTIONS):
+        raise ValueError(f"L'azione della regola deve essere buy() o sell(): {text}")
+    return CompiledRule(text.strip(), _ACTIONS[call.func.id], _compile_node(statement.test))
+
+
+def rule_variants(text, factors=VARIANT_FACTORS):
+    """Varianti di una regola ottenute scalando ogni soglia numerica (non nulla) per i `factors`."""
+    statement = ast.parse(text.strip()).body[0]
+    action = statement.body[0].value.func.id
+    constants = [node for node in ast.walk(statement.test)
+                 if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and node.value != 0]
+    originals = [node.value for node in constants]
+    variants = []
+    for combination in itertools.product(factors, repeat=len(constants)):
+        for node, original, factor in zip(constants, originals, combination):
+            node.value = round(original * factor) if isinstance(original, int) else round(original * factor, 6)
+        variants.append(f"if {ast.unparse(statement.test)}: {action}()")
+    for node, original in zip(constants, originals):
+        node.value = original
+    return list(dict.fromkeys(variants))
+
+
+# ===========================
+# 🔹 PnL Vettoriale
+# ===========================
+def _score_chunk(masks, sides, returns, fee, periods_per_year):
+    """Statistiche di PnL per un blocco di regole (righe) su tutte le barre (colonne)."""
+    exposure = np.zeros(masks.shape)
+    exposure[:, 1:] = masks[:, :-1] * sides
+    turnover = np.abs(np.diff(exposure, axis=1, prepend=0.0))
+    pnl = exposure * returns - turnover * fee
+
+    mean, std = pnl.mean(axis=1), pnl.std(axis=1)
+    active = exposure != 0
+    active_bars = active.sum(axis=1)
+    wins = ((pnl > 0) & active).sum(axis=1)
+    return {
+        "total_return": np.expm1(np.log1p(pnl).sum(axis=1)),
+        "sharpe": np.divide(mean, std, out=np.zeros_like(mean), where=std > 0) * np.sqrt(periods_per_year),
+        "trades": (turnover > 0).sum(axis=1) // 2,
+        "exposure": active_bars / masks.shape[1],
+        "hit_rate": np.divide(wins, active_bars, out=np.zeros(len(masks)), where=active_bars > 0),
+    }
+
+
+def evaluate_rules(rules, data, fee=TRADING_FEE, periods_per_year=PERIODS_PER_YEAR, chunk_size=RULE_CHUNK):
+    """Punteggi di più regole sull'intero storico con operazioni matriciali (regole x barre).
+
+    Una regola di acquisto è esposta long (+1) quando la condizione era vera alla barra
+    precedente, una di vendita short (-1): nessun look-ahead. Ogni cambio di esposizione paga `fee`.
+    Le regole sono elaborate a blocchi di `chunk_size` per contenere la memoria.
+    """
+    start = time.perf_counter()
+    context = RuleContext(data)
+    compiled = [rule if isinstance(rule, CompiledRule) else parse_rule(rule) for rule in rules]
+
+    close = context["price"]
+    returns = np.zeros_like(close)
+    returns[1:] = close[1:] / close[:-1] - 1
+
+    columns = {}
+    for offset in range(0, len(compiled), chunk_size):
+        chunk = compiled[offset:offset + chunk_size]
+        masks = np.vstack([rule.mask(context) for rule in chunk])
+        sides = np.array([rule.side for rule in chunk], dtype=np.float64)[:, None]
+        for name, values in _score_chunk(masks, sides, returns, fee, periods_per_year).items():
+            columns.setdefault(name, []).append(values)
+
+    scores = pd.DataFrame({"rule": [rule.text for rule in compiled],
+                           **{name: np.concatenate(parts) for name, parts in columns.items()}})
+    scores = scores.sort_values("sharpe", ascending=False, ignore_index=True) if len(scores) else scores
+    logging.info(f"📊 {len(compiled)} regole valutate su {len(close)} barre in {time.perf_counter() - start:.2f}s.")
+    return scores
@@ -9,7 +9,6 @@ import importlib
 import multiprocessing
 import threading
 import numpy as np
-import tensorflow as tf
 from concurrent.futures import ThreadPoolExecutor
 import bridge_module
 
@@ -28,6 +27,15 @@ if not os.path.exists(MODULES_DIR):
 USB_PATH = "/mnt/usb_trading_data/"
 BACKUP_FILE = os.path.join(USB_PATH, "bot_generated_modules.zip")
 
+# 📌 Modelli di regole di trading (valutati su dati storici da rule_evaluator)
+LOGIC_TEMPLATES = [
+    "if rsi < 30 and macd > 0: buy()",
+    "if bollinger_lower > price and volume > avg_volume: buy()",
+    "if macd < 0 and rsi > 70: sell()",
+    "if stochastic > 80 and momentum < 0: sell()",
+]
+MIN_RULE_TRADES = 10  # Regole con meno operazioni nello storico non vengono selezionate
+
 
 def create_backup():
     """Esegue il backup automatico su USB."""
@@ -45,18 +53,45 @@ def create_backup():
         logging.error(f"❌ Errore durante il backup: {e}")
 
 
-def evaluate_strategy_performance():
-    """Valuta le strategie di trading basandosi sulle prestazioni passate."""
-    performance_data = {
-        "NeuralNet_Optimizer": random.uniform(0.7, 1.2),
-        "Quantum_AI": random.uniform(0.5, 1.5),
-        "Genetic_Algo": random.uniform(0.6, 1.4),
-        "Blockchain_Trading": random.uniform(0.8, 1.1),
-        "High_Frequency_Scalping": random.uniform(0.9, 1.3),
-        "Multi_Exchange_Arbitrage": random.uniform(0.4, 1.6),
-    }
-    best_strategy = max(performance_data, key=performance_data.get)
-    logging.info(f"🚀 Strategia ottimizzata selezionata: {best_strategy}")
+def evaluate_strategy_performance(data=None, templates=LOGIC_TEMPLATES, min_trades=MIN_RULE_TRADES):
+    """Valuta le strategie di trading basandosi sulle prestazioni passate.
+
+    Ogni modello di regola e le sue varianti di soglia vengono valutati in modo vettoriale
+    sullo storico OHLCV grezzo (media per coin): le soglie delle regole (RSI 30/70, ...) e i
+    rendimenti non hanno senso sulle chiusure normalizzate min-max. Restituisce la regola
+    con lo Sharpe migliore.
+    """
+    import pandas as pd
+    from rule_evaluator import evaluate_rules, rule_variants
+    if data is None:
+        from data_handler import load_raw_ohlcv, RAW_DATA_FILE
+        try:
+            data = load_raw_ohlcv(RAW_DATA_FILE)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"⚠️ Dati grezzi non disponibili ({RAW_DATA_FILE}): {e}")
+            data = pd.DataFrame()
+    if data.empty or "close" not in data.columns:
+        logging.warning("⚠️ Nessun dato storico disponibile per valutare le strategie.")
+        return None
+
+    # 📌 Chiusure non positive renderebbero i rendimenti NaN/inf
+    close = pd.to_numeric(data["close"], errors="coerce")
+    if (~(close > 0)).any():
+        logging.warning(f"⚠️ {int((~(close > 0)).sum())} barre con chiusura non positiva escluse dalla valutazione.")
+        data = data[close > 0]
+    if "timestamp" in data.columns:
+        data = data.sort_values("timestamp", kind="stable")
+
+    rules = [variant for template in templates for variant in rule_variants(template)]
+    groups = [group for _, group in data.groupby("coin_id")] if "coin_id" in data.columns else [data]
+    scores = pd.concat([evaluate_rules(rules, group) for group in groups]).groupby("rule").mean()
+    candidates = scores[scores["trades"] >= min_trades]
+    if candidates.empty:
+        logging.warning("⚠️ Nessuna regola con operazioni sufficienti nello storico.")
+        return None
+    best_strategy = candidates["sharpe"].idxmax()
+    logging.info(f"🚀 Strategia ottimizzata selezionata: {best_strategy} "
+                 f"(Sharpe {candidates.loc[best_strategy, 'sharpe']:.2f}, {len(rules)} regole valutate)")
     return best_strategy
 
 
@@ -78,9 +113,9 @@ def generate_ai_modules():
         with open(module_path, "w", encoding="utf-8") as file:
             file.write(f"""
 import numpy as np
-import tensorflow as tf
 
 def module_{i}():
+    import tensorflow as tf  # Import pigro: TensorFlow si carica solo quando il modulo viene eseguito
     print("⚡ Esecuzione modulo {i} in corso...")
     data = np.random.rand(10)
     result = tf.reduce_mean(data)
@@ -93,15 +128,9 @@ def module_{i}():
     logging.info(f"✅ Generati {num_modules} moduli AI dinamici.")
 
 
-def generate_trading_logic():
+def generate_trading_logic(selected_logic=None):
     """Genera logiche di trading avanzate basate su AI e dati storici."""
-    logic_templates = [
-        "if rsi < 30 and macd > 0: buy()",
-        "if bollinger_lower > price and volume > avg_volume: buy()",
-        "if macd < 0 and rsi > 70: sell()",
-        "if stochastic > 80 and momentum < 0: sell()",
-    ]
-    selected_logic = random.choice(logic_templates)
+    selected_logic = selected_logic or random.choice(LOGIC_TEMPLATES)
     logic_path = f"{MODULES_DIR}/trading_logic.py"
 
     with open(logic_path, "w", encoding="utf-8") as file:
@@ -114,6 +143,11 @@ def trading_decision(price, indicators):
     logging.info(f"✅ Nuova logica di trading generata: {selected_logic}")
 
 
+def generate_evaluated_logic():
+    """Valuta le regole sullo storico e genera la logica con la migliore, nello stesso processo."""
+    generate_trading_logic(selected_logic=evaluate_strategy_performance())
+
+
 def validate_and_clean_modules():
     """Verifica se i moduli sono validi e rimuove quelli obsoleti."""
     try:
@@ -164,12 +198,11 @@ def execute_bot():
 
     process_count = adjust_processes()
     process_ai = multiprocessing.Process(target=generate_ai_modules)
-    process_trading = multiprocessing.Process(target=evaluate_strategy_performance)
-    process_logic = multiprocessing.Process(target=generate_trading_logic)
+    process_logic = multiprocessing.Process(target=generate_evaluated_logic)
     process_sync = multiprocessing.Process(target=synchronize_with_bridge)
     process_clean = multiprocessing.Process(target=validate_and_clean_modules)
 
-    processes = [process_ai, process_trading, process_logic, process_sync, process_clean]
+    processes = [process_ai, process_logic, process_sync, process_clean]
 
     for i, process in enumerate(processes[:process_count]):
         process.start()
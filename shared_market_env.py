@@ -0,0 +1,96 @@
+# shared_market_env.py - Ambiente Gym a singolo account che legge i dati di mercato dalla memoria condivisa
+import logging
+import numpy as np
+
+try:
+    import gymnasium as gym  # stable-baselines3 >= 2.0
+    GYMNASIUM = True
+except ImportError:
+    import gym
+    GYMNASIUM = False
+spaces = gym.spaces
+
+from batched_env import SCALPING_FEE, STANDARD_FEE, INVEST_FRACTION, MAX_DRAWDOWN
+from parallel_envs import attach_shared_array
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+class SharedMarketEnv(gym.Env):
+    """Ambiente per i worker di SubprocVecEnv: stesse regole di BatchedTradingVecEnv, un solo episodio.
+
+    Prezzi e osservazioni sono viste in sola lettura sul blocco di SharedMarketData (righe
+    [start, end) del worker): nessuna copia dei dati per processo, nessuna preparazione pandas.
+    Azioni SELL (0) / HOLD (1) / BUY (2); reward = net worth - saldo, come trading_environment.
+    """
+
+    metadata = {"render_modes": []}
+
+    def __init__(self, spec, start, end, initial_balance=100.0, max_steps=500, scalping=True,
+                 invest_fraction=INVEST_FRACTION, price_column="close", seed=None):
+        super().__init__()
+        self.market, self._shared_memory = attach_shared_array(spec, start, end)
+        if len(self.market) < 3:
+            raise ValueError("❌ Dati insufficienti per l'ambiente in memoria condivisa.")
+        columns = spec["columns"]
+        self.prices = self.market[:, columns.index(price_column)]  # Vista sulla colonna, nessuna copia
+        excluded = {spec["symbol_column"], "timestamp"}
+        self._feature_columns = [i for i, col in enumerate(columns) if col not in excluded]
+
+        self.max_steps = min(max_steps, len(self.market) - 2)
+        self.initial_balance = float(initial_balance)
+        self.fee = SCALPING_FEE if scalping else STANDARD_FEE
+        self.invest_fraction = invest_fraction
+        self.rng = np.random.default_rng(seed)
+        self._obs = np.empty(len(self._feature_columns) + 2, dtype=np.float32)  # Unico buffer per step
+
+        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=self._obs.shape, dtype=np.float32)
+        self.action_space = spaces.Discrete(3)
+        self._reset_state()
+
+    def _reset_state(self):
+        self.start = int(self.rng.integers(0, len(self.prices) - self.max_steps - 1))
+        self.steps = 0
+        self.balance = self.initial_balance
+        self.shares_held = 0.0
+        self.net_worth = self.initial_balance
+
+    def _observation(self):
+        """Riga di mercato corrente + saldo e valore della posizione normalizzati sul capitale iniziale."""
+        index = self.start + self.steps
+        self._obs[:-2] = self.market[index, self._feature_columns]
+        self._obs[-2] = self.balance / self.initial_balance
+        self._obs[-1] = self.shares_held * self.prices[index] / self.initial_balance
+        return self._obs.copy()
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self._reset_state()
+        return (self._observation(), {}) if GYMNASIUM else self._observation()
+
+    def step(self, action):
+        price = self.prices[self.start + self.steps]
+        action = int(action)
+        if action == 0 and self.shares_held > 0:
+            self.balance += self.shares_held * price * (1 - self.fee)
+            self.shares_held = 0.0
+        elif action == 2 and self.balance > 0:
+            invest_amount = self.balance * self.invest_fraction
+            self.shares_held += invest_amount / price * (1 - self.fee)
+            self.balance -= invest_amount
+        self.net_worth = self.balance + self.shares_held * price
+        self.steps += 1
+
+        reward = float(self.net_worth - self.balance)
+        terminated = reward < -MAX_DRAWDOWN * self.balance  # Fermo protettivo come in trading_environment
+        truncated = self.steps >= self.max_steps
+        observation = self._observation()
+        if GYMNASIUM:
+            return observation, reward, bool(terminated), bool(truncated and not terminated), {}
+        return observation, reward, bool(terminated or truncated), {"TimeLimit.truncated": bool(truncated and not terminated)}
+
+    def close(self):
+        self.market = self.prices = None  # Le viste vanno rilasciate prima di chiudere il blocco
+        self._shared_memory.close()
@@ -0,0 +1,146 @@
+# startup_profiler.py - Report dei tempi di import e della memoria all'avvio del bot
+import os
+import sys
+import json
+import time
+import logging
+import importlib
+import subprocess
+
+# 📌 Configurazione avanzata del logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Budget di avvio per ogni modulo (tempo di import e RSS aggiuntiva)
+IMPORT_TIME_BUDGET = 1.0  # Secondi
+IMPORT_RSS_BUDGET_MB = 150  # MB
+
+# 📌 Moduli del bot profilati per default
+PROFILED_MODULES = [
+    "bridge_module", "script", "data_loader", "data_api_module", "indicators",
+    "data_handler", "risk_management", "portfolio_optimization", "ai_model",
+    "DynamicTradingManager", "trading_environment", "gym_trading_env",
+    "drl_agent", "trading_bot"
+]
+
+# 📌 Framework pesanti che i moduli leggeri non devono caricare all'import
+HEAVY_FRAMEWORKS = ["tensorflow", "torch", "xgboost", "sklearn", "stable_baselines3", "optuna"]
+
+REPORT_FILE = "startup_profile.json"
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def current_rss_mb():
+    """Restituisce la memoria residente (RSS) del processo corrente in MB."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return 0.0
+
+
+def _probe_module(module_name):
+    """Importa un singolo modulo (in un processo pulito) e stampa tempo e memoria in JSON."""
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    error = None
+    try:
+        importlib.import_module(module_name)
+    except BaseException as e:  # Anche SystemExit: alcuni moduli chiamano exit() all'import
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "module": module_name,
+        "import_time_s": round(elapsed, 4),
+        "rss_mb": round(current_rss_mb() - rss_before, 2),
+        "heavy_frameworks": [name for name in HEAVY_FRAMEWORKS if name in sys.modules],
+        "error": error,
+    }
+    sys.stdout.write("\n" + json.dumps(result) + "\n")
+
+
+def _parse_importtime(stderr, top=5):
+    """Estrae gli import più lenti dall'output di `python -X importtime`."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[1].isdigit():
+            entries.append((parts[2].strip(), int(parts[1]) / 1e6))
+    entries.sort(key=lambda entry: entry[1], reverse=True)
+    return [{"module": name, "cumulative_s": round(seconds, 4)} for name, seconds in entries[:top]]
+
+
+def profile_module(module_name, timeout=300):
+    """Misura l'import di un modulo in un interprete separato, così i moduli non si influenzano a vicenda."""
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--probe", module_name]
+    try:
+        completed = subprocess.run(command, cwd=PROJECT_DIR, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"module": module_name, "import_time_s": float(timeout), "rss_mb": 0.0,
+                "heavy_frameworks": [], "error": "timeout", "slowest_imports": []}
+
+    result = None
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            result = json.loads(line)
+            break
+    if result is None:
+        result = {"module": module_name, "import_time_s": 0.0, "rss_mb": 0.0, "heavy_frameworks": [],
+                  "error": (completed.stderr.strip().splitlines() or ["probe fallito"])[-1]}
+
+    result["slowest_imports"] = _parse_importtime(completed.stderr)
+    result["over_budget"] = (result["import_time_s"] > IMPORT_TIME_BUDGET
+                             or result["rss_mb"] > IMPORT_RSS_BUDGET_MB)
+    return result
+
+
+def profile_startup(modules=None):
+    """Profila l'import di tutti i moduli indicati e restituisce i risultati."""
+    return [profile_module(module) for module in (modules or PROFILED_MODULES)]
+
+
+def report_startup_profile(modules=None, report_file=REPORT_FILE):
+    """Registra il report dei tempi di import e lo salva in JSON. Restituisce i moduli fuori budget."""
+    results = profile_startup(modules)
+
+    logging.info(f"{'Modulo':<24}{'Import (s)':>12}{'RSS (MB)':>12}  Framework pesanti")
+    for result in sorted(results, key=lambda r: r["import_time_s"], reverse=True):
+        flag = "⚠️" if result.get("over_budget") else "✅"
+        heavy = ", ".join(result["heavy_frameworks"]) or "-"
+        logging.info(f"{flag} {result['module']:<22}{result['import_time_s']:>12.3f}{result['rss_mb']:>12.1f}  {heavy}")
+        if result["error"]:
+            logging.warning(f"⚠️ Import di {result['module']} fallito: {result['error']}")
+
+    try:
+        with open(report_file, "w") as f:
+            json.dump(results, f, indent=4)
+        logging.info(f"📂 Report di avvio salvato in {report_file}")
+    except Exception as e:
+        logging.error(f"❌ Errore nel salvataggio del report di avvio: {e}")
+
+    over_budget = [result["module"] for result in results if result.get("over_budget")]
+    if over_budget:
+        logging.warning(f"⚠️ Moduli oltre il budget ({IMPORT_TIME_BUDGET}s / {IMPORT_RSS_BUDGET_MB}MB): {over_budget}")
+    else:
+        logging.info("🚀 Tutti i moduli rientrano nel budget di avvio.")
+    return over_budget
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--probe":
+        _probe_module(sys.argv[2])
+    else:
+        report_startup_profile(sys.argv[1:] or None)
@@ -5,6 +5,8 @@ import time
 import numpy as np
 import bridge_module
 import requests
+from prediction_cache import PREDICTION_CACHE, cached_prediction
+from ai_model import schedule_incremental_update
 
 # 📌 Configurazione avanzata del logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -40,10 +42,44 @@ def send_message_telegram(chat_id, message):
     except Exception as e:
         logging.error(f"❌ Errore nell'invio del messaggio Telegram: {e}")
 
+def last_bar_timestamp(trading_env):
+    """Timestamp della barra corrente dell'ambiente (indice o colonna timestamp dei dati), None se non disponibile."""
+    data = getattr(trading_env, "data", None)
+    step = getattr(trading_env, "current_step", None)
+    if data is None or step is None or len(data) == 0:
+        return None
+    row = min(step, len(data) - 1)
+    return data["timestamp"].iloc[row] if "timestamp" in data.columns else data.index[row]
+
+def traded_symbols(trading_env):
+    """Simboli negoziati dall'ambiente (coin_id delle coppie selezionate), lista vuota se non disponibili."""
+    tickers = getattr(trading_env, "tickers", None)
+    return list(tickers) if isinstance(tickers, (list, tuple)) else []
+
 # 📌 Funzione per l'adattamento automatico alle condizioni di mercato
+def start_pair_ranking(trading_env, portfolio_optimizer):
+    """Avvia il ri-screening in background delle coppie e vi collega ambiente e ottimizzatore.
+
+    Il websocket dei dati real-time si collega passando il servizio a data_handler.consume_websocket.
+    """
+    from DynamicTradingManager import DynamicTradingManager
+    from pair_scheduler import PairRankingService, env_subscriber, optimizer_subscriber
+    service = PairRankingService(DynamicTradingManager())
+    if hasattr(trading_env, "update_trading_pairs"):
+        service.subscribe(env_subscriber(trading_env))
+    if hasattr(portfolio_optimizer, "update_universe"):
+        service.subscribe(optimizer_subscriber(portfolio_optimizer))
+    return service.start()
+
+
 def market_adaptation(ai_model, trading_env):
     """Modifica le strategie in base al mercato."""
-    market_trends = ai_model.analyze_market_trends()
+    # Il trend viene calcolato una volta per barra e riusato da tutti gli account
+    last_bar = last_bar_timestamp(trading_env)
+    if last_bar is None:  # Senza una barra reale la cache riuserebbe lo stesso trend per tutto il TTL
+        market_trends = ai_model.analyze_market_trends()
+    else:
+        market_trends = cached_prediction("market_trends", last_bar, ai_model.analyze_market_trends)
     if market_trends == "high_volatility":
         trading_env.set_risk_level("high")
         logging.info("⚠️ Mercato volatile! Aumento protezione rischio.")
@@ -59,6 +95,7 @@ def start_trading(socketio_instance):
     drl_agent = DRLAgent()
     portfolio_optimizer = PortfolioOptimization()
     risk_manager = RiskManagement()
+    pair_ranking = start_pair_ranking(trading_env, portfolio_optimizer)
 
     retry_count = 0
 
@@ -91,12 +128,19 @@ def start_trading(socketio_instance):
 
                 time.sleep(1)
 
+            PREDICTION_CACHE.log_stats()
+            # Apprendimento continuo sulle barre nuove, in background: un modello per ogni simbolo negoziato
+            schedule_incremental_update(traded_symbols(trading_env))
+            if drl_agent.live_policy is not None:
+                drl_agent.live_policy.latency_report()
+
         except Exception as e:
             logging.error(f"❌ Errore durante l'esecuzione del trading bot: {e}")
             retry_count += 1
 
             if retry_count >= MAX_RETRY:
                 logging.critical("⛔ Numero massimo di errori raggiunto. Riavvio del bot...")
+                pair_ranking.stop(timeout=5)
                 os.system("python3 main.py")
                 break
 
@@ -108,6 +152,7 @@ def start_trading(socketio_instance):
 
             if retry_count >= MAX_RETRY:
                 logging.critical("⛔ Numero massimo di errori raggiunto. Riavvio del bot...")
+                pair_ranking.stop(timeout=5)
                 os.system("python3 main.py")  # Riavvio automatico del bot
                 break
 
@@ -12,6 +12,8 @@ import os
 import json
 import requests
 import time
+from env_core import FastPathMixin
+from performance_recorder import PerformanceRecorder
 import script # ✅ Se necessario, genera nuove logiche di trading
 
 script.generate_new_logic()
@@ -25,11 +27,11 @@ os.makedirs(BACKUP_DIR, exist_ok=True)
 
 CLOUD_BACKTEST_URL = "https://your-cloud-backtesting.com/run"
 
-class TradingEnv(gym.Env):
+class TradingEnv(FastPathMixin, gym.Env):
     """
     Ambiente di trading AI con supporto per scalping ultra-rapido, gestione del rischio avanzata e logging dettagliato.
     """
-    def __init__(self, data, initial_balances=None, max_steps=500, max_assets=5, scalping=True):
+    def __init__(self, data, initial_balances=None, max_steps=500, max_assets=5, scalping=True, fast_path=True):
         super(TradingEnv, self).__init__()
 
         # ✅ Recupero automatico del saldo iniziale di ogni account
@@ -48,10 +50,18 @@ class TradingEnv(gym.Env):
 
         self.data = self._verify_and_prepare_data(data)
         self.tickers = self.select_best_trading_pairs()
+        self.pending_tickers = None  # Nuove coppie dal PairRankingService, applicate a fine episodio
 
         # Moduli di gestione del rischio
         self.risk_management = {account: risk_management.RiskManagement(self.accounts[account]["balance"]) for account in self.accounts}
 
+        # 📌 Prezzi e stato degli account in array contigui (step = poche operazioni scalari)
+        self._init_fast_path(fast_path, {account: self.accounts[account].get("net_worth", self.accounts[account]["balance"]) for account in self.accounts})
+
+        # 📌 Metriche per step in array preallocati: log leggibili solo campionati e a fine episodio
+        self.recorder = PerformanceRecorder(self.core.account_names, name="trading_environment",
+                                            flush_dir=os.path.join(BACKUP_DIR, "metrics"))
+
     def get_dynamic_balances(self):
         """
         Recupera dinamicamente i saldi aggiornati di ogni account.
@@ -71,6 +81,27 @@ class TradingEnv(gym.Env):
             self.accounts[account]["shares_held"] = 0
         logging.info(f"📊 Saldi aggiornati dinamicamente: {self.accounts}")
 
+    def _snapshot_data(self):
+        """Solo le righe delle coppie selezionate, se i dati contengono più coin."""
+        if isinstance(self.tickers, (list, tuple)) and self.tickers and "coin_id" in self.data.columns:
+            return self.data[self.data["coin_id"].isin(self.tickers)]
+        return self.data
+
+    def _get_state(self):
+        return self._get_observation()
+
+    def reset(self):
+        """Nuovo episodio: applica le coppie in attesa, aggiorna lo snapshot e riparte dal primo step."""
+        if self.pending_tickers is not None:
+            self.tickers, self.pending_tickers = self.pending_tickers, None
+        self.current_step = 0
+        self.refresh_snapshot()
+        if self.fast_path:
+            self.core.reset(self.core.net_worth.copy())
+        else:
+            self.update_account_balances()
+        return self._get_state()
+
     def _verify_and_prepare_data(self, data):
         """Verifica la struttura dei dati e prepara i dati per scalping."""
         if "timestamp" not in data.columns:
@@ -92,7 +123,10 @@ class TradingEnv(gym.Env):
 
         self.current_step += 1
         done = self.current_step >= self.max_steps
-        rewards = {account: self.accounts[account]["net_worth"] - self.accounts[account]["balance"] for account in self.accounts}
+        if self.fast_path:
+            rewards = self.core.rewards()
+        else:
+            rewards = {account: self.accounts[account]["net_worth"] - self.accounts[account]["balance"] for account in self.accounts}
 
         # ✅ Controllo del drawdown per scalping
         for account in self.accounts:
@@ -100,13 +134,23 @@ class TradingEnv(gym.Env):
                 logging.warning(f"⚠️ Drawdown elevato per {account}, fermo le operazioni per protezione.")
                 done = True  
 
-        self.log_performance(actions)
+        self.log_performance(actions, rewards)
+        if done:
+            self.recorder.end_episode()
+            if self.pending_tickers is not None:
+                self.tickers, self.pending_tickers = self.pending_tickers, None
+                self.refresh_snapshot()
         return self._get_state(), rewards, done, {}
 
     def _take_action(self, account, action):
         """Esegue un'azione di trading con scalping attivo e gestione avanzata del rischio."""
-        current_price = self.data.iloc[self.current_step]['close']
         trading_fee = 0.0005 if self.scalping else 0.001  
+        if self.fast_path:
+            self.core.take_action(self.core.index[account], action, self.core.prices[self.current_step], trading_fee,
+                                  lambda balance: balance * 0.05 if self.scalping else 0.1)
+            return
+
+        current_price = self._snapshot_data().iloc[self.current_step]['close']  # Stesse barre del percorso veloce
 
         if action == 0 and self.accounts[account]["shares_held"] > 0:
             self.accounts[account]["balance"] += (self.accounts[account]["shares_held"] * current_price) * (1 - trading_fee)
@@ -118,12 +162,17 @@ class TradingEnv(gym.Env):
 
         self.accounts[account]["net_worth"] = self.accounts[account]["balance"] + (self.accounts[account]["shares_held"] * current_price)
 
-    def log_performance(self, actions):
+    def update_trading_pairs(self, diff):
+        """Riceve un PairsDiff: l'episodio in corso prosegue con le coppie attuali."""
+        self.pending_tickers = list(diff.pairs)
+        logging.info(f"🔄 Coppie aggiornate (v{diff.version}) in attesa della fine dell'episodio.")
+
+    def log_performance(self, actions, rewards=None):
         """
         Registra le operazioni e analizza le performance dello scalping.
         """
-        for account, action in actions.items():
-            logging.info(f"📈 {account} → Azione: {action}, Balance: {self.accounts[account]['balance']:.2f}, Net Worth: {self.accounts[account]['net_worth']:.2f}")
+        balance, net_worth = self._account_arrays()
+        self.recorder.record(self.current_step, actions, balance, net_worth, rewards)
 
 # ==============================
 # 🔹 ESEMPIO DI UTILIZZO
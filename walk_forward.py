@@ -0,0 +1,233 @@
+# walk_forward.py - Addestramento e valutazione walk-forward parallela dei modelli AI
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from feature_store import fingerprint_sources
+
+# 📌 Configurazione logging avanzata
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# 📌 Cache dei fold già valutati (USB se disponibile, altrimenti disco locale)
+WALK_FORWARD_DIR = Path("/mnt/usb_trading_data/walk_forward") if Path(
+    "/mnt/usb_trading_data").exists() else Path("D:/trading_data/walk_forward")
+
+CANDIDATES = ("lstm", "xgboost", "rf")
+DEFAULT_PARAMS = {
+    "lstm": {"epochs": 10, "batch_size": 32},
+    "xgboost": {"n_estimators": 100, "learning_rate": 0.1},
+    "rf": {"n_estimators": 100},
+}
+
+# ===========================
+# 🔹 Generazione dei Fold
+# ===========================
+def generate_folds(n_samples, train_size, test_size, step=None, mode="rolling"):
+    """Genera i fold (train_start, train_end, test_start, test_end) in modalità rolling o expanding."""
+    if mode not in ("rolling", "expanding"):
+        raise ValueError("Modalità walk-forward non supportata: usa 'rolling' o 'expanding'.")
+
+    step = step or test_size
+    folds = []
+    train_end = train_size
+    while train_end + test_size <= n_samples:
+        train_start = train_end - train_size if mode == "rolling" else 0
+        folds.append((train_start, train_end, train_end, train_end + test_size))
+        train_end += step
+    return folds
+
+# ===========================
+# 🔹 Worker
+# ===========================
+_thread_limits = []  # Riferimenti ai limiti di threadpoolctl attivi nel processo
+
+def limit_worker_threads(threads):
+    """Limita i thread di BLAS/OpenMP, TensorFlow e torch nel processo worker corrente.
+
+    Le variabili d'ambiente valgono solo per le librerie caricate dopo (TensorFlow, torch importati
+    nel worker); i pool BLAS/OpenMP già caricati (numpy ereditato dal padre) vengono limitati con
+    threadpoolctl e un torch già importato con torch.set_num_threads.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+    try:
+        from threadpoolctl import threadpool_limits
+        _thread_limits.append(threadpool_limits(limits=threads))
+    except ImportError:
+        logging.warning("⚠️ threadpoolctl non installato: i thread BLAS già caricati non vengono limitati.")
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+def _fit_predict(candidate, X_train, y_train, X_test, params, threads):
+    """Addestra il candidato sul fold e restituisce le previsioni sul periodo di test."""
+    if candidate == "lstm":
+        import ai_model
+        from tensorflow.keras.callbacks import EarlyStopping
+        model = ai_model.create_lstm_model((X_train.shape[1], 1))
+        model.fit(X_train[..., np.newaxis], y_train, batch_size=params["batch_size"], epochs=params["epochs"],
+                  validation_split=0.1, callbacks=[EarlyStopping(monitor="val_loss", patience=3, restore_best_weights=True)],
+                  verbose=0)
+        return model.predict(X_test[..., np.newaxis], verbose=0).ravel()
+
+    if candidate == "xgboost":
+        import xgboost as xgb
+        model = xgb.XGBRegressor(objective="reg:squarederror", n_jobs=threads, **params)
+        model.fit(X_train, y_train, verbose=False)
+        return model.predict(X_test)
+
+    if candidate == "rf":
+        from sklearn.ensemble import RandomForestRegressor
+        model = RandomForestRegressor(n_jobs=threads, random_state=0, **params)
+        model.fit(X_train, y_train)
+        return model.predict(X_test)
+
+    raise ValueError(f"Candidato non supportato: {candidate}")
+
+def evaluate_fold(task):
+    """Valuta un candidato su un fold: scaler stimato solo sul train, metriche fuori campione."""
+    from ai_model import prepare_xgboost_data
+
+    start = time.perf_counter()
+    prices, train_len, look_back = task["prices"], task["train_len"], task["look_back"]
+    low, high = prices[:train_len].min(), prices[:train_len].max()
+    scaled = ((prices - low) / max(high - low, 1e-12)).reshape(-1, 1)
+
+    X, y = prepare_xgboost_data(scaled, look_back)
+    is_test = np.arange(look_back, len(prices)) >= train_len
+    X_train, y_train, X_test, y_test = X[~is_test], y[~is_test], X[is_test], y[is_test]
+
+    predictions = _fit_predict(task["candidate"], X_train, y_train, X_test, task["params"], task["threads"])
+    errors = predictions - y_test
+    last_seen = X_test[:, -1]
+
+    return {
+        "candidate": task["candidate"],
+        "fold": task["fold"],
+        "train_start": task["bounds"][0],
+        "test_start": task["bounds"][2],
+        "test_end": task["bounds"][3],
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "mae": float(np.mean(np.abs(errors))),
+        "directional_accuracy": float(np.mean(np.sign(predictions - last_seen) == np.sign(y_test - last_seen))),
+        "train_time_s": round(time.perf_counter() - start, 3),
+    }
+
+# ===========================
+# 🔹 Cache dei Fold
+# ===========================
+def _task_key(task):
+    """Chiave del risultato: candidato, parametri, look_back e impronta dei prezzi del fold."""
+    spec = json.dumps({"candidate": task["candidate"], "params": task["params"], "look_back": task["look_back"],
+                       "train_len": task["train_len"]}, sort_keys=True)
+    return f"{hashlib.sha256(spec.encode()).hexdigest()[:12]}_{fingerprint_sources(task['prices'])}"
+
+def _load_cached(cache_dir, key):
+    path = cache_dir / f"{key}.json"
+    if path.exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return None
+
+def _save_cached(cache_dir, key, result):
+    path = cache_dir / f"{key}.json"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+# ===========================
+# 🔹 Motore Walk-Forward
+# ===========================
+def run_walk_forward(prices, train_size=2000, test_size=250, step=None, mode="rolling", candidates=CANDIDATES,
+                     look_back=60, params=None, max_workers=None, threads_per_worker=1, cache_dir=WALK_FORWARD_DIR):
+    """Esegue il walk-forward su tutti i fold e candidati in parallelo, riusando i fold già calcolati."""
+    prices = np.asarray(prices, dtype=np.float64).ravel()
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    params = {candidate: {**DEFAULT_PARAMS.get(candidate, {}), **(params or {}).get(candidate, {})}
+              for candidate in candidates}
+
+    results, pending = [], {}
+    for fold, bounds in enumerate(generate_folds(len(prices), train_size, test_size, step, mode)):
+        for candidate in candidates:
+            task = {"candidate": candidate, "fold": fold, "bounds": bounds, "look_back": look_back,
+                    "prices": prices[bounds[0]:bounds[3]], "train_len": bounds[1] - bounds[0],
+                    "params": params[candidate], "threads": threads_per_worker}
+            key = _task_key(task)
+            cached = _load_cached(cache_dir, key)
+            if cached is not None:
+                results.append({**cached, "fold": fold, "cached": True})
+            else:
+                pending[key] = task
+
+    logging.info(f"📊 Walk-forward: {len(results)} fold in cache, {len(pending)} da calcolare.")
+    if pending:
+        max_workers = max_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=limit_worker_threads,
+                                 initargs=(threads_per_worker,)) as executor:
+            futures = {executor.submit(evaluate_fold, task): key for key, task in pending.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    task = pending[key]
+                    logging.error(f"❌ Errore nel fold {task['fold']} ({task['candidate']}): {e}")
+                    continue
+                _save_cached(cache_dir, key, result)
+                results.append({**result, "cached": False})
+        logging.info(f"✅ {len(pending)} valutazioni completate in {time.perf_counter() - start:.1f}s "
+                     f"con {max_workers} worker x {threads_per_worker} thread.")
+
+    return pd.DataFrame(results).sort_values(["fold", "candidate"]).reset_index(drop=True) if results else pd.DataFrame()
+
+def summarize_walk_forward(results):
+    """Aggrega le metriche fuori campione per candidato (media e deviazione standard sui fold)."""
+    metrics = ["rmse", "mae", "directional_accuracy"]
+    summary = results.groupby("candidate")[metrics].agg(["mean", "std"])
+    logging.info(f"🏆 Riepilogo walk-forward:\n{summary}")
+    return summary
+
+def walk_forward_by_symbol(bars, symbols=None, symbol_column="coin_id", **kwargs):
+    """Walk-forward separato per ogni simbolo: i fold non attraversano mai il confine tra due coin.
+
+    Restituisce {simbolo: risultati}; i simboli con meno barre di un fold vengono saltati.
+    """
+    if symbol_column not in bars.columns:
+        return {None: run_walk_forward(bars["close"].values, **kwargs)}
+    groups = bars.groupby(symbol_column, sort=False)
+    results = {}
+    for symbol in symbols or list(groups.groups):
+        if symbol not in groups.groups:
+            logging.warning(f"⚠️ Nessuna barra storica per {symbol}.")
+            continue
+        group = groups.get_group(symbol)
+        group = group.sort_values("timestamp") if "timestamp" in group.columns else group.sort_index()
+        if len(group) < kwargs.get("train_size", 2000) + kwargs.get("test_size", 250):
+            logging.warning(f"⚠️ {symbol}: {len(group)} barre, troppo poche per un fold.")
+            continue
+        logging.info(f"🔍 Walk-forward su {symbol} ({len(group)} barre).")
+        results[symbol] = run_walk_forward(group["close"].values, **kwargs)
+    return results
+
+if __name__ == "__main__":
+    from data_handler import load_processed_data, HISTORICAL_DATA_FILE
+    bars = load_processed_data(HISTORICAL_DATA_FILE)
+    if bars.empty:
+        logging.warning("⚠️ Nessuna barra storica disponibile per il walk-forward.")
+    else:
+        # Uso: python walk_forward.py [simbolo ...] (senza argomenti: tutti i coin dello storico)
+        for symbol, results in walk_forward_by_symbol(bars, sys.argv[1:] or None).items():
+            if not results.empty:
+                logging.info(f"📊 Risultati walk-forward per {symbol}:")
+                summarize_walk_forward(results)